@@ -0,0 +1,310 @@
+"""
+SimiDoc 로컬 분석 서버.
+
+여러 검토자가 같은 simidoc.db를 각자 분석하면 프로세스마다 TF-IDF를 다시 학습하게 됩니다.
+이 모듈은 SimilarityAnalyzer 하나(웜 인덱스)를 메모리에 유지하고 localhost HTTP API로 분석 요청을 받습니다.
+짧은 시간 창 안에 동시에 들어온 요청들은 묶어서 한 번의 행렬 곱(analyze_many)으로 처리합니다.
+
+실행 예시:
+    python analysis_server.py --db simidoc.db --port 8765
+GUI는 환경 변수 SIMIDOC_SERVER_URL=http://127.0.0.1:8765 가 설정되어 있으면 이 서버에 접속합니다.
+"""
+import argparse
+import ipaddress
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import memory_budget
+import similarity_analyzer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class RequestBatcher:
+    """
+    동시에 들어온 분석 요청을 모아 analyzer.analyze_many()를 한 번만 호출하는 배처.
+    첫 요청이 들어온 뒤 batch_window초 동안(또는 max_batch_size개가 찰 때까지) 요청을 더 모읍니다.
+    top_k / min_similarity가 같은 요청끼리 묶어서 처리합니다.
+    analyzer는 analyze_many(target_pdf_ids, top_k, min_similarity)를 제공하는 객체면 무엇이든 됩니다 (테스트용 대역 포함).
+    """
+    def __init__(self, analyzer, batch_window=0.02, max_batch_size=32):
+        self.analyzer = analyzer
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SimiDocBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, target_pdf_id, top_k=None, min_similarity=None):
+        """분석 요청을 큐에 넣고 결과를 받을 Future를 반환합니다. (None이면 분석기 기본값 사용)"""
+        future = Future()
+        self._queue.put(((target_pdf_id, top_k, min_similarity), future))
+        return future
+
+    def stop(self):
+        self._stop_event.set()
+        self._queue.put(None) # 대기 중인 쓰레드를 깨웁니다.
+        self._thread.join(timeout=5)
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop_event.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            groups = {} # key: (top_k, min_similarity), value: 그 설정으로 들어온 (pdf_id, future) 리스트
+            for (pdf_id, top_k, min_similarity), future in batch:
+                groups.setdefault((top_k, min_similarity), []).append((pdf_id, future))
+
+            for (top_k, min_similarity), requests in groups.items():
+                target_pdf_ids = list(dict.fromkeys(pdf_id for pdf_id, _ in requests)) # 중복 제거 (순서 유지)
+                print(f"DEBUG(Batcher): Processing {len(requests)} request(s) for {len(target_pdf_ids)} PDF(s). top_k={top_k}, min_similarity={min_similarity}")
+                try:
+                    results_by_pdf = self.analyzer.analyze_many(target_pdf_ids, top_k, min_similarity)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                for pdf_id, future in requests:
+                    future.set_result(results_by_pdf.get(pdf_id, []))
+
+
+class _AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """분석 서버의 HTTP 엔드포인트: GET /health, POST /analyze, POST /refresh"""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"잘못된 JSON 요청: {e}"})
+            return
+
+        if self.path == "/analyze":
+            if "pdf_id" not in request:
+                self._send_json(400, {"error": "pdf_id가 필요합니다."})
+                return
+            try:
+                top_k = request.get("top_k")
+                min_similarity = request.get("min_similarity")
+                future = self.server.batcher.submit(
+                    int(request["pdf_id"]),
+                    None if top_k is None else int(top_k),
+                    None if min_similarity is None else float(min_similarity),
+                )
+                results = future.result()
+            except Exception as e:
+                self._send_json(500, {"error": f"분석 중 오류 발생: {e}", "error_type": type(e).__name__})
+                return
+            self._send_json(200, {"results": results})
+        elif self.path == "/refresh":
+            refresh_index = getattr(self.server.analyzer, "refresh_index", None)
+            try:
+                if refresh_index:
+                    refresh_index(force=True)
+            except Exception as e:
+                self._send_json(500, {"error": f"인덱스 갱신 중 오류 발생: {e}", "error_type": type(e).__name__})
+                return
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+
+    def log_message(self, format, *args):
+        print(f"DEBUG(Server): {self.address_string()} {format % args}")
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """
+    SimilarityAnalyzer(또는 analyze_many를 제공하는 대역 객체)를 감싸는 localhost 전용 HTTP 서버.
+    port=0으로 만들면 빈 포트를 자동으로 할당하므로 테스트 환경에서도 바로 띄울 수 있습니다.
+    """
+    daemon_threads = True
+
+    def __init__(self, analyzer, host=DEFAULT_HOST, port=DEFAULT_PORT, batch_window=0.02, max_batch_size=32):
+        super().__init__((host, port), _AnalysisRequestHandler)
+        self.analyzer = analyzer
+        self.batcher = RequestBatcher(analyzer, batch_window, max_batch_size)
+        self._serve_thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """백그라운드 쓰레드에서 요청 처리를 시작합니다."""
+        self._serve_thread = threading.Thread(target=self.serve_forever, name="SimiDocServer", daemon=True)
+        self._serve_thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.batcher.stop()
+        if self._serve_thread:
+            self._serve_thread.join(timeout=5)
+
+
+class RemoteSimilarityAnalyzer:
+    """
+    분석 서버에 접속하는 얇은 클라이언트.
+    SimilarityAnalyzer와 같은 analyze_similarity() 인터페이스를 제공하므로 GUI에서 그대로 바꿔 쓸 수 있습니다.
+    """
+    def __init__(self, server_url, timeout=600):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None, timeout=None):
+        """
+        서버에 JSON 요청을 보내고 응답을 반환합니다. 실패를 빈 결과로 숨기지 않고 예외로 알립니다.
+        - 서버가 오류 응답을 보내면 그 오류 메시지를 담은 RuntimeError (서버의 메모리 부족이면 MemoryBudgetError)
+        - 서버에 연결할 수 없으면 ConnectionError
+        """
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(
+            self.server_url + path, data=data,
+            headers={"Content-Type": "application/json"},
+            method="GET" if data is None else "POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                body = {}
+            message = f"분석 서버 오류 (HTTP {e.code}): {body.get('error') or e.reason}"
+            print(f"ERROR(Remote): {message}")
+            if body.get("error_type") in ("MemoryBudgetError", "MemoryError"):
+                raise memory_budget.MemoryBudgetError(message) from e
+            raise RuntimeError(message) from e
+        except urllib.error.URLError as e:
+            print(f"ERROR(Remote): 분석 서버 요청 실패 ({self.server_url}): {e.reason}")
+            raise ConnectionError(f"분석 서버에 연결할 수 없습니다 ({self.server_url}): {e.reason}") from e
+
+    def is_available(self):
+        try:
+            return self._request("/health", timeout=2).get("status") == "ok"
+        except (RuntimeError, OSError, ValueError):
+            return False
+
+    def refresh_index(self, force=True):
+        self._request("/refresh", {})
+
+    def analyze_similarity(self, target_pdf_id, files_data, top_k=None, min_similarity=None):
+        # 서버 오류/연결 실패는 예외로 올려, GUI가 '유사 문단 없음' 대신 오류 대화상자를 보여주게 합니다.
+        response = self._request("/analyze", {"pdf_id": target_pdf_id, "top_k": top_k, "min_similarity": min_similarity})
+
+        # JSON에는 튜플이 없으므로 로컬 분석기와 같은 형태(튜플)로 되돌립니다.
+        results = []
+        for res in response.get("results", []):
+            results.append({
+                'target_paragraph': tuple(res['target_paragraph']),
+                'similar_paragraphs': [
+                    {
+                        'source_pdf_id': sim['source_pdf_id'],
+                        'source_paragraph': tuple(sim['source_paragraph']),
+                        'similarity': sim['similarity'],
+                    }
+                    for sim in res['similar_paragraphs']
+                ],
+            })
+        return results
+
+
+def is_loopback_host(host):
+    """localhost 또는 루프백 주소(127.0.0.0/8, ::1)인지 확인합니다. 서버에는 인증이 없으므로 외부 주소에는 바인딩하지 않습니다."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="SimiDoc 로컬 분석 서버")
+    parser.add_argument("--db", default=os.path.join(script_dir, "simidoc.db"), help="SQLite DB 경로")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="바인딩 주소 (기본: 127.0.0.1, 루프백 주소만 허용)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="포트 번호")
+    parser.add_argument("--batch-window-ms", type=float, default=20.0, help="요청을 모으는 시간 창 (밀리초)")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="한 번에 묶어 처리할 최대 요청 수")
+    parser.add_argument("--top-k", type=int, default=5, help="요청에 top_k가 없을 때 사용할 기본 유사 문단 수")
+    parser.add_argument("--min-similarity", type=float, default=0.0, help="요청에 min_similarity가 없을 때 사용할 기본 최소 유사도")
+    parser.add_argument("--tokenizer", default="word", choices=["word", "particle", "char_ngram"], help="문단 토큰화 방식")
+    parser.add_argument("--semantic", action="store_true", help="단어 일치 대신 LSA 의미 유사도로 검색")
+    parser.add_argument("--memory-budget-mb", type=float, default=None, help="분석에 쓸 메모리 예산 (MiB). 넘는 요청은 500 오류로 거부")
+    args = parser.parse_args()
+    if not is_loopback_host(args.host):
+        parser.error(f"--host에는 루프백 주소만 사용할 수 있습니다: {args.host} (분석 서버에는 인증이 없습니다)")
+
+    analyzer = similarity_analyzer.SimilarityAnalyzer(args.db, top_k=args.top_k, min_similarity=args.min_similarity, tokenizer=args.tokenizer,
+                                                     semantic=args.semantic, memory_budget_mb=args.memory_budget_mb)
+    try:
+        analyzer.refresh_index() # 첫 요청이 오기 전에 인덱스를 미리 데워둡니다.
+    except memory_budget.MemoryBudgetError as e:
+        print(f"ERROR(Server): 인덱스를 만들 수 없어 서버를 시작하지 않습니다. {e}")
+        return 1
+    server = AnalysisServer(analyzer, args.host, args.port, args.batch_window_ms / 1000.0, args.max_batch_size)
+    print(f"SimiDoc 분석 서버 실행 중: {server.url} (DB: {args.db})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+SimiDoc 성능 측정 모음.
+
+실제 PDF 없이 합성 문단으로 임시 DB를 만들어 측정하므로 어느 환경에서나 실행할 수 있습니다.
+    python simidoc_cli.py bench memory --paragraphs 100000
+    python simidoc_cli.py bench lsa --paragraphs 10000,100000,1000000
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import pdf_ingest
+import semantic_index
+import similarity_analyzer
+import tokenization
+
+# 합성 문단에 쓰일 한국어 단어/조사. _split_text_into_paragraphs가 만드는 문단과 비슷한 모양을 흉내냅니다.
+_SYNTHETIC_WORDS = ("학생 보고서 표절 문단 분석 데이터 연구 결과 방법 실험 모델 학습 시스템 문서 유사도 "
+                    "검사 과제 제출 교수 평가 사회 경제 정책 환경 기술 문화 역사 교육 정보 과정").split()
+_SYNTHETIC_PARTICLES = ("은", "는", "이", "가", "을", "를", "의", "에", "에서", "으로", "")
+
+
+def make_synthetic_db(db_path, num_paragraphs, paragraphs_per_pdf=40, words_per_paragraph=60, seed=0):
+    """num_paragraphs개의 합성 문단이 들어 있는 SimiDoc DB를 만듭니다."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        cursor = conn.cursor()
+        made = 0
+        pdf_index = 0
+        while made < num_paragraphs:
+            count = min(paragraphs_per_pdf, num_paragraphs - made)
+            paragraphs = [
+                " ".join(rng.choice(_SYNTHETIC_WORDS) + rng.choice(_SYNTHETIC_PARTICLES) for _ in range(words_per_paragraph)) + "."
+                for _ in range(count)
+            ]
+            pdf_ingest.insert_pdf(cursor, f"synthetic/{pdf_index:07d}.pdf", paragraphs)
+            made += count
+            pdf_index += 1
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _load_legacy_paragraph_lists(db_path):
+    """예전 분석기(_get_all_paragraphs_from_db)의 메모리 구조를 그대로 재현합니다: 4-튜플 리스트 + PDF별 3-튜플 리스트"""
+    conn = sqlite3.connect(db_path)
+    try:
+        paragraphs = []
+        pdf_paragraph_map = {}
+        for para_id, pdf_id, text, order in conn.execute("SELECT id, pdf_id, paragraph_text, page_number FROM paragraphs ORDER BY pdf_id, page_number ASC"):
+            paragraphs.append((para_id, pdf_id, text, order))
+            pdf_paragraph_map.setdefault(pdf_id, []).append((para_id, text, order))
+        return paragraphs, pdf_paragraph_map
+    finally:
+        conn.close()
+
+
+def _load_paragraph_store(db_path):
+    """현재 분석기가 메모리에 두는 구조(ParagraphStore)만 만듭니다. 텍스트는 읽기만 하고 버립니다."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT id, pdf_id, page_number FROM paragraphs ORDER BY pdf_id, page_number ASC").fetchall()
+        para_ids, pdf_ids, orders = zip(*rows) if rows else ((), (), ())
+        del rows
+        return similarity_analyzer.ParagraphStore(para_ids, pdf_ids, orders)
+    finally:
+        conn.close()
+
+
+def _resident_bytes(loader, *args):
+    """loader가 반환한 객체가 계속 차지하는 메모리(tracemalloc 기준)를 잽니다."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = loader(*args)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, result
+
+
+def bench_paragraph_store_memory(num_paragraphs=100000, db_path=None):
+    """
+    문단 메타데이터의 상주 메모리를 예전 리스트 구조와 ParagraphStore로 비교하고,
+    TF-IDF 행렬을 float64와 float32로 만들었을 때의 크기도 함께 보고합니다.
+    db_path를 주지 않으면 합성 문단으로 임시 DB를 만들어 측정합니다.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if db_path is None:
+            db_path = os.path.join(tmp_dir, "bench.db")
+            make_synthetic_db(db_path, num_paragraphs)
+
+        legacy_bytes, legacy = _resident_bytes(_load_legacy_paragraph_lists, db_path)
+        count = len(legacy[0])
+        del legacy
+        store_bytes, store = _resident_bytes(_load_paragraph_store, db_path)
+        del store
+
+        analyzer = similarity_analyzer.SimilarityAnalyzer(db_path)
+        analyzer.refresh_index()
+        vectors = analyzer.paragraph_vectors
+        float32_bytes = vectors.data.nbytes + vectors.indices.nbytes + vectors.indptr.nbytes if vectors is not None else 0
+        float64_bytes = float32_bytes + (vectors.data.nbytes if vectors is not None else 0) # data 배열만 두 배
+
+    count = max(count, 1)
+    report = {
+        "paragraphs": count,
+        "legacy_bytes_per_paragraph": legacy_bytes / count,
+        "store_bytes_per_paragraph": store_bytes / count,
+        "reduction": legacy_bytes / store_bytes if store_bytes else float("inf"),
+        "vectors_float64_bytes": float64_bytes,
+        "vectors_float32_bytes": float32_bytes,
+    }
+    print(f"문단 수: {count:,}")
+    print(f"  예전 리스트 구조 : {report['legacy_bytes_per_paragraph']:,.1f} bytes/문단")
+    print(f"  ParagraphStore   : {report['store_bytes_per_paragraph']:,.1f} bytes/문단 ({report['reduction']:.1f}배 감소)")
+    print(f"  TF-IDF 행렬      : float64 {float64_bytes / 2**20:,.1f} MiB -> float32 {float32_bytes / 2**20:,.1f} MiB")
+    return report
+
+
+def make_synthetic_tfidf(num_paragraphs, vocabulary_size=20000, num_topics=500, words_per_topic=200,
+                         tokens_per_paragraph=60, topic_ratio=0.7, seed=0):
+    """
+    주제(topic) 구조가 있는 합성 코퍼스의 TF-IDF 행렬을 DB 없이 바로 만듭니다. (100만 문단 규모 측정용)
+    문단마다 주제 하나를 고르고, 토큰의 topic_ratio만큼은 그 주제의 단어에서, 나머지는 전체 어휘에서 뽑습니다.
+    같은 주제의 문단들은 겹치는 단어가 적어도 LSA 공간에서는 가깝게 모입니다.
+    """
+    rng = np.random.default_rng(seed)
+    topic_words = rng.integers(0, vocabulary_size, size=(num_topics, words_per_topic), dtype=np.int32)
+    token_blocks = []
+    for start in range(0, num_paragraphs, 100000):
+        count = min(100000, num_paragraphs - start)
+        topics = rng.integers(0, num_topics, size=count)
+        from_topic = rng.random((count, tokens_per_paragraph)) < topic_ratio
+        topic_tokens = topic_words[topics[:, None], rng.integers(0, words_per_topic, size=(count, tokens_per_paragraph))]
+        noise_tokens = rng.integers(0, vocabulary_size, size=(count, tokens_per_paragraph), dtype=np.int32)
+        token_blocks.append(np.where(from_topic, topic_tokens, noise_tokens).astype(np.int32).ravel())
+    token_ids = np.concatenate(token_blocks)
+    del token_blocks
+    lengths = np.full(num_paragraphs, tokens_per_paragraph, dtype=np.int64)
+    return tokenization.CachedTfidfVectorizer().fit_transform_ids(token_ids, lengths, vocabulary_size)
+
+
+def _per_query_ms(search, n_queries):
+    started = time.perf_counter()
+    result = search()
+    return (time.perf_counter() - started) * 1000.0 / n_queries, result
+
+
+def _neighbor_sets(query_rows, source_rows, n_queries):
+    neighbors = [set() for _ in range(n_queries)]
+    for query_row, source_row in zip(query_rows.tolist(), source_rows.tolist()):
+        neighbors[query_row].add(source_row)
+    return neighbors
+
+
+def _mean_overlap(found, expected):
+    """질의마다 |found ∩ expected| / |expected|의 평균. (expected가 비어 있는 질의는 제외)"""
+    ratios = [len(f & e) / len(e) for f, e in zip(found, expected) if e]
+    return sum(ratios) / len(ratios) if ratios else 0.0
+
+
+def bench_lsa(sizes=(10000, 100000), n_queries=200, top_k=10, n_components=128, n_probes=(4, 8, 16, 32), seed=0):
+    """
+    합성 코퍼스 크기별로 LSA 인덱스를 만들고 질의 지연 시간과 재현율을 측정합니다.
+    - 정확 검색(TF-IDF 희소 곱, LSA 전체 비교)과 IVF 근사 검색의 질의당 시간
+    - recall@top_k: 근사 검색 결과가 LSA 정확 검색 결과를 얼마나 찾았는지
+    - 단어 일치 겹침: LSA 정확 검색 결과 중 TF-IDF 검색 결과에도 있는 비율
+    IVF 리스트 수가 sqrt(문단 수)이므로, n_probe가 같으면 근사 검색 비용은 대략 sqrt(문단 수)에 비례합니다.
+    """
+    reports = []
+    for num_paragraphs in sizes:
+        started = time.perf_counter()
+        vectors = make_synthetic_tfidf(num_paragraphs, seed=seed)
+        tfidf_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = semantic_index.LsaIndex(n_components=n_components, random_state=seed).fit(vectors, np.arange(num_paragraphs))
+        build_seconds = time.perf_counter() - started
+
+        rng = np.random.default_rng(seed + 1)
+        queries = rng.choice(num_paragraphs, size=min(n_queries, num_paragraphs), replace=False).astype(np.int64)
+        count = len(queries)
+        corpus_blocks = similarity_analyzer.split_corpus(vectors)
+        lexical_ms, lexical = _per_query_ms(
+            lambda: similarity_analyzer.top_k_similarities(vectors[queries], corpus_blocks, top_k, exclude_columns=queries), count)
+        del corpus_blocks
+        query_embeddings = np.asarray(index.embeddings[queries])
+        exact_ms, exact = _per_query_ms(lambda: index.search_exact(query_embeddings, top_k, exclude_rows=queries), count)
+        exact_sets = _neighbor_sets(exact[0], exact[1], count)
+
+        report = {
+            "paragraphs": num_paragraphs,
+            "lists": len(index.centroids),
+            "tfidf_seconds": tfidf_seconds,
+            "build_seconds": build_seconds,
+            "embeddings_bytes": index.embeddings.nbytes,
+            "lexical_ms": lexical_ms,
+            "exact_ms": exact_ms,
+            "lexical_overlap": _mean_overlap(exact_sets, _neighbor_sets(lexical[0], lexical[1], count)),
+            "ann": [],
+        }
+        for n_probe in n_probes:
+            ann_ms, ann = _per_query_ms(lambda: index.search(query_embeddings, top_k, exclude_rows=queries, n_probe=n_probe), count)
+            report["ann"].append({"n_probe": n_probe, "ms": ann_ms, "recall": _mean_overlap(_neighbor_sets(ann[0], ann[1], count), exact_sets)})
+        reports.append(report)
+        del vectors, index
+
+        print(f"문단 수: {num_paragraphs:,} (IVF 리스트 {report['lists']:,}개, 임베딩 {report['embeddings_bytes'] / 2**20:,.1f} MiB)")
+        print(f"  TF-IDF 생성 {tfidf_seconds:,.1f}초, LSA 인덱스 생성 {build_seconds:,.1f}초")
+        print(f"  정확 검색   : TF-IDF {lexical_ms:,.2f} ms/질의, LSA {exact_ms:,.2f} ms/질의 "
+              f"(LSA 결과 중 TF-IDF 결과와 겹침 {report['lexical_overlap'] * 100:.0f}%)")
+        for ann in report["ann"]:
+            print(f"  IVF n_probe={ann['n_probe']:<3}: {ann['ms']:,.2f} ms/질의, recall@{top_k} {ann['recall'] * 100:.1f}%")
+    return reports
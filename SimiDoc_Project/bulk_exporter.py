@@ -0,0 +1,259 @@
+"""
+SimiDoc 대량 내보내기 모듈.
+
+paragraphs 테이블, 희소 TF-IDF 행렬, 전체 유사도 분석 결과를 열 기반(columnar) 파일로 내보냅니다.
+- pyarrow가 설치되어 있으면 Parquet 파일로 저장합니다.
+- 없으면 텍스트는 JSONL, 숫자 데이터는 청크별 NPZ 파일로 저장합니다.
+모든 단계는 chunk_size 단위로 나누어 처리하므로 메모리 사용량이 데이터 전체 크기에 비례해 늘어나지 않습니다.
+"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ModuleNotFoundError:
+    pa = None # pyarrow가 없으면 NPZ + JSONL 형식으로 대체합니다.
+    pq = None
+
+EXPORT_TARGETS = ("paragraphs", "vectors", "matches")
+EXPORT_FORMATS = ("auto", "parquet", "npz")
+
+
+class _ChunkWriter:
+    """
+    청크 writer들의 공통 부분. with 블록으로 사용하며, 블록 안에서 예외가 나면 abort()로 파일 핸들을 닫고
+    쓰다 만 파일을 지웁니다. (잘린 파일이 완성된 내보내기 결과처럼 남지 않도록)
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+
+    def abort(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"ERROR(Export): 쓰다 만 파일을 지울 수 없습니다 ({path}): {e}")
+
+
+class _ParquetChunkWriter(_ChunkWriter):
+    """청크(열 이름 -> 배열 딕셔너리)를 하나의 Parquet 파일에 row group으로 이어 씁니다."""
+    def __init__(self, out_dir, name):
+        self.path = os.path.join(out_dir, f"{name}.parquet")
+        self._writer = None
+
+    def write(self, columns):
+        table = pa.table(columns)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is None: # 데이터가 하나도 없었던 경우
+            return []
+        self._writer.close()
+        return [os.path.basename(self.path)]
+
+    def abort(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception as e:
+                print(f"ERROR(Export): Parquet 파일 닫기 오류 ({self.path}): {e}")
+            self._writer = None
+        self._remove([self.path])
+
+
+class _JsonlChunkWriter(_ChunkWriter):
+    """청크를 한 줄에 한 레코드씩 JSONL 파일에 이어 씁니다. (텍스트가 포함된 데이터용)"""
+    def __init__(self, out_dir, name):
+        self.path = os.path.join(out_dir, f"{name}.jsonl")
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, columns):
+        names = list(columns)
+        for values in zip(*(columns[n] for n in names)):
+            record = {n: (v.item() if isinstance(v, np.generic) else v) for n, v in zip(names, values)}
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+        return [os.path.basename(self.path)]
+
+    def abort(self):
+        self._file.close()
+        self._remove([self.path])
+
+
+class _NpzChunkWriter(_ChunkWriter):
+    """청크마다 별도의 NPZ 파일(name_part00000.npz, ...)을 만듭니다. (숫자 데이터용)"""
+    def __init__(self, out_dir, name):
+        self.out_dir = out_dir
+        self.name = name
+        self.files = []
+
+    def write(self, columns):
+        file_name = f"{self.name}_part{len(self.files):05d}.npz"
+        np.savez(os.path.join(self.out_dir, file_name), **{n: np.asarray(v) for n, v in columns.items()})
+        self.files.append(file_name)
+
+    def close(self):
+        return self.files
+
+    def abort(self):
+        self._remove([os.path.join(self.out_dir, file_name) for file_name in self.files])
+        self.files = []
+
+
+def _resolve_format(export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"지원하지 않는 내보내기 형식입니다: {export_format} (가능: {', '.join(EXPORT_FORMATS)})")
+    if export_format == "parquet" and pa is None:
+        raise ValueError("Parquet 형식으로 내보내려면 pyarrow가 설치되어 있어야 합니다.")
+    if export_format == "auto":
+        return "parquet" if pa is not None else "npz"
+    return export_format
+
+
+def _make_writer(export_format, out_dir, name, has_text):
+    if export_format == "parquet":
+        return _ParquetChunkWriter(out_dir, name)
+    return _JsonlChunkWriter(out_dir, name) if has_text else _NpzChunkWriter(out_dir, name)
+
+
+def export_paragraphs(db_path, out_dir, export_format="auto", chunk_size=10000, progress_callback=None):
+    """paragraphs 테이블(파일명 포함)을 chunk_size 행씩 읽어서 내보냅니다. 반환값: 내보낸 행 수와 파일 목록"""
+    export_format = _resolve_format(export_format)
+    total = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT p.id, p.pdf_id, d.file_name, p.page_number, p.paragraph_text "
+            "FROM paragraphs p JOIN pdfs d ON d.id = p.pdf_id ORDER BY p.pdf_id, p.page_number ASC"
+        )
+        with _make_writer(export_format, out_dir, "paragraphs", has_text=True) as writer:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                para_ids, pdf_ids, file_names, orders, texts = zip(*rows)
+                writer.write({
+                    "paragraph_id": np.asarray(para_ids, dtype=np.int64),
+                    "pdf_id": np.asarray(pdf_ids, dtype=np.int64),
+                    "file_name": list(file_names),
+                    "paragraph_order": np.asarray(orders, dtype=np.int32),
+                    "paragraph_text": list(texts),
+                })
+                total += len(rows)
+                if progress_callback:
+                    progress_callback("paragraphs", total)
+            files = writer.close()
+    finally:
+        conn.close()
+    return {"rows": total, "files": files}
+
+
+def export_vectors(analyzer, out_dir, export_format="auto", chunk_size=10000, progress_callback=None):
+    """
+    분석기의 희소 TF-IDF 행렬을 COO 형식(문단 ID, 열 번호, 값)으로 행 청크 단위로 내보냅니다.
+    열 번호에 대응하는 단어 목록은 vocabulary 파일로 함께 저장합니다.
+    """
+    export_format = _resolve_format(export_format)
+    snapshot = analyzer.index_snapshot()
+    if snapshot is None:
+        return {"rows": 0, "nonzeros": 0, "files": []}
+    store, vectorizer, paragraph_vectors = snapshot
+    para_ids = store.para_ids
+
+    nonzeros = 0
+    with _make_writer(export_format, out_dir, "vectors", has_text=False) as writer:
+        for start in range(0, paragraph_vectors.shape[0], chunk_size):
+            block = paragraph_vectors[start:start + chunk_size].tocoo()
+            writer.write({
+                "paragraph_id": para_ids[start + block.row],
+                "column": block.col.astype(np.int32),
+                "value": block.data.astype(np.float32),
+            })
+            nonzeros += block.nnz
+            if progress_callback:
+                progress_callback("vectors", min(start + chunk_size, paragraph_vectors.shape[0]))
+        files = writer.close()
+
+    terms = vectorizer.get_feature_names_out()
+    with _make_writer(export_format, out_dir, "vocabulary", has_text=True) as vocabulary_writer:
+        for start in range(0, len(terms), chunk_size):
+            chunk_terms = terms[start:start + chunk_size]
+            vocabulary_writer.write({
+                "column": np.arange(start, start + len(chunk_terms), dtype=np.int32),
+                "term": [str(t) for t in chunk_terms],
+            })
+        files += vocabulary_writer.close()
+    return {"rows": paragraph_vectors.shape[0], "columns": paragraph_vectors.shape[1], "nonzeros": nonzeros, "files": files}
+
+
+def export_matches(analyzer, out_dir, export_format="auto", chunk_size=256, top_k=None, min_similarity=None, progress_callback=None):
+    """
+    코퍼스의 모든 문단에 대해 min_similarity 이상인 상위 top_k 유사 문단을 계산하여 (타겟, 출처, 유사도) 행으로 내보냅니다.
+    analyze_similarity를 문서마다 다시 실행하거나 결과를 파이썬 리스트에 모으지 않습니다.
+    행 번호는 iter_match_blocks가 계산에 사용한 store로 문단/PDF ID로 바꿉니다. (내보내는 중에 인덱스가 갱신되어도 어긋나지 않음)
+    """
+    export_format = _resolve_format(export_format)
+    total = 0
+    with _make_writer(export_format, out_dir, "matches", has_text=False) as writer:
+        for target_rows, source_rows, similarities, store in analyzer.iter_match_blocks(chunk_size, top_k, min_similarity):
+            para_ids, pdf_ids = store.para_ids, store.pdf_ids
+            writer.write({
+                "target_paragraph_id": para_ids[target_rows],
+                "target_pdf_id": pdf_ids[target_rows],
+                "source_paragraph_id": para_ids[source_rows],
+                "source_pdf_id": pdf_ids[source_rows],
+                "similarity": similarities.astype(np.float32),
+            })
+            total += len(similarities)
+            if progress_callback:
+                progress_callback("matches", total)
+        files = writer.close()
+    return {"rows": total, "files": files}
+
+
+def export_all(analyzer, out_dir, targets=EXPORT_TARGETS, export_format="auto", chunk_size=10000, top_k=None, min_similarity=None, progress_callback=None):
+    """
+    선택한 대상들을 out_dir에 내보내고, 각 파일 목록과 행 수를 manifest.json에 기록합니다.
+    analyzer는 SimilarityAnalyzer 인스턴스이며 그 db_path를 문단 테이블의 출처로 사용합니다.
+    top_k / min_similarity를 생략하면 분석기에 설정된 값을 사용합니다.
+    """
+    top_k = analyzer.top_k if top_k is None else top_k
+    min_similarity = analyzer.min_similarity if min_similarity is None else min_similarity
+    for target in targets:
+        if target not in EXPORT_TARGETS:
+            raise ValueError(f"알 수 없는 내보내기 대상입니다: {target} (가능: {', '.join(EXPORT_TARGETS)})")
+    export_format = _resolve_format(export_format)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {"format": export_format, "db_path": os.path.abspath(analyzer.db_path), "top_k": top_k, "min_similarity": min_similarity}
+    if "paragraphs" in targets:
+        manifest["paragraphs"] = export_paragraphs(analyzer.db_path, out_dir, export_format, chunk_size, progress_callback)
+    if "vectors" in targets:
+        manifest["vectors"] = export_vectors(analyzer, out_dir, export_format, chunk_size, progress_callback)
+    if "matches" in targets:
+        # 유사도 블록은 (chunk x 코퍼스 블록) 크기이므로 행 청크는 분석기의 chunk_size를 넘지 않게 잡습니다.
+        manifest["matches"] = export_matches(analyzer, out_dir, export_format, min(chunk_size, analyzer.chunk_size), top_k, min_similarity, progress_callback)
+
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"DEBUG(Export): Export finished to '{out_dir}': {manifest}")
+    return manifest
@@ -0,0 +1,247 @@
+"""
+SimiDoc 대량 폴더 가져오기 모듈.
+
+수만 개의 PDF가 들어 있는 보관 폴더를 하위 폴더까지 재귀적으로 가져옵니다.
+- 파일마다 ingest_jobs 테이블에 pending / done / failed 상태를 기록하므로, 중간에 프로그램이 꺼져도 다시 실행하면 남은 파일부터 이어서 가져옵니다.
+- PDF 행과 문단 행은 텍스트 추출이 끝난 뒤 같은 트랜잭션에서 저장되므로, 반쯤 저장된 문서가 남지 않습니다.
+- 깨진 PDF는 max_attempts번까지 재시도한 뒤 failed로 표시하고 건너뜁니다. (전체 작업은 중단되지 않음)
+  시도 횟수는 추출을 시작하기 전에 저장하므로, 추출 프로세스(MuPDF)를 죽이는 파일도 재시작할 때마다 같은 곳에서 멈추지 않습니다.
+- 이미 DB에 있는 파일(다른 경로 표기 포함)과 내용 해시가 같은 파일은 다시 저장하지 않습니다.
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import pdf_ingest
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running" # 추출 중. 프로그램이 이 상태에서 꺼졌으면 다음 실행이 pending 또는 failed로 되돌림
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _now():
+    return datetime.now().strftime(pdf_ingest.DATE_FORMAT)
+
+
+def enqueue_directory(db_path, root_dir, commit_every=1000):
+    """
+    root_dir 아래의 모든 PDF를 ingest_jobs에 pending으로 등록합니다. 이미 등록된 파일은 건너뜁니다.
+    반환값: 새로 등록된 파일 수
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        cursor = conn.cursor()
+        existing_pdfs = {pdf_ingest.path_key(row[0]) for row in cursor.execute("SELECT file_path FROM pdfs")}
+        added = 0
+        pending_rows = []
+        for dir_path, dir_names, file_names in os.walk(root_dir):
+            dir_names.sort() # 이름 순서로 등록하여 가져오기 순서가 실행마다 같도록
+            for file_name in sorted(file_names):
+                if not file_name.lower().endswith(".pdf"):
+                    continue
+                file_path = os.path.abspath(os.path.join(dir_path, file_name))
+                # GUI로 이미 추가된 파일은 ('C:/a/b.pdf'처럼 다른 표기로 저장되었어도) 가져오기 완료로 간주합니다.
+                status = STATUS_DONE if pdf_ingest.path_key(file_path) in existing_pdfs else STATUS_PENDING
+                pending_rows.append((file_path, status, _now()))
+                if len(pending_rows) >= commit_every:
+                    cursor.executemany("INSERT OR IGNORE INTO ingest_jobs (file_path, status, updated_date) VALUES (?, ?, ?)", pending_rows)
+                    added += cursor.rowcount
+                    conn.commit()
+                    pending_rows = []
+        if pending_rows:
+            cursor.executemany("INSERT OR IGNORE INTO ingest_jobs (file_path, status, updated_date) VALUES (?, ?, ?)", pending_rows)
+            added += cursor.rowcount
+        conn.commit()
+        print(f"DEBUG(BulkImport): Enqueued {added} new files from '{root_dir}'.")
+        return added
+    finally:
+        conn.close()
+
+
+def count_jobs(db_path):
+    """상태별 작업 수를 {"pending": n, "running": n, "done": n, "failed": n} 형태로 반환합니다."""
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        counts = {STATUS_PENDING: 0, STATUS_RUNNING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for status, count in conn.execute("SELECT status, COUNT(*) FROM ingest_jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+    finally:
+        conn.close()
+
+
+def reset_failed_jobs(db_path):
+    """failed로 건너뛴 파일들을 다시 pending으로 돌려 재시도할 수 있게 합니다."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE ingest_jobs SET status = ?, attempts = 0, error = NULL, updated_date = ? WHERE status = ?",
+                       (STATUS_PENDING, _now(), STATUS_FAILED))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def _extract_job(file_path):
+    """
+    프로세스 풀에서 실행됩니다. (성공 여부, 문단 리스트 또는 오류 문자열, 파일 정보)를 반환합니다.
+    예외를 문자열로 바꿔 반환하여 한 파일의 오류가 풀 전체를 멈추지 않게 합니다. (파일 정보의 해시로 중복 파일을 거름)
+    """
+    try:
+        return True, pdf_ingest.extract_paragraphs(file_path), pdf_ingest.read_file_info(file_path)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}", None
+
+
+def _claim_jobs(conn, jobs):
+    """작업들을 running으로 표시하고 시도 횟수를 먼저 올려 commit합니다. (추출 도중 프로그램이 죽어도 시도가 기록되도록)"""
+    conn.executemany("UPDATE ingest_jobs SET status = ?, attempts = ?, updated_date = ? WHERE id = ?",
+                     ((STATUS_RUNNING, attempts + 1, _now(), job_id) for job_id, _, attempts in jobs))
+    conn.commit()
+
+
+def _recover_interrupted_jobs(conn, max_attempts):
+    """
+    지난 실행이 추출 도중 끝나 running으로 남은 작업을 pending으로 되돌리고, 시도 횟수가 한도에 닿았으면 failed로 표시합니다.
+    반환값: pending으로 되돌린 작업 ID 리스트 (어느 파일 때문에 끝났는지 모르므로 하나씩 따로 다시 추출)
+    """
+    suspects = [row[0] for row in conn.execute("SELECT id FROM ingest_jobs WHERE status = ? AND attempts < ? ORDER BY id",
+                                               (STATUS_RUNNING, max_attempts))]
+    cursor = conn.execute(
+        "UPDATE ingest_jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+        "error = COALESCE(error, '이전 실행이 이 파일을 추출하던 중에 종료되었습니다.'), updated_date = ? WHERE status = ?",
+        (max_attempts, STATUS_FAILED, STATUS_PENDING, _now(), STATUS_RUNNING))
+    conn.commit()
+    if cursor.rowcount:
+        print(f"DEBUG(BulkImport): Recovered {cursor.rowcount} jobs interrupted by the previous run.")
+    return suspects
+
+
+def _extract_batch(conn, executor, jobs, workers):
+    """
+    배치의 파일들을 프로세스 풀에서 추출합니다. 반환값: (작업별 _extract_job 결과, 사용할 프로세스 풀)
+    파일 하나가 추출 프로세스를 죽여 풀이 깨지면(BrokenProcessPool) 풀을 새로 만들고, 어느 파일 때문인지 알 수 없으므로
+    배치의 시도는 세지 않고 파일을 하나씩 다시 추출합니다. 혼자서도 풀을 깨는 파일만 실패한 시도로 기록됩니다.
+    """
+    _claim_jobs(conn, jobs)
+    try:
+        return list(executor.map(_extract_job, [file_path for _, file_path, _ in jobs])), executor
+    except BrokenProcessPool:
+        print(f"ERROR(BulkImport): 텍스트 추출 프로세스가 비정상 종료되었습니다. 배치의 파일 {len(jobs)}개를 하나씩 다시 추출합니다.")
+    executor.shutdown(wait=False)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    results = []
+    for job in jobs:
+        _claim_jobs(conn, [job])
+        try:
+            results.append(executor.submit(_extract_job, job[1]).result())
+        except BrokenProcessPool:
+            results.append((False, "BrokenProcessPool: 이 파일을 추출하던 프로세스가 비정상 종료되었습니다.", None))
+            executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers)
+    return results, executor
+
+
+def run_import(db_path, batch_size=50, max_attempts=2, workers=None, progress_callback=None, stop_event=None):
+    """
+    pending 상태의 작업을 batch_size개씩 처리합니다. 배치 하나가 하나의 트랜잭션입니다.
+    progress_callback(stats)는 배치마다 호출되며, stats에는 처리량(files_per_sec, paragraphs_per_sec)이 포함됩니다.
+    stop_event가 설정되면 현재 배치를 마친 뒤 멈춥니다. (남은 작업은 pending으로 유지되어 나중에 이어서 실행 가능)
+    """
+    conn = sqlite3.connect(db_path)
+    pdf_ingest.init_database(conn)
+    suspects = _recover_interrupted_jobs(conn, max_attempts)
+    cursor = conn.cursor()
+    stats = {"done": 0, "failed": 0, "retried": 0, "duplicates": 0, "paragraphs": 0, "remaining": 0,
+             "elapsed": 0.0, "files_per_sec": 0.0, "paragraphs_per_sec": 0.0}
+    started = time.monotonic()
+    last_job_id = 0
+    retry_scheduled = False # 이번 바퀴에서 재시도 대상으로 돌려놓은 작업이 있는지
+    jobs = []
+    pdf_ids_by_key = {} # 다른 표기로 저장된 경로를 찾기 위한 {path_key: PDF ID} (pdf_ingest.find_existing_pdf)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if suspects:
+                # 지난 실행을 끝낸 파일이 다른 파일들의 시도까지 써 버리지 않도록 하나씩 추출합니다.
+                cursor.execute("SELECT id, file_path, attempts FROM ingest_jobs WHERE id = ? AND status = ?", (suspects.pop(0), STATUS_PENDING))
+                jobs = cursor.fetchall()
+                if not jobs:
+                    continue
+            else:
+                # id 순서로 진행하고, 재시도 대상은 한 바퀴를 다 돈 뒤에 다시 시도합니다.
+                cursor.execute("SELECT id, file_path, attempts FROM ingest_jobs WHERE status = ? AND id > ? ORDER BY id LIMIT ?",
+                               (STATUS_PENDING, last_job_id, batch_size))
+                jobs = cursor.fetchall()
+                if not jobs:
+                    if not retry_scheduled:
+                        break
+                    last_job_id, retry_scheduled = 0, False # 실패했던 파일들을 처음부터 한 바퀴 더 시도
+                    continue
+                last_job_id = jobs[-1][0]
+
+            results, executor = _extract_batch(conn, executor, jobs, workers)
+
+            for (job_id, file_path, attempts), (ok, payload, file_info) in zip(jobs, results):
+                attempts += 1 # _claim_jobs에서 이미 저장된 이번 시도
+                if ok:
+                    pdf_id = pdf_ingest.find_existing_pdf(cursor, file_path, pdf_ids_by_key)
+                    if pdf_id is None:
+                        duplicate = pdf_ingest.find_pdf_by_hash(cursor, file_info[2])
+                        if duplicate is not None:
+                            print(f"DEBUG(BulkImport): Skipped '{file_path}': same content as PDF {duplicate[0]} ('{duplicate[1]}').")
+                            pdf_id = duplicate[0]
+                            stats["duplicates"] += 1
+                        else:
+                            pdf_id = pdf_ingest.insert_pdf(cursor, file_path, payload, file_info=file_info)
+                            pdf_ids_by_key[pdf_ingest.path_key(file_path)] = pdf_id
+                            stats["paragraphs"] += len(payload)
+                    cursor.execute("UPDATE ingest_jobs SET status = ?, pdf_id = ?, error = NULL, updated_date = ? WHERE id = ?",
+                                   (STATUS_DONE, pdf_id, _now(), job_id))
+                    stats["done"] += 1
+                else:
+                    status = STATUS_FAILED if attempts >= max_attempts else STATUS_PENDING
+                    cursor.execute("UPDATE ingest_jobs SET status = ?, error = ?, updated_date = ? WHERE id = ?",
+                                   (status, payload, _now(), job_id))
+                    stats["failed" if status == STATUS_FAILED else "retried"] += 1
+                    retry_scheduled = retry_scheduled or status == STATUS_PENDING
+                    print(f"DEBUG(BulkImport): Failed to ingest '{file_path}' (attempt {attempts}/{max_attempts}): {payload}")
+            conn.commit()
+
+            elapsed = time.monotonic() - started
+            stats["elapsed"] = elapsed
+            stats["files_per_sec"] = stats["done"] / elapsed if elapsed > 0 else 0.0
+            stats["paragraphs_per_sec"] = stats["paragraphs"] / elapsed if elapsed > 0 else 0.0
+            stats["remaining"] = cursor.execute("SELECT COUNT(*) FROM ingest_jobs WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+            if progress_callback:
+                progress_callback(dict(stats))
+    except sqlite3.Error:
+        conn.rollback() # 진행 중이던 배치만 취소되고, 해당 작업들은 running으로 남아 다음 실행이 pending으로 되돌립니다.
+        raise
+    except KeyboardInterrupt:
+        # 사용자가 중단한 배치는 시도로 세지 않고 그대로 pending으로 돌려놓습니다.
+        conn.rollback()
+        conn.executemany("UPDATE ingest_jobs SET status = ?, attempts = ? WHERE id = ? AND status = ?",
+                         ((STATUS_PENDING, attempts, job_id, STATUS_RUNNING) for job_id, _, attempts in jobs))
+        conn.commit()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        conn.close()
+
+    print(f"DEBUG(BulkImport): Finished. done={stats['done']}, failed={stats['failed']}, duplicates={stats['duplicates']}, "
+          f"{stats['files_per_sec']:.1f} files/s, {stats['paragraphs_per_sec']:.1f} paragraphs/s")
+    return stats
+
+
+def import_directory(db_path, root_dir, batch_size=50, max_attempts=2, workers=None, progress_callback=None, stop_event=None):
+    """root_dir를 작업 테이블에 등록한 뒤 남은 작업을 모두 처리합니다. 같은 폴더로 다시 호출하면 이어서 진행합니다."""
+    enqueue_directory(db_path, root_dir)
+    return run_import(db_path, batch_size, max_attempts, workers, progress_callback, stop_event)
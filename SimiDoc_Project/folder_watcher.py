@@ -0,0 +1,254 @@
+"""
+SimiDoc 감시 폴더(watch folder) 모듈.
+
+공유 폴더를 주기적으로 스캔하여 새로 생기거나, 바뀌거나, 삭제된 PDF를 찾아 자동으로 DB에 반영합니다.
+- 복사 중인 파일이나 한꺼번에 쏟아지는 이벤트는 debounce 시간 동안 크기/수정시각이 변하지 않을 때까지 기다렸다가 처리합니다.
+- 텍스트 추출은 프로세스 풀에서 병렬로 처리하고, DB 저장은 배치마다 하나의 트랜잭션으로 묶습니다.
+외부 라이브러리 없이 os.scandir 기반 폴링으로 동작하므로 네트워크 공유 폴더에서도 사용할 수 있습니다.
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_ingest
+
+EVENT_ADDED = "added"
+EVENT_MODIFIED = "modified"
+EVENT_REMOVED = "removed"
+DB_RETRY_LIMIT = 5 # DB 저장에 실패한 배치를 다시 시도하는 최대 횟수
+DB_RETRY_MAX_DELAY = 30.0 # 다시 시도 사이의 최대 대기 시간 (초), 1초부터 두 배씩 늘림
+
+
+def _scan_pdfs(folder, recursive=True):
+    """폴더 안의 PDF 파일들을 {절대 경로: (크기, 수정시각 ns)} 딕셔너리로 반환합니다."""
+    snapshot = {}
+    pending_dirs = [folder]
+    while pending_dirs:
+        current = pending_dirs.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                pending_dirs.append(entry.path)
+                        elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                            stat = entry.stat()
+                            snapshot[os.path.abspath(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue # 스캔 도중 삭제된 파일 등
+        except OSError as e:
+            print(f"DEBUG(Watch): Cannot scan '{current}': {e}")
+    return snapshot
+
+
+class FolderWatcher:
+    """
+    폴링 방식의 폴더 감시기. poll()을 호출할 때마다 debounce 시간 동안 안정된 변경 이벤트 목록을 돌려줍니다.
+    known_files에는 이미 DB에 들어 있는 파일 경로를 넘겨서, 처음 시작할 때 기존 파일을 다시 추가하지 않도록 합니다.
+    """
+    def __init__(self, folder, debounce=2.0, recursive=True, known_files=None):
+        self.folder = os.path.abspath(folder)
+        self.debounce = debounce
+        self.recursive = recursive
+        self._known = {} # key: 경로, value: 마지막으로 처리한 (크기, 수정시각)
+        self._pending = {} # key: 경로, value: (마지막으로 본 (크기, 수정시각), 그 상태를 처음 본 시각)
+        # DB에 저장된 경로 표기(예: QFileDialog의 'C:/a/b.pdf')를 그대로 유지하기 위한 별칭 테이블
+        self._db_paths = {}
+        db_paths_by_key = {pdf_ingest.path_key(p): p for p in (known_files or ())}
+        for path, state in _scan_pdfs(self.folder, recursive).items():
+            db_path = db_paths_by_key.get(pdf_ingest.path_key(path))
+            if db_path is not None:
+                self._known[path] = state
+                self._db_paths[path] = db_path
+
+    @property
+    def known_count(self):
+        return len(self._known)
+
+    def poll(self, now=None):
+        """폴더를 한 번 스캔하고, debounce가 끝난 (이벤트 종류, 경로) 리스트를 반환합니다."""
+        now = time.monotonic() if now is None else now
+        current = _scan_pdfs(self.folder, self.recursive)
+        events = []
+
+        for path in list(self._known):
+            if path not in current:
+                del self._known[path]
+                self._pending.pop(path, None)
+                events.append((EVENT_REMOVED, self._db_paths.pop(path, path)))
+
+        for path, state in current.items():
+            if self._known.get(path) == state:
+                self._pending.pop(path, None)
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != state:
+                self._pending[path] = (state, now) # 새 변경이 생기면 debounce 타이머를 다시 시작
+                continue
+            if now - pending[1] >= self.debounce:
+                events.append((EVENT_MODIFIED if path in self._known else EVENT_ADDED, self._db_paths.get(path, path)))
+                self._known[path] = state
+                del self._pending[path]
+
+        for path in list(self._pending):
+            if path not in current: # 안정되기 전에 사라진 파일
+                del self._pending[path]
+        return events
+
+    def forget(self, paths):
+        """
+        DB에 반영하지 못한 이벤트의 경로들을 처리하지 않은 상태로 되돌려, 이후의 poll()에서 다시 이벤트로 나오게 합니다.
+        (삭제 이벤트는 파일이 이미 없으므로 다시 나오지 않습니다.)
+        """
+        paths = set(paths)
+        for path in list(self._known):
+            if self._db_paths.get(path, path) in paths:
+                del self._known[path]
+
+
+def ingest_events(db_path, events, executor=None):
+    """
+    (이벤트 종류, 경로) 리스트를 DB에 반영합니다. 모든 변경은 하나의 트랜잭션으로 commit 됩니다.
+    추가/변경된 파일의 텍스트 추출은 executor(프로세스 풀)가 있으면 병렬로 수행합니다.
+    추출 중에 프로세스 풀이 깨지면 아무것도 저장하지 않고 BrokenProcessPool을 그대로 냅니다. (run_watch_loop가 풀을 새로 만들어 다시 처리)
+    이미 DB에 있는 파일(다른 경로 표기 포함)은 새로 추가하지 않고 변경으로 처리하며,
+    내용 해시가 같은 PDF가 이미 있는 새 파일은 중복으로 보고 건너뜁니다.
+    반환값: {"added": n, "modified": n, "removed": n, "failed": n, "duplicates": n, "paragraphs": n}
+    """
+    stats = {EVENT_ADDED: 0, EVENT_MODIFIED: 0, EVENT_REMOVED: 0, "failed": 0, "duplicates": 0, "paragraphs": 0}
+    to_extract = [path for event, path in events if event != EVENT_REMOVED]
+    if executor is not None and to_extract:
+        # 파일이 하나뿐이어도 풀에서 추출합니다. MuPDF가 추출 프로세스를 죽여도 감시 쓰레드(GUI 프로세스)는 살아남습니다.
+        futures = {path: executor.submit(pdf_ingest.extract_paragraphs, path) for path in to_extract}
+        extracted = {}
+        for path, future in futures.items():
+            try:
+                extracted[path] = future.result()
+            except BrokenProcessPool:
+                raise # 어느 파일 때문에 깨졌는지 알 수 없으므로 배치 전체를 다시 처리하게 합니다.
+            except Exception as e:
+                extracted[path] = e
+    else:
+        extracted = {}
+        for path in to_extract:
+            try:
+                extracted[path] = pdf_ingest.extract_paragraphs(path)
+            except Exception as e:
+                extracted[path] = e
+
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        pdf_ids_by_key = {}
+        for event, path in events:
+            existing_id = pdf_ingest.find_existing_pdf(cursor, path, pdf_ids_by_key)
+            if event == EVENT_REMOVED:
+                if existing_id is not None:
+                    pdf_ingest.delete_pdf(cursor, existing_id)
+                    stats[EVENT_REMOVED] += 1
+                continue
+
+            paragraphs = extracted[path]
+            if isinstance(paragraphs, Exception):
+                print(f"DEBUG(Watch): Failed to extract '{path}': {paragraphs}")
+                stats["failed"] += 1
+                continue
+            if existing_id is not None:
+                # 같은 자리에서 교체된 파일(또는 다른 표기로 이미 저장된 파일)은 PDF ID를 유지하고 바뀐 문단만 고칩니다.
+                added, _ = pdf_ingest.replace_pdf_paragraphs(cursor, existing_id, paragraphs)
+                pdf_ingest.update_file_info(cursor, existing_id, pdf_ingest.read_file_info(path))
+                stats[EVENT_MODIFIED] += 1
+                stats["paragraphs"] += added
+                continue
+            file_info = pdf_ingest.read_file_info(path)
+            duplicate = pdf_ingest.find_pdf_by_hash(cursor, file_info[2])
+            if duplicate is not None:
+                print(f"DEBUG(Watch): Skipped '{path}': same content as PDF {duplicate[0]} ('{duplicate[1]}').")
+                stats["duplicates"] += 1
+                continue
+            pdf_id = pdf_ingest.insert_pdf(cursor, path, paragraphs, file_info=file_info)
+            pdf_ids_by_key[pdf_ingest.path_key(path)] = pdf_id
+            stats[EVENT_ADDED] += 1
+            stats["paragraphs"] += len(paragraphs)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return stats
+
+
+def run_watch_loop(db_path, folder, stop_event, on_batch=None, on_error=None, poll_interval=1.0, debounce=2.0, batch_size=64, workers=None):
+    """
+    stop_event가 설정될 때까지 폴더를 감시하며 변경 사항을 batch_size개씩 DB에 반영합니다.
+    배치 하나가 끝날 때마다 on_batch(stats)를 호출합니다. (GUI 쓰레드에서는 신호로 전달)
+    DB 저장에 실패한 배치는 대기 시간을 두 배씩 늘리며 DB_RETRY_LIMIT번까지 다시 시도하고,
+    그래도 실패하면 그 파일들을 감시기에서 처리하지 않은 상태로 되돌려 이후의 스캔에서 다시 잡히게 합니다.
+    추출 프로세스가 죽어 프로세스 풀이 깨지면 풀을 새로 만들고 그 배치의 파일들을 하나씩 다시 처리합니다.
+    혼자서도 풀을 깨는 파일은 실패로 처리하고 on_error(메시지)로 알립니다.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        known_files = [row[0] for row in conn.execute("SELECT file_path FROM pdfs")]
+    finally:
+        conn.close()
+
+    watcher = FolderWatcher(folder, debounce=debounce, known_files=known_files)
+    print(f"DEBUG(Watch): Watching '{watcher.folder}' ({watcher.known_count} known PDFs).")
+    backlog = []
+    failures = 0 # 맨 앞 배치가 연속으로 DB 저장에 실패한 횟수
+    isolate = 0 # 풀이 깨진 배치에서 하나씩 다시 처리할 남은 이벤트 수
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while not stop_event.is_set():
+            backlog.extend(watcher.poll())
+            while backlog and not stop_event.is_set():
+                isolated = isolate > 0
+                batch, backlog = (backlog[:1], backlog[1:]) if isolated else (backlog[:batch_size], backlog[batch_size:])
+                isolate -= len(batch) if isolated else 0
+                started = time.monotonic()
+                try:
+                    stats = ingest_events(db_path, batch, executor)
+                except BrokenProcessPool as e:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    if len(batch) > 1:
+                        print(f"ERROR(Watch): 추출 프로세스가 비정상 종료되었습니다: {e} (풀을 새로 만들고 파일 {len(batch)}개를 하나씩 다시 처리)")
+                        backlog = batch + backlog
+                        isolate = len(batch)
+                        continue
+                    message = f"'{batch[0][1]}' 파일을 추출하는 중 추출 프로세스가 비정상 종료되었습니다: {e}"
+                    print(f"ERROR(Watch): {message}")
+                    if on_error:
+                        on_error(message)
+                    if on_batch:
+                        on_batch({"failed": 1, "seconds": time.monotonic() - started})
+                    continue
+                except sqlite3.Error as e:
+                    failures += 1
+                    if failures <= DB_RETRY_LIMIT:
+                        delay = min(DB_RETRY_MAX_DELAY, 2.0 ** (failures - 1))
+                        print(f"ERROR(Watch): DB 저장 오류: {e} ({delay:.0f}초 뒤 다시 시도 {failures}/{DB_RETRY_LIMIT})")
+                        backlog = batch + backlog
+                        isolate += len(batch) if isolated else 0
+                        stop_event.wait(delay)
+                        continue
+                    print(f"ERROR(Watch): DB 저장 오류: {e} (파일 {len(batch)}개는 다음 스캔에서 다시 처리)")
+                    watcher.forget(path for _, path in batch)
+                    failures = 0
+                    if on_batch:
+                        on_batch({"failed": len(batch), "seconds": time.monotonic() - started})
+                    continue
+                failures = 0
+                stats["seconds"] = time.monotonic() - started
+                print(f"DEBUG(Watch): Batch ingested: {stats}")
+                if on_batch:
+                    on_batch(stats)
+            stop_event.wait(poll_interval)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
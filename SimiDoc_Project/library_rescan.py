@@ -0,0 +1,106 @@
+"""
+SimiDoc 다시 검사(rescan) 모듈.
+
+DB에 저장된 PDF 파일들이 그 자리에서 교체되었는지 확인하고, 내용이 바뀐 파일만 다시 추출합니다.
+1. 모든 파일의 크기/수정시각을 저장된 값과 비교합니다. (파일을 열지 않으므로 1만 개도 몇 초 안에 끝남)
+2. 다른 파일만 프로세스 풀에서 해시를 계산하고, 해시까지 다르면 텍스트를 다시 추출합니다.
+3. 새 문단들을 저장된 문단들과 비교해서 바뀐 문단 행만 고칩니다. (pdf_ingest.replace_pdf_paragraphs)
+   분석기는 다음 분석 때 바뀐 행만 인덱스에 반영합니다.
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pdf_ingest
+
+RESULT_TOUCHED = "touched" # 수정시각만 바뀌고 내용(해시)은 같음
+RESULT_MODIFIED = "modified"
+RESULT_FAILED = "failed"
+
+
+def _check_file(file_path, stored_hash):
+    """
+    프로세스 풀에서 실행됩니다. 해시가 저장된 값과 같으면 추출하지 않습니다.
+    반환값: (결과 종류, 파일 정보, 문단 리스트 또는 오류 메시지)
+    """
+    try:
+        file_info = pdf_ingest.read_file_info(file_path)
+        if stored_hash is not None and file_info[2] == stored_hash:
+            return RESULT_TOUCHED, file_info, None
+        return RESULT_MODIFIED, file_info, pdf_ingest.extract_paragraphs(file_path)
+    except Exception as e:
+        return RESULT_FAILED, None, f"{type(e).__name__}: {e}"
+
+
+def rescan_library(db_path, batch_size=100, workers=None, remove_missing=True, progress_callback=None, stop_event=None):
+    """
+    DB의 모든 PDF를 다시 검사하여 바뀐 파일만 반영합니다. 배치 하나가 하나의 트랜잭션입니다.
+    파일 정보가 기록되지 않은 예전 DB의 파일은 처음 한 번은 다시 추출해서 비교합니다. (문단이 같으면 DB는 바뀌지 않음)
+    remove_missing이 True이면 더 이상 존재하지 않는 파일을 DB에서 삭제합니다.
+    반환값: {"scanned", "unchanged", "touched", "modified", "removed", "failed", "paragraphs_added", "paragraphs_removed", "elapsed"}
+    """
+    started = time.monotonic()
+    stats = {"scanned": 0, "unchanged": 0, RESULT_TOUCHED: 0, RESULT_MODIFIED: 0, "removed": 0, RESULT_FAILED: 0,
+             "paragraphs_added": 0, "paragraphs_removed": 0, "elapsed": 0.0}
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn) # 예전 DB라면 파일 정보 열을 추가합니다.
+        cursor = conn.cursor()
+        pdf_rows = cursor.execute("SELECT id, file_path, file_size, file_mtime_ns, content_hash FROM pdfs ORDER BY id").fetchall()
+
+        # 1단계: 크기/수정시각만 비교
+        missing_ids, candidates = [], [] # candidates: (pdf_id, file_path, 저장된 해시)
+        for pdf_id, file_path, file_size, file_mtime_ns, content_hash in pdf_rows:
+            stats["scanned"] += 1
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                missing_ids.append(pdf_id)
+                continue
+            if content_hash is not None and stat.st_size == file_size and stat.st_mtime_ns == file_mtime_ns:
+                stats["unchanged"] += 1
+            else:
+                candidates.append((pdf_id, file_path, content_hash))
+
+        if remove_missing and missing_ids:
+            for pdf_id in missing_ids:
+                pdf_ingest.delete_pdf(cursor, pdf_id)
+            conn.commit()
+            stats["removed"] = len(missing_ids)
+        print(f"DEBUG(Rescan): {stats['scanned']} files checked, {len(candidates)} changed on disk, {len(missing_ids)} missing.")
+
+        # 2단계: 바뀐 것으로 보이는 파일만 해시 확인 / 다시 추출
+        if candidates:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for start in range(0, len(candidates), batch_size):
+                    if stop_event and stop_event.is_set():
+                        break
+                    batch = candidates[start:start + batch_size]
+                    results = executor.map(_check_file, [p for _, p, _ in batch], [h for _, _, h in batch])
+                    for (pdf_id, file_path, _), (result, file_info, payload) in zip(batch, results):
+                        if result == RESULT_FAILED:
+                            print(f"DEBUG(Rescan): Failed to rescan '{file_path}': {payload}")
+                        elif result == RESULT_MODIFIED:
+                            added, removed = pdf_ingest.replace_pdf_paragraphs(cursor, pdf_id, payload)
+                            stats["paragraphs_added"] += added
+                            stats["paragraphs_removed"] += removed
+                            # 해시가 처음 기록되는 예전 파일인데 문단이 그대로라면 실제로는 바뀐 것이 아닙니다.
+                            if not added and not removed:
+                                result = RESULT_TOUCHED
+                        if file_info is not None:
+                            pdf_ingest.update_file_info(cursor, pdf_id, file_info)
+                        stats[result] += 1
+                    conn.commit()
+                    stats["elapsed"] = time.monotonic() - started
+                    if progress_callback:
+                        progress_callback(dict(stats))
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats["elapsed"] = time.monotonic() - started
+    print(f"DEBUG(Rescan): Finished. {stats}")
+    return stats
@@ -0,0 +1,243 @@
+"""
+SimiDoc 메모리 예산 모듈.
+
+사양이 낮은 노트북에서 큰 DB를 분석하다가 스왑에 빠지거나 메모리 부족으로 죽지 않도록,
+분석 단계별 메모리를 미리 추정하여 예산 안에 들어가는 chunk_size를 고르고, 실행 중 최대 사용량을 잽니다.
+- 코퍼스 행렬     : 상주하는 TF-IDF 행렬 + 곱셈용 전치 복사본 (스트리밍 모드에서는 전치 복사본을 만들지 않음)
+- 유사도 블록     : 타겟 문단 chunk_size개 x 코퍼스 블록 행 수만큼의 희소 곱 결과 (최악의 경우 거의 밀집)
+- 결과 리스트     : 타겟 문단마다 top_k개의 결과 dict와 문단 텍스트
+- 인덱스 생성     : 완성될 TF-IDF 행렬 + 문단 배열 + 배치 하나의 단어 빈도 행 (배치 크기를 예산에 맞춤)
+예산 안에 일반 모드가 들어가지 않으면 코퍼스를 블록(최대 STREAM_BLOCK_ROWS행)으로 나누어 곱하는 스트리밍 모드로 낮추고,
+블록을 MIN_STREAM_BLOCK_ROWS행까지 줄여도 들어가지 않으면 MemoryBudgetError로 이유를 알려주고 분석을 거부합니다.
+"""
+import os
+import threading
+import tracemalloc
+
+try:
+    import psutil
+except ModuleNotFoundError:
+    psutil = None # 없으면 /proc(리눅스) 또는 Win32 API로 RSS를 읽습니다.
+
+RSS_SAMPLE_INTERVAL = 0.05 # RSS 샘플링 간격 (초)
+STREAM_BLOCK_ROWS = 8192 # 스트리밍 모드에서 처음 곱할 코퍼스 문단 수 (similarity_analyzer.CORPUS_BLOCK_ROWS와 같음, 예산이 작으면 절반씩 줄임)
+MIN_STREAM_BLOCK_ROWS = 1000
+# 추정에 쓰는 단위 크기 (byte). 합성 문단 2만 개 DB에서 tracemalloc으로 잰 최대치에 여유를 더한 값입니다.
+# 곱 결과 한 값: float32 값 + 열 번호 + top_k_similarities의 질의 행 번호/정렬 순서/필터 마스크 등 중간 배열 (측정 약 66)
+BYTES_PER_SIMILARITY = 72
+BYTES_PER_RESULT = 1400 # 결과 dict/tuple 한 개의 파이썬 객체 + 문단 텍스트(최대 400자, UTF-8 한글 3바이트)
+# 인덱스를 만들 때도 분석과 같은 모델을 씁니다: 상주 = 완성된 행렬 + 문단 배열, 임시 = 배치 하나
+BYTES_PER_INDEX_TOKEN = 8 # 완성된 행렬에서 토큰 하나: float32 값 + int32 열 번호 (토큰 수만큼 미리 잡음)
+BYTES_PER_PARAGRAPH = 48 # 문단 하나: ParagraphStore의 ID/순서 배열 + 행 포인터 (배열이 늘어날 때의 여유 포함)
+BYTES_PER_BATCH_TOKEN = 72 # 배치의 토큰 하나: 토큰 BLOB/ID 배열 + 단어 빈도 행의 COO 중간 배열 (측정 약 55)
+MIN_INDEX_BATCH_ROWS = 64
+
+
+class MemoryBudgetError(MemoryError):
+    """메모리 예산 안에서 분석을 끝낼 수 없을 때 발생합니다. 메시지에 필요한 양과 예산을 담습니다."""
+
+
+def format_bytes(num_bytes):
+    return f"{num_bytes / 2**20:,.1f} MiB"
+
+
+def current_rss():
+    """현재 프로세스의 RSS(byte)를 반환합니다. 읽을 수 없으면 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if os.name == "nt":
+        return _windows_rss()
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _windows_rss():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.WorkingSetSize
+
+
+def sparse_nbytes(matrix):
+    """희소 행렬(CSR/CSC)의 data/indices/indptr 배열 크기 합계"""
+    if matrix is None:
+        return 0
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def plan_index_batch(budget, num_tokens, num_paragraphs, max_batch_rows):
+    """
+    TF-IDF 인덱스를 만들 때 한 번에 단어 빈도 행으로 만들 문단 수를 고릅니다. (예산이 None이면 max_batch_rows)
+    분석(plan_chunk_size)과 같은 모델로, 완성될 행렬과 문단 배열은 상주 메모리로, 배치 하나만 임시 메모리로 봅니다.
+    예산이 작으면 배치를 줄이고, MIN_INDEX_BATCH_ROWS개로도 들어가지 않으면 MemoryBudgetError를 냅니다.
+    분석의 최소 예산에도 같은 상주 메모리에 결과와 코퍼스 블록이 더해지므로, 웜 인덱스로 분석할 수 있는 예산이면
+    보통 콜드 상태에서 인덱스를 만드는 것도 들어갑니다. (배치 크기는 문단당 평균 토큰 수 기준)
+    """
+    resident = num_tokens * BYTES_PER_INDEX_TOKEN + num_paragraphs * BYTES_PER_PARAGRAPH
+    row_bytes = max(1, -(-num_tokens * BYTES_PER_BATCH_TOKEN // max(num_paragraphs, 1)))
+    if budget is None:
+        return max_batch_rows
+    batch_rows = (budget - resident) // row_bytes
+    if batch_rows >= MIN_INDEX_BATCH_ROWS:
+        return int(min(max_batch_rows, batch_rows))
+    needed = resident + MIN_INDEX_BATCH_ROWS * row_bytes
+    raise MemoryBudgetError(
+        f"문단 {num_paragraphs:,}개(토큰 {num_tokens:,}개)의 인덱스를 만들려면 약 {format_bytes(needed)}가 필요하지만 "
+        f"메모리 예산은 {format_bytes(budget)}입니다. 예산을 늘리거나 DB를 샤드로 나누어 주세요. (simidoc_cli.py shard)"
+    )
+
+
+def estimate_analysis(num_paragraphs, num_targets, top_k, resident_bytes, corpus_copy_bytes, row_bytes):
+    """
+    분석 한 번의 단계별 메모리 추정치를 반환합니다.
+    resident_bytes: 이미 올라와 있는 인덱스(행렬, 문단 배열 등), corpus_copy_bytes: 곱셈용 전치 복사본 (근사 검색이면 0),
+    row_bytes: 타겟 문단 한 개를 코퍼스 전체와 비교할 때의 유사도 블록 크기
+    """
+    return {
+        "paragraphs": num_paragraphs,
+        "resident_bytes": resident_bytes,
+        "corpus_copy_bytes": corpus_copy_bytes,
+        "block_bytes_per_row": row_bytes,
+        "results_bytes": num_targets * (top_k + 1) * BYTES_PER_RESULT,
+    }
+
+
+def stream_rows_that_fit(budget, estimates, block_rows):
+    """스트리밍 모드에서 코퍼스 block_rows행 블록과 함께 예산에 들어가는 타겟 문단 수 (0이면 안 들어감)"""
+    fixed = estimates["resident_bytes"] + estimates["results_bytes"]
+    block_copy_bytes = estimates["corpus_copy_bytes"] * block_rows // max(estimates["paragraphs"], 1)
+    return max(0, (budget - fixed - block_copy_bytes) // (block_rows * BYTES_PER_SIMILARITY))
+
+
+def plan_chunk_size(budget, estimates, max_chunk_size):
+    """
+    예산 안에 들어가는 (chunk_size, 스트리밍 블록 행 수)를 고릅니다. 블록 행 수가 None이면 일반 모드입니다.
+    1. 상주 인덱스 + 전치 복사본 + 결과 + 유사도 블록 → 일반 모드 (예산이 None이면 항상 일반 모드)
+    2. 상주 인덱스 + 결과 + 코퍼스 블록의 전치 복사본 + 블록 크기의 유사도 → 스트리밍 모드 (블록을 절반씩 줄여가며 시도)
+    3. MIN_STREAM_BLOCK_ROWS행 블록으로도 타겟 문단 한 개가 들어가지 않으면 MemoryBudgetError
+    """
+    if budget is None:
+        return max_chunk_size, None
+    fixed = estimates["resident_bytes"] + estimates["results_bytes"]
+    normal_rows = (budget - fixed - estimates["corpus_copy_bytes"]) // max(estimates["block_bytes_per_row"], 1)
+    if normal_rows >= 1:
+        return int(min(max_chunk_size, normal_rows)), None
+    block_rows = min(STREAM_BLOCK_ROWS, estimates["paragraphs"])
+    while True:
+        stream_rows = stream_rows_that_fit(budget, estimates, block_rows)
+        if stream_rows >= 1:
+            return int(min(max_chunk_size, stream_rows)), block_rows
+        if block_rows <= MIN_STREAM_BLOCK_ROWS:
+            break
+        block_rows = max(MIN_STREAM_BLOCK_ROWS, block_rows // 2)
+    needed = fixed + estimates["corpus_copy_bytes"] * block_rows // max(estimates["paragraphs"], 1) + block_rows * BYTES_PER_SIMILARITY
+    raise MemoryBudgetError(
+        f"이 분석에는 최소 {format_bytes(needed)}가 필요하지만 메모리 예산은 {format_bytes(budget)}입니다. "
+        f"(인덱스 {format_bytes(estimates['resident_bytes'])}, 결과 {format_bytes(estimates['results_bytes'])}) "
+        f"한 번에 분석할 PDF 수를 줄이거나 예산을 늘려 주세요."
+    )
+
+
+class MemoryMonitor:
+    """
+    with 블록 동안의 메모리 사용량을 잽니다.
+    - use_tracemalloc=True이면 tracemalloc으로 파이썬/NumPy 할당의 최대치를 잽니다. (파이썬 코드가 조금 느려짐)
+      tracemalloc은 프로세스 전체에 하나이므로, 여러 쓰레드가 동시에 분석하면 서로의 할당이 섞여서 잡힙니다.
+    - 백그라운드 쓰레드가 RSS_SAMPLE_INTERVAL마다 RSS를 샘플링하여 최대치를 기록합니다. (네이티브 라이브러리 할당 포함)
+    """
+    def __init__(self, use_tracemalloc=False, sample_interval=RSS_SAMPLE_INTERVAL):
+        self.use_tracemalloc = use_tracemalloc
+        self.sample_interval = sample_interval
+        self.rss_start = None
+        self.peak_rss = None
+        self.peak_traced = None
+        self._traced_start = 0
+        self._window_rss = None # take_window_peak()를 마지막으로 호출한 뒤의 최대 RSS
+        self._window_start_rss = None # take_window_peak()를 마지막으로 호출했을 때의 RSS
+        self._started_tracing = False
+        self._stop_event = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        if self.use_tracemalloc:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._started_tracing = True
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+            self.peak_traced = 0
+        self.rss_start = self.peak_rss = self._window_rss = self._window_start_rss = current_rss()
+        if self.rss_start is not None:
+            self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+            self._sampler.start()
+        return self
+
+    def _sample_rss(self):
+        while not self._stop_event.wait(self.sample_interval):
+            self._record_rss()
+
+    def _record_rss(self):
+        rss = current_rss()
+        if rss is not None:
+            if self.peak_rss is None or rss > self.peak_rss:
+                self.peak_rss = rss
+            if self._window_rss is None or rss > self._window_rss:
+                self._window_rss = rss
+        return rss
+
+    def take_window_peak(self):
+        """
+        마지막 호출(처음에는 with 블록 시작) 이후 최대로 늘어난 메모리(byte)를 반환하고 구간을 새로 시작합니다.
+        tracemalloc을 쓰면 그 최대치, 아니면 샘플링한 RSS 최대치 기준입니다. (모를 때는 0)
+        RSS는 해제한 메모리를 할당기가 쥐고 있으면 줄어들지 않으므로, 고정된 rss_start가 아니라 구간 시작의 RSS와 비교합니다.
+        (그렇지 않으면 앞 구간의 최대치가 뒤의 모든 구간에 다시 잡혀 예산 초과로 잘못 판단합니다)
+        """
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            window = max(0, tracemalloc.get_traced_memory()[1] - self._traced_start)
+            self.peak_traced = max(self.peak_traced or 0, window)
+            tracemalloc.reset_peak()
+            return window
+        rss = self._record_rss()
+        if rss is None or self._window_start_rss is None:
+            return 0
+        window = self._window_rss - self._window_start_rss
+        self._window_rss = self._window_start_rss = rss
+        return max(0, window)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self._record_rss()
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            self.take_window_peak()
+            if self._started_tracing:
+                tracemalloc.stop()
+        return False
+
+    def as_metrics(self):
+        return {
+            "peak_traced_bytes": self.peak_traced,
+            "rss_start_bytes": self.rss_start,
+            "peak_rss_bytes": self.peak_rss,
+            "peak_rss_increase_bytes": None if self.peak_rss is None or self.rss_start is None else self.peak_rss - self.rss_start,
+        }
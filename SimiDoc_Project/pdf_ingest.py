@@ -0,0 +1,242 @@
+"""
+SimiDoc PDF 수집(ingest) 모듈.
+
+PDF 텍스트 추출, 문단 분할, DB 저장 로직을 GUI와 분리해 둔 모듈입니다.
+Qt에 의존하지 않으므로 GUI의 백그라운드 쓰레드, 폴더 감시, 명령줄 도구에서 함께 사용합니다.
+"""
+import difflib
+import hashlib
+import os
+import re
+from datetime import datetime
+
+import risk_scores
+import tokenization
+
+try:
+    import fitz  # PyMuPDF
+except ModuleNotFoundError:
+    fitz = None
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S" # GUI의 QDateTime 형식 "yyyy-MM-dd HH:mm:ss"와 동일
+
+MAX_PARA_LENGTH = 400
+MIN_SENTENCE_LENGTH = 10
+HASH_BLOCK_SIZE = 1 << 20 # 파일 해시를 계산할 때 한 번에 읽는 바이트 수
+
+# 예전 DB에는 없던 pdfs 열들. init_database가 ALTER TABLE로 추가합니다.
+PDF_FILE_INFO_COLUMNS = (("file_size", "INTEGER"), ("file_mtime_ns", "INTEGER"), ("content_hash", "TEXT"))
+
+
+def init_database(conn):
+    """pdfs / paragraphs / ingest_jobs / 토큰 캐시 / 위험도 테이블이 없으면 생성하고, 예전 DB의 pdfs 테이블에는 파일 정보 열을 추가합니다."""
+    cursor = conn.cursor()
+    # file_size / file_mtime_ns / content_hash: 다시 검사(rescan)할 때 내용이 바뀐 파일만 골라내기 위한 파일 정보
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pdfs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL UNIQUE,
+            file_name TEXT NOT NULL,
+            loaded_date TEXT NOT NULL,
+            file_size INTEGER,
+            file_mtime_ns INTEGER,
+            content_hash TEXT
+        )
+    ''')
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(pdfs)")}
+    for column, column_type in PDF_FILE_INFO_COLUMNS:
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE pdfs ADD COLUMN {column} {column_type}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pdfs_content_hash ON pdfs (content_hash)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paragraphs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pdf_id INTEGER NOT NULL,
+            paragraph_text TEXT NOT NULL,
+            page_number INTEGER,
+            FOREIGN KEY (pdf_id) REFERENCES pdfs (id) ON DELETE CASCADE
+        )
+    ''')
+    # 대량 가져오기(bulk_import.py)의 파일별 진행 상태. 중단된 뒤에도 이어서 가져올 수 있게 합니다.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            pdf_id INTEGER,
+            updated_date TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status)")
+    tokenization.init_token_tables(cursor)
+    risk_scores.init_risk_tables(cursor)
+    conn.commit()
+
+
+def extract_text_from_pdf(pdf_path):
+    """PDF 파일에서 모든 텍스트를 추출합니다. 실패하면 예외를 그대로 올립니다."""
+    if fitz is None:
+        raise RuntimeError("PyMuPDF(fitz)가 설치되어 있지 않아 PDF를 읽을 수 없습니다.")
+    doc = fitz.open(pdf_path)
+    try:
+        return "".join(doc.load_page(page_num).get_text() for page_num in range(doc.page_count))
+    finally:
+        doc.close()
+
+
+def split_text_into_paragraphs(text):
+    """추출한 텍스트를 최대 MAX_PARA_LENGTH 길이의 문단들로 나눕니다."""
+    text = text.strip()
+    text = text.replace('ㅡ', '')
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'([^\n.?!])\n([^\n])', r'\1 \2', text)
+    text = re.sub(r'([.?!])([ㄱ-ㅎㅏ-ㅣ가-힣])', r'\1 \2', text)
+    text = re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+    raw_paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+
+    final_paragraphs = []
+
+    for raw_para in raw_paragraphs:
+        raw_para = re.sub(r'(?<!\')([,])(?!\')', r'\1 ', raw_para)
+        raw_para = re.sub(r'([.?!])', r'\1 ', raw_para)
+        raw_para = re.sub(r'\s+', ' ', raw_para).strip()
+
+        sentences = re.split(r'(?<=[.?!”])\s*(?=[ㄱ-ㅎㅏ-ㅣ가-힣A-Za-z”])', raw_para) # 수정된 정규식
+        sentences = [s.strip() for s in sentences if len(s.strip()) > MIN_SENTENCE_LENGTH]
+
+        current_paragraph_buffer = []
+        current_paragraph_length = 0
+
+        for sentence in sentences:
+            if current_paragraph_length + len(sentence) + 1 <= MAX_PARA_LENGTH:
+                current_paragraph_buffer.append(sentence)
+                current_paragraph_length += len(sentence) + 1
+            else:
+                if current_paragraph_buffer:
+                    final_paragraphs.append(" ".join(current_paragraph_buffer))
+                current_paragraph_buffer = [sentence]
+                current_paragraph_length = len(sentence) + 1
+
+        if current_paragraph_buffer:
+            final_paragraphs.append(" ".join(current_paragraph_buffer))
+
+    return final_paragraphs
+
+
+def extract_paragraphs(pdf_path):
+    """PDF 하나를 DB에 저장할 문단 리스트로 변환합니다. (프로세스 풀에서 병렬로 호출할 수 있는 최상위 함수)"""
+    paragraphs = split_text_into_paragraphs(extract_text_from_pdf(pdf_path))
+    return [p.strip() for p in paragraphs if p.strip()]
+
+
+def hash_file(file_path):
+    """파일 내용의 SHA-256 해시(16진수 문자열)를 계산합니다."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_file_info(file_path, with_hash=True):
+    """(크기, 수정시각 ns, 내용 해시)를 반환합니다. 파일이 없으면 (None, None, None)입니다."""
+    try:
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns, hash_file(file_path) if with_hash else None
+    except OSError:
+        return None, None, None
+
+
+def update_file_info(cursor, pdf_id, file_info):
+    cursor.execute("UPDATE pdfs SET file_size = ?, file_mtime_ns = ?, content_hash = ? WHERE id = ?", (*file_info, pdf_id))
+
+
+def find_pdf_id(cursor, file_path):
+    cursor.execute("SELECT id FROM pdfs WHERE file_path = ?", (file_path,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def path_key(file_path):
+    """같은 파일의 다른 경로 표기('C:/a/b.pdf'와 'c:\\a\\b.pdf' 등)를 같은 값으로 만드는 비교용 키"""
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def find_existing_pdf(cursor, file_path, pdf_ids_by_key):
+    """
+    경로로 저장된 PDF ID를 찾습니다. 표기가 그대로 같은 경로가 없으면 path_key로 정규화한 경로로 다시 찾습니다.
+    (GUI의 '파일 추가'로 'C:/a/b.pdf'처럼 다른 표기로 저장된 파일도 같은 PDF로 취급)
+    pdf_ids_by_key({path_key: PDF ID})는 처음 필요할 때 한 번만 채우며, 호출하는 쪽에서 새로 저장한 PDF를 추가합니다.
+    """
+    pdf_id = find_pdf_id(cursor, file_path)
+    if pdf_id is not None:
+        return pdf_id
+    if not pdf_ids_by_key:
+        for existing_id, existing_path in cursor.execute("SELECT id, file_path FROM pdfs"):
+            pdf_ids_by_key[path_key(existing_path)] = existing_id
+    return pdf_ids_by_key.get(path_key(file_path))
+
+
+def find_pdf_by_hash(cursor, content_hash):
+    """내용 해시가 같은 PDF의 (ID, 경로)를 반환합니다. 없으면 None"""
+    if content_hash is None:
+        return None
+    cursor.execute("SELECT id, file_path FROM pdfs WHERE content_hash = ? LIMIT 1", (content_hash,))
+    return cursor.fetchone()
+
+
+def insert_pdf(cursor, file_path, paragraphs, loaded_date=None, file_info=None):
+    """
+    이미 추출된 문단들과 함께 PDF 한 개를 저장하고 새 PDF ID를 반환합니다.
+    commit은 호출하는 쪽에서 합니다. (여러 파일을 한 트랜잭션으로 묶을 수 있도록)
+    file_info((크기, 수정시각 ns, 해시))를 주지 않으면 파일에서 직접 읽습니다.
+    """
+    if loaded_date is None:
+        loaded_date = datetime.now().strftime(DATE_FORMAT)
+    if file_info is None:
+        file_info = read_file_info(file_path)
+    cursor.execute("INSERT INTO pdfs (file_path, file_name, loaded_date, file_size, file_mtime_ns, content_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                   (file_path, os.path.basename(file_path), loaded_date, *file_info))
+    pdf_id = cursor.lastrowid
+    cursor.executemany("INSERT INTO paragraphs (pdf_id, paragraph_text, page_number) VALUES (?, ?, ?)",
+                       ((pdf_id, para_text, i + 1) for i, para_text in enumerate(paragraphs)))
+    tokenization.cache_pdf_tokens(cursor, pdf_id)
+    return pdf_id
+
+
+def delete_pdf(cursor, pdf_id):
+    """PDF와 그 문단들을 삭제합니다. (외래키 CASCADE에 의존하지 않고 문단을 먼저 명시적으로 삭제)"""
+    tokenization.delete_paragraph_tokens(cursor, [row[0] for row in cursor.execute("SELECT id FROM paragraphs WHERE pdf_id = ?", (pdf_id,))])
+    cursor.execute("DELETE FROM paragraphs WHERE pdf_id = ?", (pdf_id,))
+    cursor.execute("DELETE FROM pdfs WHERE id = ?", (pdf_id,))
+    risk_scores.delete_pdf_scores(cursor, pdf_id)
+
+
+def replace_pdf_paragraphs(cursor, pdf_id, paragraphs):
+    """
+    저장된 PDF의 문단들을 새로 추출한 문단들로 바꾸되, 실제로 바뀐 문단만 고칩니다.
+    - 내용이 같은 문단은 행(ID)을 그대로 두고, 위치가 밀렸으면 문단 순서(page_number)만 고칩니다.
+    - 바뀐 문단은 삭제 후 새 행으로 추가합니다. (새 ID를 받으므로 분석기가 변경을 알아채고 그 문단만 다시 벡터화합니다)
+    반환값: (추가된 문단 수, 삭제된 문단 수)
+    """
+    cursor.execute("SELECT id, paragraph_text FROM paragraphs WHERE pdf_id = ? ORDER BY page_number ASC", (pdf_id,))
+    old_rows = cursor.fetchall()
+    matcher = difflib.SequenceMatcher(None, [text for _, text in old_rows], paragraphs, autojunk=False)
+    removed_ids, added, renumbered = [], [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            renumbered.extend((j1 + k + 1, old_rows[i1 + k][0]) for k in range(i2 - i1) if i1 != j1)
+        else:
+            removed_ids.extend(para_id for para_id, _ in old_rows[i1:i2])
+            added.extend((pdf_id, paragraphs[j], j + 1) for j in range(j1, j2))
+    cursor.executemany("DELETE FROM paragraphs WHERE id = ?", ((para_id,) for para_id in removed_ids))
+    cursor.executemany("UPDATE paragraphs SET page_number = ? WHERE id = ?", renumbered)
+    cursor.executemany("INSERT INTO paragraphs (pdf_id, paragraph_text, page_number) VALUES (?, ?, ?)", added)
+    tokenization.delete_paragraph_tokens(cursor, removed_ids)
+    tokenization.cache_pdf_tokens(cursor, pdf_id)
+    if added or removed_ids:
+        risk_scores.delete_pdf_scores(cursor, pdf_id) # 바뀐 PDF는 위험도를 가장 먼저 다시 계산합니다.
+    return len(added), len(removed_ids)
@@ -0,0 +1,157 @@
+"""
+SimiDoc 표절 위험도 사전 계산 모듈.
+
+분석 결과(문단별 최고 유사도)를 DB에 저장해 두어, 파일 목록을 열자마자 위험한 PDF를 정렬/색상으로 보여줄 수 있게 합니다.
+- pdf_risk       : PDF별 최고 유사도와 문단 최고 유사도의 평균, 계산할 때의 코퍼스 상태와 분석 방식
+- paragraph_risk : 문단별 최고 유사도와 그 유사 문단 ID
+코퍼스 상태(문단 수, 최대 문단 ID)나 분석 방식(토큰화/LSA)이 바뀌면 저장된 점수는 '오래된(stale)' 점수가 됩니다.
+오래된 점수도 새로 계산될 때까지는 그대로 보여주고, 점수가 없는 PDF부터 먼저 계산합니다.
+Qt에 의존하지 않으므로 GUI의 유휴 시간 워커와 명령줄 도구에서 함께 사용할 수 있습니다.
+"""
+import sqlite3
+from datetime import datetime
+
+PRECOMPUTE_BATCH_SIZE = 8 # 한 번의 analyze_many로 계산할 PDF 수 (작을수록 대화형 분석에 빨리 양보)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def init_risk_tables(cursor):
+    """위험도 테이블이 없으면 생성합니다. (pdf_ingest.init_database에서도 호출)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_risk (
+            pdf_id INTEGER PRIMARY KEY,
+            max_similarity REAL NOT NULL,
+            mean_similarity REAL NOT NULL,
+            scoring_mode TEXT NOT NULL,
+            corpus_count INTEGER NOT NULL,
+            corpus_max_id INTEGER,
+            scored_date TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paragraph_risk (
+            paragraph_id INTEGER PRIMARY KEY,
+            pdf_id INTEGER NOT NULL,
+            max_similarity REAL NOT NULL,
+            source_paragraph_id INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_paragraph_risk_pdf ON paragraph_risk (pdf_id)")
+
+
+def scoring_mode(analyzer):
+    """점수를 계산한 분석 방식을 문자열로 요약합니다. 예: 'word', 'particle+lsa'"""
+    mode = getattr(analyzer, "tokenizer", "word")
+    return f"{mode}+lsa" if getattr(analyzer, "semantic", False) else mode
+
+
+def corpus_signature(cursor):
+    """현재 코퍼스 상태 (문단 수, 최대 문단 ID). SimilarityAnalyzer의 인덱스 서명과 같은 값입니다."""
+    return tuple(cursor.execute("SELECT COUNT(*), MAX(id) FROM paragraphs").fetchone())
+
+
+def pending_pdf_ids(cursor, signature, mode, limit=PRECOMPUTE_BATCH_SIZE):
+    """점수가 없는 PDF를 먼저, 그 다음 오래된 점수를 가진 PDF를 오래 전에 계산한 것부터 최대 limit개 반환합니다."""
+    cursor.execute('''
+        SELECT p.id FROM pdfs p LEFT JOIN pdf_risk r ON r.pdf_id = p.id
+        WHERE r.pdf_id IS NULL OR r.scoring_mode != ? OR r.corpus_count != ? OR r.corpus_max_id IS NOT ?
+        ORDER BY r.pdf_id IS NOT NULL, r.scored_date, p.id
+        LIMIT ?
+    ''', (mode, signature[0], signature[1], limit))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def save_results(cursor, results_by_pdf, signature, mode, scored_date=None):
+    """
+    analyze_many의 결과({pdf_id: 결과 리스트})에서 문단별 최고 유사도를 뽑아 저장합니다. commit은 호출하는 쪽에서 합니다.
+    반환값: {pdf_id: PDF의 최고 유사도}
+    """
+    if scored_date is None:
+        scored_date = datetime.now().strftime(DATE_FORMAT)
+    pdf_risks = {}
+    for pdf_id, results in results_by_pdf.items():
+        paragraph_rows = []
+        for res in results:
+            best = max(res['similar_paragraphs'], key=lambda sim: sim['similarity'], default=None)
+            if best is None:
+                paragraph_rows.append((res['target_paragraph'][0], pdf_id, 0.0, None))
+            else:
+                paragraph_rows.append((res['target_paragraph'][0], pdf_id, best['similarity'], best['source_paragraph'][0]))
+        scores = [row[2] for row in paragraph_rows]
+        pdf_risks[pdf_id] = max(scores, default=0.0)
+        cursor.execute("DELETE FROM paragraph_risk WHERE pdf_id = ?", (pdf_id,))
+        cursor.executemany("INSERT INTO paragraph_risk (paragraph_id, pdf_id, max_similarity, source_paragraph_id) VALUES (?, ?, ?, ?)", paragraph_rows)
+        cursor.execute(
+            "INSERT OR REPLACE INTO pdf_risk (pdf_id, max_similarity, mean_similarity, scoring_mode, corpus_count, corpus_max_id, scored_date) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pdf_id, pdf_risks[pdf_id], sum(scores) / len(scores) if scores else 0.0, mode, signature[0], signature[1], scored_date),
+        )
+    return pdf_risks
+
+
+def delete_pdf_scores(cursor, pdf_id):
+    """PDF의 점수를 지웁니다. 문단이 바뀐 PDF는 점수가 없는 PDF가 되어 가장 먼저 다시 계산됩니다."""
+    cursor.execute("DELETE FROM paragraph_risk WHERE pdf_id = ?", (pdf_id,))
+    cursor.execute("DELETE FROM pdf_risk WHERE pdf_id = ?", (pdf_id,))
+
+
+def load_pdf_risks(cursor, mode=None):
+    """
+    저장된 PDF별 점수를 {pdf_id: (최고 유사도, 오래된 점수 여부)}로 반환합니다.
+    mode를 주면 다른 분석 방식으로 계산한 점수도 오래된 점수로 표시합니다.
+    """
+    signature = corpus_signature(cursor)
+    risks = {}
+    for pdf_id, max_similarity, scored_mode, corpus_count, corpus_max_id in cursor.execute(
+            "SELECT pdf_id, max_similarity, scoring_mode, corpus_count, corpus_max_id FROM pdf_risk"):
+        stale = (corpus_count, corpus_max_id) != signature or (mode is not None and scored_mode != mode)
+        risks[pdf_id] = (max_similarity, stale)
+    return risks
+
+
+def load_paragraph_risks(cursor, pdf_id):
+    """PDF 한 개의 문단별 최고 유사도를 {문단 순서: 최고 유사도}로 반환합니다. (GUI 표절률 캐시와 같은 키)"""
+    cursor.execute('''
+        SELECT p.page_number, r.max_similarity FROM paragraph_risk r JOIN paragraphs p ON p.id = r.paragraph_id
+        WHERE r.pdf_id = ?
+    ''', (pdf_id,))
+    return dict(cursor.fetchall())
+
+
+def score_pending(analyzer, batch_size=PRECOMPUTE_BATCH_SIZE, stop_event=None, progress_callback=None):
+    """
+    점수가 없거나 오래된 PDF들을 batch_size개씩 analyze_many로 분석하여 저장합니다.
+    stop_event는 analyze_many에도 넘기므로, 멈추라는 요청에는 분석 청크 하나 안에 응답합니다. (중단된 배치는 저장하지 않음)
+    progress_callback에는 배치마다 {pdf_id: 최고 유사도}와 누적 계산 수를 넘깁니다.
+    반환값: 이번에 계산한 PDF 수
+    """
+    import similarity_analyzer
+
+    mode = scoring_mode(analyzer)
+    scored = 0
+    conn = sqlite3.connect(analyzer.db_path)
+    try:
+        cursor = conn.cursor()
+        init_risk_tables(cursor)
+        while not (stop_event and stop_event.is_set()):
+            signature = corpus_signature(cursor)
+            pdf_ids = pending_pdf_ids(cursor, signature, mode, batch_size)
+            if not pdf_ids:
+                break
+            # top_k=1, min_similarity=0.0: 문단마다 가장 비슷한 문단 하나만 있으면 최고 유사도를 알 수 있습니다.
+            try:
+                results_by_pdf = analyzer.analyze_many(pdf_ids, top_k=1, min_similarity=0.0, stop_event=stop_event)
+            except similarity_analyzer.AnalysisCancelled:
+                break
+            pdf_risks = save_results(cursor, results_by_pdf, signature, mode)
+            conn.commit()
+            scored += len(pdf_risks)
+            if progress_callback:
+                progress_callback(pdf_risks, scored)
+    except sqlite3.Error as e:
+        print(f"ERROR(Risk): 위험도 저장 오류: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+    print(f"DEBUG(Risk): Scored {scored} PDFs. mode={mode}")
+    return scored
@@ -0,0 +1,188 @@
+"""
+SimiDoc 의미 유사도(LSA) 모듈.
+
+TF-IDF 코사인은 단어가 겹쳐야만 유사하다고 판단하므로, 단어를 바꿔 쓴(paraphrase) 표절을 놓치기 쉽습니다.
+이 모듈은 TF-IDF 행렬을 TruncatedSVD로 저차원 밀집 공간(LSA)에 투영하고, 근사 최근접 이웃(ANN) 인덱스로 검색합니다.
+- 임베딩은 float32로 저장하며 DB 옆에 .npy 파일로 남겨 다음 실행 때 다시 계산하지 않습니다. (네트워크 모델 사용 안 함)
+- ANN 인덱스는 NumPy만으로 만든 IVF(inverted file)입니다. 임베딩을 k-means 중심(centroid)별 리스트로 나누고,
+  질의마다 가까운 중심 n_probe개의 리스트만 비교하므로 질의 비용이 코퍼스 크기에 비례하지 않습니다.
+"""
+import os
+
+import numpy as np
+
+try:
+    from sklearn.decomposition import TruncatedSVD
+except ModuleNotFoundError:
+    TruncatedSVD = None # scikit-learn이 없으면 의미 유사도 모드를 사용할 수 없습니다.
+
+SEARCH_BLOCK_SIZE = 65536 # 전체 비교(정확 검색)나 리스트 배정 때 한 번에 곱할 임베딩 행 수
+
+
+def normalize_rows(vectors):
+    """행마다 L2 정규화한 float32 배열을 반환합니다. (영벡터는 그대로)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _select_top_k(scores, rows, top_k, min_similarity):
+    """한 질의의 후보 점수들 중 min_similarity 이상인 상위 top_k개를 (행 번호, 유사도) 내림차순으로 반환합니다. (동점이면 행 번호 순)"""
+    keep = scores >= min_similarity if min_similarity > 0.0 else scores > 0.0
+    scores, rows = scores[keep], rows[keep]
+    if len(scores) > top_k:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+        scores, rows = scores[part], rows[part]
+    order = np.lexsort((rows, -scores))
+    return rows[order], scores[order]
+
+
+class LsaIndex:
+    """
+    LSA 임베딩과 IVF 근사 검색 인덱스.
+    n_lists를 생략하면 sqrt(문단 수)개의 리스트를 만들고, 질의마다 n_probe개의 리스트를 확인합니다.
+    n_probe를 늘리면 재현율(recall)이 오르고 질의 시간도 늘어납니다.
+    """
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE_PER_LIST = 64 # 중심을 학습할 때 리스트 하나당 사용할 샘플 수
+
+    def __init__(self, n_components=128, n_lists=None, n_probe=8, random_state=0):
+        self.n_components = n_components
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+        self.components = None # (차원 수 x TF-IDF 열 수) 투영 행렬
+        self.embeddings = None # (문단 수 x 차원 수) L2 정규화된 float32 임베딩. 행 번호는 분석기의 ParagraphStore 행과 같음
+        self.centroids = None
+        self.list_rows = None # 리스트 순서로 정렬된 행 번호
+        self.list_offsets = None # 리스트 i의 행들은 list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.signature = None # 이 인덱스를 만들 때의 분석기 인덱스 상태 (문단 수, 최대 문단 ID)
+        self.para_ids = None
+
+    def __len__(self):
+        return 0 if self.embeddings is None else len(self.embeddings)
+
+    def fit(self, paragraph_vectors, para_ids, signature=None):
+        """TF-IDF 행렬로 SVD 투영을 학습하고 모든 문단의 임베딩과 IVF 리스트를 만듭니다."""
+        if TruncatedSVD is None:
+            raise RuntimeError("scikit-learn이 설치되어 있지 않아 의미 유사도(LSA) 모드를 사용할 수 없습니다.")
+        n_components = max(1, min(self.n_components, paragraph_vectors.shape[1] - 1, paragraph_vectors.shape[0] - 1))
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=self.random_state)
+        svd.fit(paragraph_vectors)
+        self.components = svd.components_.astype(np.float32)
+        self.embeddings = self.project(paragraph_vectors)
+        self._build_lists()
+        self.para_ids = np.asarray(para_ids, dtype=np.int64)
+        self.signature = signature
+        return self
+
+    def refresh(self, paragraph_vectors, para_ids, signature=None):
+        """
+        분석기 인덱스에 문단이 조금 추가/삭제된 경우, 학습된 투영과 중심은 그대로 두고 임베딩과 리스트 배정만 다시 합니다.
+        (SVD와 k-means를 다시 학습하는 것보다 훨씬 빠름)
+        """
+        self.embeddings = self.project(paragraph_vectors)
+        self.list_rows, self.list_offsets = self._assign_lists(self.embeddings)
+        self.para_ids = np.asarray(para_ids, dtype=np.int64)
+        self.signature = signature
+        return self
+
+    def project(self, tfidf_vectors):
+        """TF-IDF 벡터(희소 행렬)를 L2 정규화된 LSA 임베딩으로 투영합니다."""
+        projected = tfidf_vectors @ self.components.T
+        return normalize_rows(projected)
+
+    def _build_lists(self):
+        """임베딩 일부를 샘플링하여 구면(spherical) k-means로 중심을 학습하고, 모든 임베딩을 가장 가까운 중심의 리스트에 넣습니다."""
+        rng = np.random.default_rng(self.random_state)
+        num_rows = len(self.embeddings)
+        n_lists = self.n_lists or max(1, int(np.sqrt(num_rows)))
+        n_lists = min(n_lists, num_rows)
+        sample_size = min(num_rows, n_lists * self.KMEANS_SAMPLE_PER_LIST)
+        sample = self.embeddings[rng.choice(num_rows, sample_size, replace=False)] if sample_size < num_rows else self.embeddings
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))] # 빈 리스트는 임의의 샘플로 다시 시작
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+        self.list_rows, self.list_offsets = self._assign_lists(self.embeddings)
+
+    def _assign_lists(self, embeddings):
+        assignment = np.empty(len(embeddings), dtype=np.int32)
+        for start in range(0, len(embeddings), SEARCH_BLOCK_SIZE):
+            assignment[start:start + SEARCH_BLOCK_SIZE] = np.argmax(embeddings[start:start + SEARCH_BLOCK_SIZE] @ self.centroids.T, axis=1)
+        list_rows = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.r_[0, np.cumsum(np.bincount(assignment, minlength=len(self.centroids)))].astype(np.int64)
+        return list_rows, list_offsets
+
+    def search(self, query_embeddings, top_k, min_similarity=0.0, exclude_rows=None, n_probe=None):
+        """
+        IVF 근사 검색. 질의마다 가까운 중심 n_probe개의 리스트에 들어 있는 문단만 비교합니다.
+        반환값은 similarity_analyzer.top_k_similarities와 같은 (질의 행 번호, 코퍼스 행 번호, 유사도) 배열입니다.
+        """
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        centroid_scores = query_embeddings @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        query_rows, source_rows, similarities = [], [], []
+        for query_row, query in enumerate(query_embeddings):
+            candidates = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probes[query_row]])
+            if exclude_rows is not None:
+                candidates = candidates[candidates != exclude_rows[query_row]]
+            rows, scores = _select_top_k(self.embeddings[candidates] @ query, candidates, top_k, min_similarity)
+            query_rows.append(np.full(len(rows), query_row, dtype=np.int64))
+            source_rows.append(rows)
+            similarities.append(scores)
+        return self._concat(query_rows, source_rows, similarities)
+
+    def search_exact(self, query_embeddings, top_k, min_similarity=0.0, exclude_rows=None):
+        """모든 임베딩과 비교하는 정확 검색. (ANN 재현율 측정의 기준)"""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        all_rows = np.arange(len(self.embeddings), dtype=np.int64)
+        query_rows, source_rows, similarities = [], [], []
+        for query_row, query in enumerate(query_embeddings):
+            scores = np.concatenate([self.embeddings[start:start + SEARCH_BLOCK_SIZE] @ query
+                                     for start in range(0, len(self.embeddings), SEARCH_BLOCK_SIZE)])
+            if exclude_rows is not None and exclude_rows[query_row] >= 0:
+                scores[exclude_rows[query_row]] = -np.inf
+            rows, scores = _select_top_k(scores, all_rows, top_k, min_similarity)
+            query_rows.append(np.full(len(rows), query_row, dtype=np.int64))
+            source_rows.append(rows)
+            similarities.append(scores)
+        return self._concat(query_rows, source_rows, similarities)
+
+    @staticmethod
+    def _concat(query_rows, source_rows, similarities):
+        if not query_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(query_rows), np.concatenate(source_rows), np.concatenate(similarities)
+
+    def save(self, path_prefix):
+        """임베딩은 path_prefix.npy에, 투영 행렬/중심/리스트/검증 정보는 path_prefix.npz에 저장합니다."""
+        np.save(path_prefix + ".npy", self.embeddings)
+        np.savez(path_prefix + ".npz", components=self.components, centroids=self.centroids,
+                 list_rows=self.list_rows, list_offsets=self.list_offsets, para_ids=self.para_ids,
+                 signature=np.asarray(self.signature if self.signature is not None else (-1, -1), dtype=np.int64),
+                 n_probe=self.n_probe)
+
+    @classmethod
+    def load(cls, path_prefix):
+        """save()로 저장한 인덱스를 읽습니다. 파일이 없으면 None. 임베딩은 메모리 맵으로 열어 필요한 부분만 읽습니다."""
+        if not (os.path.exists(path_prefix + ".npy") and os.path.exists(path_prefix + ".npz")):
+            return None
+        with np.load(path_prefix + ".npz") as data:
+            index = cls(n_components=data["components"].shape[0], n_lists=len(data["centroids"]), n_probe=int(data["n_probe"]))
+            index.components = data["components"]
+            index.centroids = data["centroids"]
+            index.list_rows = data["list_rows"]
+            index.list_offsets = data["list_offsets"]
+            index.para_ids = data["para_ids"]
+            index.signature = tuple(int(v) for v in data["signature"])
+        index.embeddings = np.load(path_prefix + ".npy", mmap_mode="r")
+        return index
@@ -0,0 +1,431 @@
+"""
+SimiDoc 샤드(shard) 관리 모듈.
+
+검사한 모든 문서를 simidoc.db 하나에 넣으면 SQLite 파일과 분석기의 메모리 인덱스가 함께 커집니다.
+이 모듈은 pdfs / paragraphs 코퍼스를 여러 개의 샤드 DB로 나누어 저장하고, 샤드마다 따로 인덱스를 만듭니다.
+- 샤드 목록과 "어떤 파일이 어느 샤드에 있는지"(pdf_routes)는 샤드 폴더의 shards.db(코디네이터 DB)에 기록합니다.
+- 분할 방식은 hash(파일 경로의 해시) 또는 year(파일의 연도)입니다. 한 번 배정된 파일은 기록된 샤드에 계속 남으므로,
+  샤드를 새로 추가해도 기존 샤드를 다시 나누거나 다시 인덱싱할 필요가 없습니다.
+- ShardCoordinator는 분석 요청을 샤드마다 전용 워커 프로세스로 동시에 보내고, 샤드별 상위 top_k 결과를 하나로 병합합니다.
+  각 워커 프로세스는 자기 샤드의 웜 인덱스를 계속 들고 있습니다.
+"""
+import heapq
+import itertools
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pdf_ingest
+import similarity_analyzer
+
+COORDINATOR_DB_NAME = "shards.db"
+STRATEGY_HASH = "hash"
+STRATEGY_YEAR = "year"
+SHARD_STRATEGIES = (STRATEGY_HASH, STRATEGY_YEAR)
+
+
+def _now():
+    return datetime.now().strftime(pdf_ingest.DATE_FORMAT)
+
+
+def _extract_file(file_path):
+    """프로세스 풀에서 실행됩니다. 예외를 문자열로 바꿔 반환하여 한 파일의 오류가 전체 배치를 멈추지 않게 합니다."""
+    try:
+        return True, pdf_ingest.extract_paragraphs(file_path)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+class ShardedCorpus:
+    """
+    샤드 폴더(root_dir) 하나를 관리합니다. 폴더 안에는 코디네이터 DB(shards.db)와 샤드 DB들이 들어 있습니다.
+    strategy는 폴더를 처음 만들 때만 지정하며, 이후에는 shards.db에 기록된 값을 사용합니다.
+    """
+    def __init__(self, root_dir, strategy=None):
+        self.root_dir = os.path.abspath(root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.coordinator_db_path = os.path.join(self.root_dir, COORDINATOR_DB_NAME)
+        conn = sqlite3.connect(self.coordinator_db_path)
+        try:
+            self._init_coordinator(conn)
+            row = conn.execute("SELECT value FROM shard_settings WHERE key = 'strategy'").fetchone()
+            if row is None:
+                strategy = strategy or STRATEGY_HASH
+                if strategy not in SHARD_STRATEGIES:
+                    raise ValueError(f"지원하지 않는 샤드 분할 방식입니다: {strategy} (가능: {', '.join(SHARD_STRATEGIES)})")
+                conn.execute("INSERT INTO shard_settings (key, value) VALUES ('strategy', ?)", (strategy,))
+                conn.commit()
+            elif strategy is not None and strategy != row[0]:
+                raise ValueError(f"이 샤드 폴더는 이미 '{row[0]}' 방식으로 만들어졌습니다: {self.root_dir}")
+            else:
+                strategy = row[0]
+        finally:
+            conn.close()
+        self.strategy = strategy
+
+    @staticmethod
+    def _init_coordinator(conn):
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS shard_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # accepting = 0인 샤드는 검색에는 쓰이지만 새 파일을 배정받지 않습니다. (예: 꽉 찬 hash 샤드, 외부에서 가져온 보관 DB)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                db_file TEXT NOT NULL,
+                year INTEGER,
+                accepting INTEGER NOT NULL DEFAULT 1,
+                created_date TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pdf_routes (
+                file_path TEXT PRIMARY KEY,
+                shard_id INTEGER NOT NULL,
+                pdf_id INTEGER NOT NULL,
+                FOREIGN KEY (shard_id) REFERENCES shards (id)
+            )
+        ''')
+        conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.coordinator_db_path)
+
+    def _resolve_db_file(self, db_file):
+        return db_file if os.path.isabs(db_file) else os.path.join(self.root_dir, db_file)
+
+    def list_shards(self):
+        """[{"id", "name", "db_path", "year", "accepting"}, ...]를 샤드 ID 순서로 반환합니다."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, name, db_file, year, accepting FROM shards ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": shard_id, "name": name, "db_path": self._resolve_db_file(db_file), "year": year, "accepting": bool(accepting)}
+            for shard_id, name, db_file, year, accepting in rows
+        ]
+
+    def get_shard(self, name):
+        for shard in self.list_shards():
+            if shard["name"] == name:
+                return shard
+        return None
+
+    def add_shard(self, name=None, year=None, source_db=None):
+        """
+        샤드를 하나 추가하고 이름을 반환합니다. 다른 샤드는 건드리지 않습니다.
+        source_db를 주면 기존 simidoc.db를 복사하지 않고 그 자리에서 샤드로 등록하며,
+        그 DB의 PDF들은 새 파일을 배정받지 않는 보관용 샤드로 경로만 기록합니다.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if name is None:
+                names = {row[0] for row in cursor.execute("SELECT name FROM shards")}
+                name = base_name = f"year_{year}" if year is not None else f"shard_{len(names):03d}"
+                # 닫아 둔 같은 연도 샤드가 이미 있으면 year_YYYY_01, year_YYYY_02, ... 순서로 비어 있는 이름을 씁니다.
+                suffix = 1
+                while name in names:
+                    name = f"{base_name}_{suffix:02d}"
+                    suffix += 1
+            if source_db is not None:
+                db_path = os.path.abspath(source_db)
+                db_file = os.path.relpath(db_path, self.root_dir) if os.path.dirname(db_path) == self.root_dir else db_path
+            else:
+                db_file = f"{name}.db"
+                db_path = self._resolve_db_file(db_file)
+
+            shard_conn = sqlite3.connect(db_path)
+            try:
+                pdf_ingest.init_database(shard_conn)
+                pdf_rows = shard_conn.execute("SELECT id, file_path FROM pdfs").fetchall() if source_db is not None else []
+            finally:
+                shard_conn.close()
+
+            cursor.execute("INSERT INTO shards (name, db_file, year, accepting, created_date) VALUES (?, ?, ?, ?, ?)",
+                           (name, db_file, year, 0 if source_db is not None else 1, _now()))
+            shard_id = cursor.lastrowid
+            cursor.executemany("INSERT OR IGNORE INTO pdf_routes (file_path, shard_id, pdf_id) VALUES (?, ?, ?)",
+                               ((file_path, shard_id, pdf_id) for pdf_id, file_path in pdf_rows))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            raise ValueError(f"이미 같은 이름의 샤드가 있습니다: {name}")
+        finally:
+            conn.close()
+        print(f"DEBUG(Shard): Added shard '{name}' ({db_path}), {len(pdf_rows)} existing PDF(s) registered.")
+        return name
+
+    def set_accepting(self, name, accepting):
+        """샤드가 새 파일을 배정받을지 설정합니다. (hash 방식에서 샤드가 너무 커졌을 때 닫아두는 용도)"""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE shards SET accepting = ? WHERE name = ?", (1 if accepting else 0, name))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _file_year(self, file_path):
+        return datetime.fromtimestamp(os.path.getmtime(file_path)).year
+
+    def route(self, file_path, year=None):
+        """
+        새 파일을 저장할 샤드 이름을 정합니다. 이미 배정된 파일이면 기록된 샤드를 그대로 반환합니다.
+        - hash: 새 파일을 받는 샤드들 중 파일 경로의 CRC32 값으로 하나를 고릅니다.
+                PDF ID는 샤드 안에서 매겨지므로 경로를 해시합니다. 샤드를 추가하면 그 뒤의 새 파일부터 나누어 받습니다.
+        - year: 연도별 샤드(year_YYYY)에 넣습니다. 해당 연도에 새 파일을 받는 샤드가 없으면 새로 만듭니다.
+                (닫힌 year_YYYY만 있으면 year_YYYY_01처럼 번호를 붙입니다. year를 주지 않으면 파일 수정 연도)
+        """
+        file_path = os.path.abspath(file_path)
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT s.name FROM pdf_routes r JOIN shards s ON s.id = r.shard_id WHERE r.file_path = ?",
+                               (file_path,)).fetchone()
+        finally:
+            conn.close()
+        if row:
+            return row[0]
+
+        if self.strategy == STRATEGY_YEAR:
+            year = int(year) if year is not None else self._file_year(file_path)
+            for shard in self.list_shards():
+                if shard["year"] == year and shard["accepting"]:
+                    return shard["name"]
+            return self.add_shard(year=year)
+
+        candidates = [shard["name"] for shard in self.list_shards() if shard["accepting"]]
+        if not candidates:
+            candidates = [self.add_shard()]
+        return candidates[zlib.crc32(file_path.encode("utf-8")) % len(candidates)]
+
+    def ingest_files(self, file_paths, year=None, batch_size=50, workers=None, progress_callback=None):
+        """
+        PDF 파일들의 텍스트를 프로세스 풀에서 추출한 뒤 배정된 샤드에 저장합니다.
+        배치마다 샤드별로 한 트랜잭션씩 저장하고, 그 다음에 코디네이터의 pdf_routes를 기록합니다.
+        (중간에 멈춰서 경로 기록이 빠진 파일은 다시 실행하면 샤드에서 찾아 경로만 기록합니다.)
+        반환값: {"added", "skipped", "failed", "paragraphs"}
+        """
+        stats = {"added": 0, "skipped": 0, "failed": 0, "paragraphs": 0}
+        file_paths = [os.path.abspath(p) for p in file_paths]
+        conn = self._connect()
+        try:
+            routed = {row[0] for row in conn.execute("SELECT file_path FROM pdf_routes")}
+        finally:
+            conn.close()
+        pending = [p for p in dict.fromkeys(file_paths) if p not in routed]
+        stats["skipped"] = len(file_paths) - len(pending)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                by_shard = {} # key: 샤드 이름, value: [(file_path, paragraphs), ...]
+                for file_path, (ok, payload) in zip(batch, executor.map(_extract_file, batch)):
+                    if not ok:
+                        stats["failed"] += 1
+                        print(f"DEBUG(Shard): Failed to ingest '{file_path}': {payload}")
+                        continue
+                    by_shard.setdefault(self.route(file_path, year), []).append((file_path, payload))
+
+                routes = []
+                for name, files in by_shard.items():
+                    shard = self.get_shard(name)
+                    shard_conn = sqlite3.connect(shard["db_path"])
+                    try:
+                        cursor = shard_conn.cursor()
+                        for file_path, paragraphs in files:
+                            pdf_id = pdf_ingest.find_pdf_id(cursor, file_path)
+                            if pdf_id is None:
+                                pdf_id = pdf_ingest.insert_pdf(cursor, file_path, paragraphs)
+                                stats["paragraphs"] += len(paragraphs)
+                            routes.append((file_path, shard["id"], pdf_id))
+                        shard_conn.commit()
+                    finally:
+                        shard_conn.close()
+
+                conn = self._connect()
+                try:
+                    conn.executemany("INSERT OR REPLACE INTO pdf_routes (file_path, shard_id, pdf_id) VALUES (?, ?, ?)", routes)
+                    conn.commit()
+                finally:
+                    conn.close()
+                stats["added"] += len(routes)
+                if progress_callback:
+                    progress_callback(dict(stats))
+
+        print(f"DEBUG(Shard): Ingest finished. {stats}")
+        return stats
+
+    def find_pdf(self, pdf_ref):
+        """파일 경로 또는 파일명으로 (샤드 이름, pdf_id, file_name)을 찾습니다. 없으면 None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT s.name, r.pdf_id, r.file_path FROM pdf_routes r JOIN shards s ON s.id = r.shard_id "
+                               "WHERE r.file_path = ?", (os.path.abspath(pdf_ref),)).fetchone()
+            if row is None:
+                # 파일명만 주어진 경우: 경로의 마지막 부분이 같은 가장 최근 항목
+                for name, pdf_id, file_path in conn.execute(
+                        "SELECT s.name, r.pdf_id, r.file_path FROM pdf_routes r JOIN shards s ON s.id = r.shard_id ORDER BY s.id DESC, r.pdf_id DESC"):
+                    if os.path.basename(file_path) == pdf_ref:
+                        row = (name, pdf_id, file_path)
+                        break
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        name, pdf_id, file_path = row
+        return name, pdf_id, os.path.basename(file_path)
+
+    def status(self):
+        """샤드별 PDF 수 / 문단 수 / DB 파일 크기를 반환합니다."""
+        report = []
+        for shard in self.list_shards():
+            conn = sqlite3.connect(shard["db_path"])
+            try:
+                pdf_count = conn.execute("SELECT COUNT(*) FROM pdfs").fetchone()[0]
+                paragraph_count = conn.execute("SELECT COUNT(*) FROM paragraphs").fetchone()[0]
+            finally:
+                conn.close()
+            size = os.path.getsize(shard["db_path"]) if os.path.exists(shard["db_path"]) else 0
+            report.append(dict(shard, pdfs=pdf_count, paragraphs=paragraph_count, db_bytes=size))
+        return report
+
+
+# 샤드 워커 프로세스 안에서 유지되는 분석기 캐시 (key: (샤드 DB 경로, 토큰화 방식, 의미 유사도 여부)). 프로세스가 살아 있는 동안 인덱스가 웜 상태로 남습니다.
+_SHARD_ANALYZERS = {}
+
+
+def _shard_analyzer(db_path, tokenizer, semantic):
+    analyzer = _SHARD_ANALYZERS.get((db_path, tokenizer, semantic))
+    if analyzer is None:
+        analyzer = _SHARD_ANALYZERS[(db_path, tokenizer, semantic)] = similarity_analyzer.SimilarityAnalyzer(db_path, tokenizer=tokenizer, semantic=semantic)
+    return analyzer
+
+
+def _query_shard(db_path, tokenizer, semantic, texts, exclude_para_ids, top_k, min_similarity):
+    """샤드 워커 프로세스에서 실행됩니다. 타겟 문단 텍스트들을 이 샤드의 인덱스로 검색합니다."""
+    return _shard_analyzer(db_path, tokenizer, semantic).query_texts(texts, top_k, min_similarity, exclude_para_ids)
+
+
+def _warm_shard(db_path, tokenizer, semantic):
+    analyzer = _shard_analyzer(db_path, tokenizer, semantic)
+    if not analyzer.refresh_index():
+        return False
+    if semantic:
+        analyzer.get_semantic_index()
+    return True
+
+
+class ShardCoordinator:
+    """
+    분석 요청을 모든 샤드에 동시에 보내고(scatter) 결과를 병합(gather)합니다.
+    샤드마다 워커 프로세스 하나(ProcessPoolExecutor(max_workers=1))를 두므로 각 샤드의 인덱스는 한 프로세스에만 올라갑니다.
+    각 샤드는 자기 문단들로 학습한 IDF를 사용하므로, 샤드 간 유사도는 단일 DB로 분석한 값과 조금 다를 수 있습니다.
+    (semantic=True이면 LSA 투영도 샤드마다 따로 학습합니다.)
+    """
+    def __init__(self, corpus, top_k=5, min_similarity=0.0, tokenizer="word", semantic=False):
+        self.corpus = corpus
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.tokenizer = tokenizer # 모든 샤드에서 같은 토큰화 방식을 사용합니다.
+        self.semantic = semantic
+        self._executors = {} # key: 샤드 DB 경로, value: 그 샤드 전용 워커 프로세스
+
+    def _executor_for(self, db_path):
+        executor = self._executors.get(db_path)
+        if executor is None:
+            executor = self._executors[db_path] = ProcessPoolExecutor(max_workers=1)
+        return executor
+
+    def warm_up(self):
+        """모든 샤드의 인덱스를 미리 만들어 둡니다. (샤드별로 동시에 진행)"""
+        futures = [self._executor_for(shard["db_path"]).submit(_warm_shard, shard["db_path"], self.tokenizer, self.semantic) for shard in self.corpus.list_shards()]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def analyze_similarity(self, shard_name, target_pdf_id, top_k=None, min_similarity=None):
+        """
+        shard_name 샤드의 target_pdf_id 문서를 모든 샤드와 비교합니다.
+        결과 형식은 SimilarityAnalyzer.analyze_similarity와 같고, 유사 문단마다 'source_shard'(샤드 이름)가 추가됩니다.
+        'source_pdf_id'는 그 샤드 안에서의 PDF ID입니다.
+        """
+        top_k = self.top_k if top_k is None else top_k
+        min_similarity = self.min_similarity if min_similarity is None else min_similarity
+        shards = self.corpus.list_shards()
+        target_shard = next((shard for shard in shards if shard["name"] == shard_name), None)
+        if target_shard is None:
+            print(f"ERROR(Shard): 샤드를 찾을 수 없습니다: {shard_name}")
+            return []
+
+        conn = None
+        try:
+            conn = sqlite3.connect(target_shard["db_path"])
+            target_paragraphs = conn.execute("SELECT id, paragraph_text, page_number FROM paragraphs WHERE pdf_id = ? ORDER BY page_number ASC",
+                                             (target_pdf_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"ERROR(DB): 타겟 문단 불러오기 오류: {e}")
+            return []
+        finally:
+            if conn:
+                conn.close()
+        if not target_paragraphs:
+            return []
+        texts = [text for _, text, _ in target_paragraphs]
+
+        # 1. Scatter: 샤드마다 타겟 문단들을 한 번에 보냅니다. 타겟이 들어 있는 샤드에서는 자기 자신을 제외합니다.
+        futures = []
+        for shard in shards:
+            exclude = [para_id for para_id, _, _ in target_paragraphs] if shard["name"] == shard_name else None
+            futures.append((shard, self._executor_for(shard["db_path"]).submit(
+                _query_shard, shard["db_path"], self.tokenizer, self.semantic, texts, exclude, top_k, min_similarity)))
+
+        shard_matches = [] # (샤드, 타겟 문단별 매치 리스트)
+        for shard, future in futures:
+            try:
+                shard_matches.append((shard, future.result()))
+            except Exception as e:
+                # 샤드 하나가 실패해도 나머지 샤드의 결과는 보여줍니다.
+                print(f"ERROR(Shard): 샤드 '{shard['name']}' 분석 실패: {e}")
+
+        # 2. Gather: 샤드별 결과는 이미 유사도 내림차순이므로 k-way 병합으로 앞에서 top_k개만 가져옵니다.
+        merged_by_query = []
+        for query_index in range(len(target_paragraphs)):
+            streams = [
+                [(-similarity, shard_index, para_id, pdf_id, order) for para_id, pdf_id, order, similarity in matches[query_index]]
+                for shard_index, (_, matches) in enumerate(shard_matches)
+            ]
+            merged_by_query.append(list(itertools.islice(heapq.merge(*streams), top_k)))
+
+        # 3. 결과에 실제로 등장하는 문단의 텍스트만 각 샤드 DB에서 가져옵니다.
+        texts_by_shard = {}
+        for shard_index, (shard, _) in enumerate(shard_matches):
+            para_ids = [m[2] for merged in merged_by_query for m in merged if m[1] == shard_index]
+            texts_by_shard[shard_index] = similarity_analyzer.fetch_paragraph_texts(shard["db_path"], para_ids)
+
+        results = []
+        for (para_id, text, order), merged in zip(target_paragraphs, merged_by_query):
+            results.append({
+                'target_paragraph': (para_id, text, order or 0),
+                'similar_paragraphs': [
+                    {
+                        'source_shard': shard_matches[shard_index][0]["name"],
+                        'source_pdf_id': source_pdf_id,
+                        'source_paragraph': (source_para_id, texts_by_shard[shard_index].get(source_para_id, ""), source_order),
+                        'similarity': -negative_similarity,
+                    }
+                    for negative_similarity, shard_index, source_para_id, source_pdf_id, source_order in merged
+                ],
+            })
+        return results
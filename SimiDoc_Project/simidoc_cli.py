@@ -0,0 +1,371 @@
+"""
+SimiDoc 명령줄 도구.
+
+사용 예시:
+    python simidoc_cli.py analyze 12 --top-k 10 --min-similarity 0.3
+    python simidoc_cli.py analyze 12 --tokenizer particle
+    python simidoc_cli.py export ./export_dir
+    python simidoc_cli.py export ./export_dir --targets paragraphs,matches --format npz
+    python simidoc_cli.py export ./export_dir --memory-budget-mb 512 --metrics   (예산에 맞춰 청크 크기 조절, 최대 메모리 출력)
+    python simidoc_cli.py watch //server/submissions
+    python simidoc_cli.py bench memory --paragraphs 100000
+    python simidoc_cli.py bench lsa --paragraphs 10000,100000,1000000
+    python simidoc_cli.py import D:/archive          (중단되었으면 같은 명령으로 다시 실행하면 이어서 진행)
+    python simidoc_cli.py rescan                     (교체된 PDF만 다시 추출하여 바뀐 문단만 갱신)
+    python simidoc_cli.py risk --show 20             (점수가 없거나 오래된 PDF의 표절 위험도를 계산하고 위험한 순으로 출력)
+    python simidoc_cli.py shard init ./shards --strategy year
+    python simidoc_cli.py shard ingest ./shards D:/submissions/2024
+    python simidoc_cli.py shard analyze ./shards report.pdf --top-k 10
+"""
+import argparse
+import json
+import os
+import sys
+
+import memory_budget
+import similarity_analyzer
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simidoc.db")
+
+
+def _print_progress(stage, done):
+    print(f"\r[{stage}] {done:,}", end="", flush=True)
+
+
+def _positive_int(value):
+    """argparse type: 1 이상의 정수"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"1 이상의 정수여야 합니다: {value}")
+    return number
+
+
+def _similarity(value):
+    """argparse type: 0.0 ~ 1.0 사이의 유사도"""
+    number = float(value)
+    if not 0.0 <= number <= 1.0:
+        raise argparse.ArgumentTypeError(f"0.0 ~ 1.0 사이의 값이어야 합니다: {value}")
+    return number
+
+
+def _add_scoring_arguments(subparser):
+    subparser.add_argument("--top-k", type=_positive_int, default=5, help="타겟 문단마다 남길 유사 문단 수 (1 이상)")
+    subparser.add_argument("--min-similarity", type=_similarity, default=0.0, help="이 값 미만의 유사도는 버림 (0.0 ~ 1.0, 0.0이면 0보다 큰 값만)")
+    subparser.add_argument("--tokenizer", default="word", choices=["word", "particle", "char_ngram"],
+                           help="문단 토큰화 방식 (word: 단어, particle: 조사 제거, char_ngram: 어절 안 2~3글자)")
+    subparser.add_argument("--semantic", action="store_true",
+                           help="단어 일치 대신 LSA 의미 유사도로 검색 (임베딩/근사 검색 인덱스는 DB 옆 .lsa_* 파일에 저장)")
+
+
+def _add_memory_arguments(subparser):
+    subparser.add_argument("--memory-budget-mb", type=float, default=None,
+                           help="분석에 쓸 메모리 예산 (MiB). 넘을 것 같으면 청크를 줄이거나 스트리밍으로 낮추고, 불가능하면 거부")
+    subparser.add_argument("--metrics", action="store_true", help="분석이 끝나면 청크 크기, 최대 메모리(tracemalloc/RSS), 소요 시간을 stderr로 출력")
+
+
+def _print_metrics(args, analyzer):
+    if args.metrics:
+        print(json.dumps(analyzer.last_metrics, ensure_ascii=False, indent=2), file=sys.stderr)
+
+
+def _find_pdf(db_path, pdf_ref):
+    """PDF ID 또는 파일 경로/파일명으로 (pdf_id, file_name)을 찾습니다."""
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if pdf_ref.isdigit():
+            row = conn.execute("SELECT id, file_name FROM pdfs WHERE id = ?", (int(pdf_ref),)).fetchone()
+        else:
+            row = conn.execute("SELECT id, file_name FROM pdfs WHERE file_path = ? OR file_name = ? ORDER BY id DESC LIMIT 1",
+                               (os.path.abspath(pdf_ref), pdf_ref)).fetchone()
+        return row
+    finally:
+        conn.close()
+
+
+def cmd_analyze(args):
+    found = _find_pdf(args.db, args.pdf)
+    if found is None:
+        print(f"오류: DB에서 PDF를 찾을 수 없습니다: {args.pdf}", file=sys.stderr)
+        return 1
+    pdf_id, file_name = found
+
+    analyzer = similarity_analyzer.SimilarityAnalyzer(args.db, top_k=args.top_k, min_similarity=args.min_similarity,
+                                                     tokenizer=args.tokenizer, semantic=args.semantic,
+                                                     memory_budget_mb=args.memory_budget_mb, trace_memory=args.metrics)
+    try:
+        results = analyzer.analyze_similarity(pdf_id, [])
+    except memory_budget.MemoryBudgetError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        return 1
+    _print_metrics(args, analyzer)
+    if args.json:
+        print(json.dumps({"pdf_id": pdf_id, "file_name": file_name, "results": results}, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"--- '{file_name}' 유사도 분석 결과 (top_k={args.top_k}, min_similarity={args.min_similarity}) ---")
+    for res in results:
+        _, t_text, t_order = res['target_paragraph']
+        scores = [sim['similarity'] for sim in res['similar_paragraphs']]
+        print(f"[{t_order}] 표절율 {max(scores, default=0.0) * 100:.0f}%: {t_text[:80]}")
+        for sim in res['similar_paragraphs']:
+            _, s_text, s_order = sim['source_paragraph']
+            print(f"    {sim['similarity']:.2f}  PDF {sim['source_pdf_id']} [{s_order}]: {s_text[:60]}")
+    return 0
+
+
+def cmd_export(args):
+    import bulk_exporter
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    analyzer = similarity_analyzer.SimilarityAnalyzer(args.db, tokenizer=args.tokenizer, semantic=args.semantic,
+                                                     memory_budget_mb=args.memory_budget_mb, trace_memory=args.metrics)
+    try:
+        manifest = bulk_exporter.export_all(analyzer, args.out_dir, targets, args.format, args.chunk_size,
+                                            args.top_k, args.min_similarity, progress_callback=_print_progress)
+    except (ValueError, memory_budget.MemoryBudgetError) as e:
+        print(f"\n오류: {e}", file=sys.stderr)
+        return 1
+    print()
+    _print_metrics(args, analyzer)
+    for target in targets:
+        info = manifest.get(target, {})
+        print(f"{target}: {info.get('rows', 0):,} rows -> {', '.join(info.get('files', [])) or '(없음)'}")
+    return 0
+
+
+def cmd_watch(args):
+    import threading
+    import folder_watcher
+
+    stop_event = threading.Event()
+    try:
+        folder_watcher.run_watch_loop(args.db, args.folder, stop_event, poll_interval=args.interval,
+                                      debounce=args.debounce, batch_size=args.batch_size, workers=args.workers)
+    except KeyboardInterrupt:
+        stop_event.set()
+    return 0
+
+
+def cmd_import(args):
+    import bulk_import
+
+    if args.retry_failed:
+        print(f"failed 작업 {bulk_import.reset_failed_jobs(args.db):,}개를 다시 시도합니다.")
+    if args.directory:
+        bulk_import.enqueue_directory(args.db, args.directory)
+
+    def report(stats):
+        print(f"\r완료 {stats['done']:,} / 실패 {stats['failed']:,} / 남음 {stats['remaining']:,} "
+              f"({stats['files_per_sec']:.1f} files/s, {stats['paragraphs_per_sec']:.1f} paragraphs/s)", end="", flush=True)
+
+    try:
+        bulk_import.run_import(args.db, args.batch_size, args.max_attempts, args.workers, report)
+    except KeyboardInterrupt:
+        print("\n중단되었습니다. 같은 명령을 다시 실행하면 남은 파일부터 이어서 가져옵니다.")
+        return 130
+    print()
+    counts = bulk_import.count_jobs(args.db)
+    print(f"작업 현황: done {counts['done']:,}, failed {counts['failed']:,}, pending {counts['pending']:,}")
+    return 0
+
+
+def cmd_rescan(args):
+    import library_rescan
+
+    def report(stats):
+        print(f"\r다시 추출 {stats['modified']:,} / 내용 같음 {stats['touched']:,} / 실패 {stats['failed']:,}", end="", flush=True)
+
+    try:
+        stats = library_rescan.rescan_library(args.db, args.batch_size, args.workers, not args.keep_missing, report)
+    except KeyboardInterrupt:
+        print("\n중단되었습니다. 이미 처리한 배치는 저장되었습니다.")
+        return 130
+    print(f"\n검사 {stats['scanned']:,}개: 변경 없음 {stats['unchanged']:,}, 내용 같음 {stats['touched']:,}, "
+          f"다시 추출 {stats['modified']:,}, 삭제 {stats['removed']:,}, 실패 {stats['failed']:,} "
+          f"(문단 +{stats['paragraphs_added']:,} / -{stats['paragraphs_removed']:,}, {stats['elapsed']:.1f}초)")
+    return 0
+
+
+def cmd_risk(args):
+    import sqlite3
+
+    import risk_scores
+
+    analyzer = similarity_analyzer.SimilarityAnalyzer(args.db, tokenizer=args.tokenizer, semantic=args.semantic)
+    try:
+        scored = risk_scores.score_pending(analyzer, args.batch_size,
+                                           progress_callback=lambda _, done: print(f"\r계산 {done:,}", end="", flush=True))
+    except KeyboardInterrupt:
+        print("\n중단되었습니다. 이미 계산한 배치는 저장되었습니다.")
+        return 130
+    print(f"\n표절 위험도 계산 {scored:,}개 ({risk_scores.scoring_mode(analyzer)})")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        risks = risk_scores.load_pdf_risks(conn.cursor(), risk_scores.scoring_mode(analyzer))
+        names = dict(conn.execute("SELECT id, file_name FROM pdfs"))
+    finally:
+        conn.close()
+    for pdf_id, (risk, stale) in sorted(risks.items(), key=lambda item: item[1][0], reverse=True)[:args.show]:
+        print(f"{risk * 100:5.1f}%{' (오래된 점수)' if stale else ''}  PDF {pdf_id}: {names.get(pdf_id, '')}")
+    return 0
+
+
+def cmd_shard(args):
+    import shard_manager
+
+    try:
+        corpus = shard_manager.ShardedCorpus(args.root, args.strategy if args.action == "init" else None)
+    except ValueError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        return 1
+
+    if args.action == "init":
+        if not corpus.list_shards():
+            for _ in range(args.shards if corpus.strategy == shard_manager.STRATEGY_HASH else 0):
+                corpus.add_shard()
+        print(f"샤드 폴더: {corpus.root_dir} (분할 방식: {corpus.strategy}, 샤드 {len(corpus.list_shards())}개)")
+    elif args.action == "add":
+        try:
+            name = corpus.add_shard(args.name, args.year, args.source_db)
+        except ValueError as e:
+            print(f"오류: {e}", file=sys.stderr)
+            return 1
+        print(f"샤드 '{name}'를 추가했습니다.")
+    elif args.action == "ingest":
+        file_paths = [os.path.join(dir_path, f) for dir_path, _, file_names in os.walk(args.directory)
+                      for f in file_names if f.lower().endswith(".pdf")]
+        stats = corpus.ingest_files(file_paths, args.year, args.batch_size, args.workers,
+                                    lambda s: print(f"\r추가 {s['added']:,} / 실패 {s['failed']:,}", end="", flush=True))
+        print(f"\n추가 {stats['added']:,}, 이미 있음 {stats['skipped']:,}, 실패 {stats['failed']:,}, 문단 {stats['paragraphs']:,}")
+    elif args.action == "analyze":
+        found = corpus.find_pdf(args.pdf)
+        if found is None:
+            print(f"오류: 샤드에서 PDF를 찾을 수 없습니다: {args.pdf}", file=sys.stderr)
+            return 1
+        shard_name, pdf_id, file_name = found
+        with shard_manager.ShardCoordinator(corpus, args.top_k, args.min_similarity, args.tokenizer, args.semantic) as coordinator:
+            results = coordinator.analyze_similarity(shard_name, pdf_id)
+        print(f"--- '{file_name}' ({shard_name}) 샤드 전체 유사도 분석 결과 (top_k={args.top_k}, min_similarity={args.min_similarity}) ---")
+        for res in results:
+            _, t_text, t_order = res['target_paragraph']
+            scores = [sim['similarity'] for sim in res['similar_paragraphs']]
+            print(f"[{t_order}] 표절율 {max(scores, default=0.0) * 100:.0f}%: {t_text[:80]}")
+            for sim in res['similar_paragraphs']:
+                _, s_text, s_order = sim['source_paragraph']
+                print(f"    {sim['similarity']:.2f}  {sim['source_shard']}/PDF {sim['source_pdf_id']} [{s_order}]: {s_text[:60]}")
+    else:
+        for shard in corpus.status():
+            state = "" if shard["accepting"] else " (새 파일 배정 안 함)"
+            print(f"{shard['name']}: PDF {shard['pdfs']:,}, 문단 {shard['paragraphs']:,}, "
+                  f"{shard['db_bytes'] / 2**20:,.1f} MiB{state} - {shard['db_path']}")
+    return 0
+
+
+def cmd_bench(args):
+    import benchmarks
+
+    if args.benchmark == "memory":
+        benchmarks.bench_paragraph_store_memory(int(args.paragraphs.split(",")[0]), args.bench_db)
+    elif args.benchmark == "lsa":
+        sizes = [int(size) for size in args.paragraphs.split(",") if size.strip()]
+        benchmarks.bench_lsa(sizes, args.queries, args.top_k)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SimiDoc 명령줄 도구")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite DB 경로 (기본: 프로그램 폴더의 simidoc.db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyze_parser = subparsers.add_parser("analyze", help="PDF 하나를 DB 전체와 비교하여 유사 문단 출력")
+    analyze_parser.add_argument("pdf", help="PDF ID, 파일 경로 또는 파일명")
+    _add_scoring_arguments(analyze_parser)
+    _add_memory_arguments(analyze_parser)
+    analyze_parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    analyze_parser.set_defaults(func=cmd_analyze)
+
+    export_parser = subparsers.add_parser("export", help="문단, TF-IDF 벡터, 유사도 결과를 열 기반 파일로 내보내기")
+    export_parser.add_argument("out_dir", help="내보낼 폴더")
+    export_parser.add_argument("--targets", default="paragraphs,vectors,matches", help="내보낼 대상 (쉼표 구분: paragraphs,vectors,matches)")
+    export_parser.add_argument("--format", default="auto", choices=["auto", "parquet", "npz"], help="auto: pyarrow가 있으면 parquet, 없으면 npz+jsonl")
+    export_parser.add_argument("--chunk-size", type=int, default=10000, help="한 번에 처리할 행 수")
+    _add_scoring_arguments(export_parser)
+    _add_memory_arguments(export_parser)
+    export_parser.set_defaults(func=cmd_export)
+
+    watch_parser = subparsers.add_parser("watch", help="폴더를 감시하며 새로 들어오거나 바뀐 PDF를 자동으로 추가")
+    watch_parser.add_argument("folder", help="감시할 폴더 (하위 폴더 포함)")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="폴더 스캔 주기 (초)")
+    watch_parser.add_argument("--debounce", type=float, default=2.0, help="파일이 이 시간 동안 변하지 않아야 처리 (초)")
+    watch_parser.add_argument("--batch-size", type=int, default=64, help="한 트랜잭션에 반영할 최대 파일 수")
+    watch_parser.add_argument("--workers", type=int, default=None, help="텍스트 추출 프로세스 수 (기본: CPU 수)")
+    watch_parser.set_defaults(func=cmd_watch)
+
+    import_parser = subparsers.add_parser("import", help="폴더 전체를 재귀적으로 가져오기 (중단 후 이어서 실행 가능)")
+    import_parser.add_argument("directory", nargs="?", help="가져올 폴더 (생략하면 남은 작업만 이어서 실행)")
+    import_parser.add_argument("--batch-size", type=int, default=50, help="한 트랜잭션에 저장할 파일 수")
+    import_parser.add_argument("--max-attempts", type=int, default=2, help="깨진 PDF를 건너뛰기 전까지 시도할 횟수")
+    import_parser.add_argument("--workers", type=int, default=None, help="텍스트 추출 프로세스 수 (기본: CPU 수)")
+    import_parser.add_argument("--retry-failed", action="store_true", help="failed로 건너뛴 파일을 다시 시도")
+    import_parser.set_defaults(func=cmd_import)
+
+    rescan_parser = subparsers.add_parser("rescan", help="DB의 PDF들 중 내용이 바뀐 파일만 다시 추출하여 바뀐 문단만 갱신")
+    rescan_parser.add_argument("--batch-size", type=int, default=100, help="한 트랜잭션에 반영할 파일 수")
+    rescan_parser.add_argument("--workers", type=int, default=None, help="해시/텍스트 추출 프로세스 수 (기본: CPU 수)")
+    rescan_parser.add_argument("--keep-missing", action="store_true", help="더 이상 존재하지 않는 파일도 DB에 남겨둠")
+    rescan_parser.set_defaults(func=cmd_rescan)
+
+    risk_parser = subparsers.add_parser("risk", help="점수가 없거나 오래된 PDF의 표절 위험도(문단 최고 유사도)를 계산하여 DB에 저장")
+    risk_parser.add_argument("--tokenizer", default="word", choices=["word", "particle", "char_ngram"], help="문단 토큰화 방식")
+    risk_parser.add_argument("--semantic", action="store_true", help="단어 일치 대신 LSA 의미 유사도로 계산")
+    risk_parser.add_argument("--batch-size", type=int, default=8, help="한 번에 분석하여 저장할 PDF 수")
+    risk_parser.add_argument("--show", type=int, default=20, help="위험도가 높은 순으로 출력할 PDF 수")
+    risk_parser.set_defaults(func=cmd_risk)
+
+    shard_parser = subparsers.add_parser("shard", help="코퍼스를 여러 샤드 DB로 나누어 저장하고 분석")
+    shard_actions = shard_parser.add_subparsers(dest="action", required=True)
+    shard_init = shard_actions.add_parser("init", help="샤드 폴더 만들기")
+    shard_init.add_argument("root", help="샤드 폴더 (shards.db가 있는 폴더)")
+    shard_init.add_argument("--strategy", default="hash", choices=["hash", "year"], help="hash: 파일 경로 해시, year: 파일 연도별")
+    shard_init.add_argument("--shards", type=int, default=4, help="hash 방식에서 처음 만들 샤드 수")
+    shard_add = shard_actions.add_parser("add", help="샤드 추가 (기존 샤드는 다시 인덱싱하지 않음)")
+    shard_add.add_argument("root", help="샤드 폴더 (shards.db가 있는 폴더)")
+    shard_add.add_argument("--name", default=None, help="샤드 이름 (기본: shard_NNN 또는 year_YYYY)")
+    shard_add.add_argument("--year", type=int, default=None, help="year 방식에서 이 샤드가 받을 연도")
+    shard_add.add_argument("--source-db", default=None, help="기존 simidoc.db를 보관용 샤드로 등록")
+    shard_ingest = shard_actions.add_parser("ingest", help="폴더의 PDF들을 샤드에 나누어 추가")
+    shard_ingest.add_argument("root", help="샤드 폴더 (shards.db가 있는 폴더)")
+    shard_ingest.add_argument("directory", help="가져올 폴더 (하위 폴더 포함)")
+    shard_ingest.add_argument("--year", type=int, default=None, help="year 방식에서 파일 수정 연도 대신 사용할 연도")
+    shard_ingest.add_argument("--batch-size", type=int, default=50, help="한 번에 추출/저장할 파일 수")
+    shard_ingest.add_argument("--workers", type=int, default=None, help="텍스트 추출 프로세스 수 (기본: CPU 수)")
+    shard_analyze = shard_actions.add_parser("analyze", help="PDF 하나를 모든 샤드와 비교")
+    shard_analyze.add_argument("root", help="샤드 폴더 (shards.db가 있는 폴더)")
+    shard_analyze.add_argument("pdf", help="파일 경로 또는 파일명")
+    _add_scoring_arguments(shard_analyze)
+    shard_actions.add_parser("status", help="샤드별 PDF/문단 수 출력").add_argument("root", help="샤드 폴더 (shards.db가 있는 폴더)")
+    shard_parser.set_defaults(func=cmd_shard)
+
+    bench_parser = subparsers.add_parser("bench", help="성능 측정 (기본: 합성 문단으로 만든 임시 DB 사용)")
+    bench_parser.add_argument("benchmark", choices=["memory", "lsa"],
+                              help="memory: 문단 저장소의 상주 메모리 비교, lsa: LSA 근사 검색의 재현율/지연 시간 측정")
+    bench_parser.add_argument("--paragraphs", default="100000", help="합성 문단 수 (lsa는 쉼표로 여러 크기 지정 가능, 예: 10000,100000,1000000)")
+    bench_parser.add_argument("--queries", type=int, default=200, help="lsa: 측정할 질의 문단 수")
+    bench_parser.add_argument("--top-k", type=_positive_int, default=10, help="lsa: 재현율을 잴 상위 유사 문단 수")
+    bench_parser.add_argument("--bench-db", default=None, help="합성 DB 대신 측정할 기존 DB 경로")
+    bench_parser.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -3,6 +3,11 @@ import os
 import re
 import fitz  # PyMuPDF를 fitz로 import 합니다.
 import sqlite3
+import threading
+import time
+
+import pdf_ingest
+import risk_scores
 
 # similarity_analyzer.py가 simidoc_gui.py와 동일한 폴더에 위치해야 합니다.
 try:
@@ -10,8 +15,8 @@ try:
 except ModuleNotFoundError:
     print("ModuleNotFoundError: similarity_analyzer.py 모듈을 찾을 수 없습니다. 동일한 폴더에 있는지 확인하세요.")
     class DummySimilarityAnalyzer: # 모듈이 없을 때를 대비한 더미 클래스
-        def __init__(self, db_path): pass
-        def analyze_similarity(self, target_pdf_id, files_data): 
+        def __init__(self, db_path, **kwargs): pass
+        def analyze_similarity(self, target_pdf_id, files_data, top_k=None, min_similarity=None): 
             print("ERROR: 유사도 분석 모듈이 로드되지 않아 분석 기능을 사용할 수 없습니다.")
             return []
     similarity_analyzer = DummySimilarityAnalyzer()
@@ -21,9 +26,9 @@ from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QListWidget, QListWidgetItem,
     QCheckBox, QTextEdit, QSplitter, QFileDialog, QFrame,
-    QMessageBox
+    QMessageBox, QSpinBox, QDoubleSpinBox, QComboBox
 )
-from PyQt6.QtCore import Qt, QSize, QDateTime, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QSize, QDateTime, QThread, QTimer, QEvent, pyqtSignal
 from PyQt6.QtGui import QFont, QColor, QPalette
 
 
@@ -181,25 +186,46 @@ def extract_text_from_pdf(pdf_path):
         text_content = f"PDF 파일 처리 중 오류 발생: {e}"
     return text_content
 
-# --- PDF 파일 리스트 아이템 위젯 (체크박스 포함) ---
+# --- PDF 파일 리스트 아이템 위젯 (체크박스, 표절 위험도 포함) ---
 class PDFFileItem(QWidget):
-    def __init__(self, filename, loaded_datetime):
+    def __init__(self, filename, loaded_datetime, risk=None, stale=False):
         super().__init__()
         layout = QHBoxLayout() # QHBoxLayout(self) 대신 이렇게 선언하고 self.setLayout()
         self.checkbox = QCheckBox()
         self.label_filename = QLabel(filename)
         self.label_date = QLabel(loaded_datetime.toString("yyyy-MM-dd HH:mm:ss"))
         self.label_date.setStyleSheet("color: #999999; font-size: 9pt;") # 날짜는 더 작게
+        self.label_risk = QLabel("")
+        self.label_risk.setMinimumWidth(40)
+        self.label_risk.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        self.set_risk(risk, stale)
         
         layout.addWidget(self.checkbox)
         layout.addWidget(self.label_filename)
         layout.addStretch() # filename과 date 사이 공간 확보
         layout.addWidget(self.label_date)
+        layout.addWidget(self.label_risk)
         layout.setContentsMargins(5, 2, 5, 2) # 내부 마진 조정
         self.setLayout(layout) # 레이아웃을 위젯에 설정
 
     def is_checked(self):
         return self.checkbox.isChecked()
+
+    # 유휴 시간에 미리 계산한 표절 위험도(문단 최고 유사도 중 최댓값) 표시. stale이면 이전 코퍼스 기준 점수임을 흐리게 표시
+    def set_risk(self, risk, stale=False):
+        if risk is None:
+            self.label_risk.setText("-")
+            self.label_risk.setToolTip("아직 표절 위험도를 계산하지 않았습니다.")
+            self.label_risk.setStyleSheet("color: #777777; font-size: 9pt;")
+            return
+        color = "#90EE90"
+        if risk >= 0.8:
+            color = "#FF4444"
+        elif risk >= 0.5:
+            color = "#FFA500"
+        self.label_risk.setText(f"{risk*100:.0f}%")
+        self.label_risk.setToolTip("최근 DB 변경 전 기준 점수입니다. (유휴 시간에 다시 계산)" if stale else "문단 최고 유사도")
+        self.label_risk.setStyleSheet(f"color: {color}; font-weight: bold; font-size: 9pt;{' font-style: italic;' if stale else ''}")
     
     # 이 위젯 자체의 선호 크기 (setSizeHint용)
     def sizeHint(self):
@@ -261,23 +287,145 @@ class ParagraphListItem(QWidget):
 
 # 분석 작업을 백그라운드에서 실행하기 위한 워커 쓰레드
 class AnalysisWorker(QThread):
-    # 분석 완료 시 결과 데이터, 타겟 ID, 파일명을 메인 쓰레드로 전달하는 신호
-    finished = pyqtSignal(list, int, str)
+    # 분석 완료 시 결과 데이터, 타겟 ID, 파일명, 오류 메시지(성공 시 빈 문자열), 메모리 부족 여부를 메인 쓰레드로 전달하는 신호
+    finished = pyqtSignal(list, int, str, str, bool)
 
-    def __init__(self, analyzer, target_pdf_id, file_name_only, files_data):
+    def __init__(self, analyzer, target_pdf_id, file_name_only, files_data, top_k=None, min_similarity=None, wait_for=None):
         super().__init__()
         self.analyzer = analyzer
+        self.wait_for = wait_for # 멈추라고 요청한 사전 계산 워커. 끝난 뒤에 분석을 시작하여 CPU/메모리를 다투지 않음
         self.target_pdf_id = target_pdf_id
         self.file_name_only = file_name_only
         self.files_data = files_data
+        self.top_k = top_k
+        self.min_similarity = min_similarity
 
     def run(self):
         # 여기가 실질적으로 시간이 오래 걸리는 작업 (백그라운드 실행)
-        results = self.analyzer.analyze_similarity(self.target_pdf_id, self.files_data)
-        self.finished.emit(results, self.target_pdf_id, self.file_name_only)
+        if self.wait_for is not None:
+            self.wait_for.wait() # 분석 청크 하나 안에 끝납니다.
+        try:
+            results = self.analyzer.analyze_similarity(self.target_pdf_id, self.files_data, self.top_k, self.min_similarity)
+        except MemoryError as e: # 메모리 예산 초과(MemoryBudgetError) 포함
+            self.finished.emit([], self.target_pdf_id, self.file_name_only, str(e) or "메모리가 부족합니다.", True)
+            return
+        except Exception as e: # 쓰레드가 조용히 죽어 버튼이 '분석 중...'에 머물지 않도록 모든 오류를 알립니다.
+            print(f"ERROR(Analyze): '{self.file_name_only}' 분석 오류: {e}")
+            self.finished.emit([], self.target_pdf_id, self.file_name_only, str(e) or type(e).__name__, False)
+            return
+        self.finished.emit(results, self.target_pdf_id, self.file_name_only, "", False)
+
+# 대량 내보내기를 백그라운드에서 실행하기 위한 워커 쓰레드
+class ExportWorker(QThread):
+    progress = pyqtSignal(str, int) # 단계 이름, 처리한 행 수
+    finished = pyqtSignal(dict, str) # manifest, 오류 메시지 (성공 시 빈 문자열)
+
+    def __init__(self, analyzer, out_dir):
+        super().__init__()
+        self.analyzer = analyzer
+        self.out_dir = out_dir
+
+    def run(self):
+        try:
+            import bulk_exporter
+            manifest = bulk_exporter.export_all(self.analyzer, self.out_dir, progress_callback=self.progress.emit)
+            self.finished.emit(manifest, "")
+        except Exception as e:
+            self.finished.emit({}, str(e))
+
+# 감시 폴더의 새 PDF를 백그라운드에서 DB에 반영하는 워커 쓰레드
+class WatchFolderWorker(QThread):
+    batch_ingested = pyqtSignal(dict) # 배치 하나의 처리 통계 (added/modified/removed/failed/paragraphs)
+    error = pyqtSignal(str, bool) # 오류 메시지, 감시가 멈췄는지 여부
+
+    def __init__(self, db_path, folder):
+        super().__init__()
+        self.db_path = db_path
+        self.folder = folder
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import folder_watcher
+        try:
+            folder_watcher.run_watch_loop(self.db_path, self.folder, self._stop_event, on_batch=self.batch_ingested.emit,
+                                          on_error=lambda message: self.error.emit(message, False))
+        except Exception as e:
+            print(f"ERROR(Watch): 감시 폴더 오류로 감시를 멈춥니다: {e}")
+            self.error.emit(str(e), True)
+
+    def stop(self):
+        self._stop_event.set()
+
+# 폴더 전체를 백그라운드에서 가져오는 워커 쓰레드 (ingest_jobs 테이블 덕분에 중단 후 이어서 실행 가능)
+class BulkImportWorker(QThread):
+    progress = pyqtSignal(dict) # 배치마다의 누적 통계 (done/failed/remaining/files_per_sec/paragraphs_per_sec)
+    finished = pyqtSignal(dict, str) # 최종 통계, 오류 메시지 (성공 시 빈 문자열)
+
+    def __init__(self, db_path, folder):
+        super().__init__()
+        self.db_path = db_path
+        self.folder = folder
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import bulk_import
+        try:
+            stats = bulk_import.import_directory(self.db_path, self.folder, progress_callback=self.progress.emit, stop_event=self._stop_event)
+            self.finished.emit(stats, "")
+        except Exception as e:
+            self.finished.emit({}, str(e))
+
+    def stop(self):
+        self._stop_event.set()
+
+class RescanWorker(QThread):
+    progress = pyqtSignal(dict) # 배치마다의 누적 통계
+    finished = pyqtSignal(dict, str) # 최종 통계, 오류 메시지 (성공 시 빈 문자열)
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import library_rescan
+        try:
+            stats = library_rescan.rescan_library(self.db_path, progress_callback=self.progress.emit, stop_event=self._stop_event)
+            self.finished.emit(stats, "")
+        except Exception as e:
+            self.finished.emit({}, str(e))
+
+    def stop(self):
+        self._stop_event.set()
+
+# 유휴 시간에 점수가 없거나 오래된 PDF들의 표절 위험도를 미리 계산하는 낮은 우선순위 워커 쓰레드
+class PrecomputeWorker(QThread):
+    progress = pyqtSignal(dict, int) # 배치마다 {pdf_id: 최고 유사도}, 누적 계산 수
+    finished = pyqtSignal(int, str) # 계산한 PDF 수, 오류 메시지 (성공 시 빈 문자열)
+
+    def __init__(self, analyzer):
+        super().__init__()
+        self.analyzer = analyzer
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            scored = risk_scores.score_pending(self.analyzer, stop_event=self._stop_event, progress_callback=self.progress.emit)
+            self.finished.emit(scored, "")
+        except Exception as e:
+            self.finished.emit(0, str(e))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def is_stopped(self):
+        return self._stop_event.is_set()
 
 # --- 메인 윈도우 클래스 ---
 class MainWindow(QWidget):
+    IDLE_SECONDS = 10 # 마지막 마우스/키보드 입력 후 이 시간이 지나면 유휴 상태로 봅니다.
+    IDLE_CHECK_MS = 3000
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("SimiDoc - PDF 유사도 분석기")
@@ -295,13 +443,17 @@ class MainWindow(QWidget):
         # -----------------------------------------------------------------
 
         self.files_data = [] # 데이터베이스에서 로드될 파일 정보를 저장할 리스트
-        self.analyzer = similarity_analyzer.SimilarityAnalyzer(self.db_path) # 유사도 분석기 초기화
+        self.analyzer = self._create_analyzer() # 유사도 분석기 초기화 (로컬 또는 분석 서버 클라이언트)
 
         # 각 PDF 문단별 최고 표절률을 저장하는 캐시 (분석 완료 후에 채워짐)
         # key: (pdf_id, paragraph_order_in_pdf), value: highest_plagiarism_score
         self._cached_paragraph_plagiarism_rates = {}
         # 현재 선택된 PDF의 ID (이 ID의 문단에 대한 표절률이 캐시되었음을 알림)
         self._cached_pdf_id = None
+        # 유휴 시간 위험도 사전 계산 상태
+        self.precompute_worker = None
+        self._precompute_exhausted = False # 더 계산할 PDF가 없으면 DB나 분석 방식이 바뀔 때까지 다시 시작하지 않음
+        self._last_user_activity = time.monotonic()
         print(f"DEBUG(GUI Init): _cached_pdf_id={self._cached_pdf_id}, _cached_paragraph_plagiarism_rates={len(self._cached_paragraph_plagiarism_rates)}")
 
 
@@ -333,6 +485,17 @@ class MainWindow(QWidget):
         left_buttons_layout.addWidget(self.btn_load)
         left_buttons_layout.addWidget(self.btn_delete)
         left_layout.addLayout(left_buttons_layout)
+        self.btn_export = QPushButton("📦 데이터 내보내기")
+        left_layout.addWidget(self.btn_export)
+        self.btn_watch = QPushButton("👁️ 감시 폴더 시작")
+        left_layout.addWidget(self.btn_watch)
+        self.watch_worker = None
+        self.btn_bulk_import = QPushButton("📁 폴더 일괄 가져오기")
+        left_layout.addWidget(self.btn_bulk_import)
+        self.bulk_import_worker = None
+        self.btn_rescan = QPushButton("🔄 바뀐 파일 다시 검사")
+        left_layout.addWidget(self.btn_rescan)
+        self.rescan_worker = None
         
         left_widget.setLayout(left_layout) # <--- 수정됨: QFrame에 레이아웃 명시적 설정
         splitter.addWidget(left_widget)
@@ -369,6 +532,31 @@ class MainWindow(QWidget):
         self.text_comparison.setMaximumHeight(250) # 비교 결과 창 높이 제한
         right_layout.addWidget(self.text_comparison)
         
+        # 분석 설정 (유사 문단 수, 최소 유사도)
+        analysis_options_layout = QHBoxLayout()
+        analysis_options_layout.addWidget(QLabel("유사 문단 수 (Top-K)"))
+        self.spin_top_k = QSpinBox()
+        self.spin_top_k.setRange(1, 100)
+        self.spin_top_k.setValue(5)
+        analysis_options_layout.addWidget(self.spin_top_k)
+        analysis_options_layout.addWidget(QLabel("최소 유사도"))
+        self.spin_min_similarity = QDoubleSpinBox()
+        self.spin_min_similarity.setRange(0.0, 1.0)
+        self.spin_min_similarity.setSingleStep(0.05)
+        self.spin_min_similarity.setDecimals(2)
+        self.spin_min_similarity.setValue(0.0) # 0.0이면 0보다 큰 모든 유사도를 후보로 봅니다.
+        analysis_options_layout.addWidget(self.spin_min_similarity)
+        analysis_options_layout.addWidget(QLabel("토큰화"))
+        self.combo_tokenizer = QComboBox()
+        for tokenizer, label in (("word", "단어"), ("particle", "단어 (조사 제거)"), ("char_ngram", "글자 n-gram")):
+            self.combo_tokenizer.addItem(label, tokenizer)
+        analysis_options_layout.addWidget(self.combo_tokenizer)
+        self.check_semantic = QCheckBox("의미 유사도 (LSA)")
+        self.check_semantic.setToolTip("단어가 겹치지 않아도 뜻이 비슷한 문단을 찾습니다. 처음 켤 때 인덱스를 만드느라 시간이 걸립니다.")
+        analysis_options_layout.addWidget(self.check_semantic)
+        analysis_options_layout.addStretch()
+        right_layout.addLayout(analysis_options_layout)
+
         # 우측 하단 버튼 (분석하기, 비교문서보기)
         right_buttons_layout = QHBoxLayout()
         self.btn_analyze = QPushButton("✨ 분석하기")
@@ -389,6 +577,12 @@ class MainWindow(QWidget):
         # --- 이벤트 연결 ---
         self.btn_load.clicked.connect(self.load_pdfs)
         self.btn_delete.clicked.connect(self.delete_selected_files)
+        self.btn_export.clicked.connect(self.export_data)
+        self.btn_watch.clicked.connect(self.toggle_watch_folder)
+        self.btn_bulk_import.clicked.connect(self.toggle_bulk_import)
+        self.btn_rescan.clicked.connect(self.rescan_files)
+        self.combo_tokenizer.currentIndexChanged.connect(self._on_tokenizer_changed)
+        self.check_semantic.toggled.connect(self._on_semantic_toggled)
         self.file_list_widget.currentItemChanged.connect(self._on_pdf_selection_changed) # PDF 선택 시
         self.paragraph_list_widget.currentItemChanged.connect(self._on_paragraph_selection_changed) # 문단 선택 시
         self.btn_analyze.clicked.connect(self.analyze_selected_file)
@@ -397,31 +591,68 @@ class MainWindow(QWidget):
         # 모든 GUI 컴포넌트가 생성된 후, DB에서 파일 목록을 GUI에 로드합니다.
         self._load_files_from_db()
 
+        # 사용자 입력을 지켜보다가 유휴 상태가 되면 표절 위험도를 미리 계산합니다.
+        QApplication.instance().installEventFilter(self)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self._on_idle_check)
+        self.idle_timer.start(self.IDLE_CHECK_MS)
+
 
     # --- DB 및 내부 유틸리티 함수 ---
+    def _create_analyzer(self, tokenizer="word", semantic=False):
+        """
+        환경 변수 SIMIDOC_SERVER_URL이 설정되어 있고 서버가 응답하면 분석 서버의 얇은 클라이언트를 사용하고,
+        그렇지 않으면 이 프로세스 안에서 직접 분석하는 로컬 분석기를 사용합니다.
+        (분석 서버를 쓸 때의 토큰화 방식과 의미 유사도 사용 여부는 서버 실행 옵션 --tokenizer, --semantic을 따릅니다.)
+        환경 변수 SIMIDOC_MEMORY_BUDGET_MB가 있으면 로컬 분석기의 메모리 예산(MiB)으로 사용합니다.
+        """
+        server_url = os.environ.get("SIMIDOC_SERVER_URL")
+        if server_url:
+            try:
+                import analysis_server
+                remote_analyzer = analysis_server.RemoteSimilarityAnalyzer(server_url)
+                if remote_analyzer.is_available():
+                    print(f"DEBUG(GUI Init): Connected to analysis server: {server_url}")
+                    return remote_analyzer
+                print(f"DEBUG(GUI Init): Analysis server '{server_url}' not reachable. Falling back to local analyzer.")
+            except ModuleNotFoundError:
+                print("ModuleNotFoundError: analysis_server.py 모듈을 찾을 수 없습니다. 로컬 분석기를 사용합니다.")
+        memory_budget_mb = None
+        if os.environ.get("SIMIDOC_MEMORY_BUDGET_MB"):
+            try:
+                memory_budget_mb = float(os.environ["SIMIDOC_MEMORY_BUDGET_MB"])
+            except ValueError:
+                print(f"ERROR(GUI Init): SIMIDOC_MEMORY_BUDGET_MB 값이 숫자가 아닙니다: {os.environ['SIMIDOC_MEMORY_BUDGET_MB']}")
+        return similarity_analyzer.SimilarityAnalyzer(self.db_path, tokenizer=tokenizer, semantic=semantic, memory_budget_mb=memory_budget_mb)
+
+    def _on_tokenizer_changed(self, index):
+        """토큰화 방식을 바꾸면 분석기를 새로 만들고 이전 방식으로 계산한 표절률 캐시를 비웁니다."""
+        tokenizer = self.combo_tokenizer.itemData(index)
+        self._stop_precompute()
+        self.analyzer = self._create_analyzer(tokenizer, self.check_semantic.isChecked())
+        self._cached_pdf_id = None
+        self._cached_paragraph_plagiarism_rates = {}
+        self._load_files_from_db() # 다른 분석 방식으로 계산한 위험도는 오래된 점수로 표시
+        print(f"DEBUG(GUI): Tokenizer changed to '{tokenizer}'. Analyzer recreated, cache reset.")
+
+    def _on_semantic_toggled(self, checked):
+        """의미 유사도(LSA) 검색을 켜고 끕니다. 로컬 분석기에만 적용되며, 이전 방식으로 계산한 표절률 캐시를 비웁니다."""
+        if not hasattr(self.analyzer, "semantic"):
+            print("DEBUG(GUI): Current analyzer does not support semantic mode. Ignored.")
+            return
+        # 진행 중인 배치가 바뀐 방식으로 계산한 점수를 이전 방식 이름으로 저장하지 않도록, 워커가 끝난 뒤에 바꿉니다.
+        self._stop_precompute(wait=True)
+        self.analyzer.semantic = checked
+        self._cached_pdf_id = None
+        self._cached_paragraph_plagiarism_rates = {}
+        self._load_files_from_db() # 다른 분석 방식으로 계산한 위험도는 오래된 점수로 표시
+        print(f"DEBUG(GUI): Semantic mode {'enabled' if checked else 'disabled'}. Cache reset.")
+
     def _init_database(self):
         conn = None
         try:
             conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pdfs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_path TEXT NOT NULL UNIQUE,
-                    file_name TEXT NOT NULL,
-                    loaded_date TEXT NOT NULL
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS paragraphs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pdf_id INTEGER NOT NULL,
-                    paragraph_text TEXT NOT NULL,
-                    page_number INTEGER,
-                    FOREIGN KEY (pdf_id) REFERENCES pdfs (id) ON DELETE CASCADE
-                )
-            ''')
-            conn.commit()
+            pdf_ingest.init_database(conn) # 테이블 정의는 GUI 밖에서도 쓰이므로 pdf_ingest에 있습니다.
             return True # 성공적으로 초기화되면 True 반환
         except sqlite3.Error as e:
             QMessageBox.critical(self, "데이터베이스 오류", f"데이터베이스 초기화 중 오류 발생: {e}\n경로: {self.db_path}")
@@ -437,6 +668,7 @@ class MainWindow(QWidget):
         # --- 캐시 변수 초기화 (수정 없음) ---
         self._cached_paragraph_plagiarism_rates = {} # 표절률 캐시 초기화
         self._cached_pdf_id = None # 캐시된 PDF ID 초기화
+        self._precompute_exhausted = False # DB가 바뀌었을 수 있으므로 유휴 시간에 다시 확인
         # --- 디버그 메시지 추가 ---
         print(f"DEBUG(LoadDB): Cache initialized. _cached_pdf_id={self._cached_pdf_id}, rates={len(self._cached_paragraph_plagiarism_rates)}")
         
@@ -446,6 +678,9 @@ class MainWindow(QWidget):
             cursor = conn.cursor()
             cursor.execute("SELECT id, file_path, file_name, loaded_date FROM pdfs ORDER BY id DESC")
             files_in_db = cursor.fetchall()
+            # 미리 계산한 표절 위험도가 높은 PDF부터 보여줍니다. (점수가 없는 PDF는 맨 뒤, 같은 점수는 최근 추가 순)
+            risks = risk_scores.load_pdf_risks(cursor, risk_scores.scoring_mode(self.analyzer))
+            files_in_db.sort(key=lambda row: risks[row[0]][0] if row[0] in risks else -1.0, reverse=True)
             
             for pdf_id, file_path, file_name, loaded_date_str in files_in_db:
                 if not os.path.exists(file_path):
@@ -456,7 +691,8 @@ class MainWindow(QWidget):
                 loaded_dt = QDateTime.fromString(loaded_date_str, "yyyy-MM-dd HH:mm:ss")
                 self.files_data.append({"id": pdf_id, "filename": file_path, "loaded_dt": loaded_dt, "file_name_only": file_name})
 
-                item_widget = PDFFileItem(file_name, loaded_dt)
+                risk, stale = risks.get(pdf_id, (None, False))
+                item_widget = PDFFileItem(file_name, loaded_dt, risk, stale)
                 list_item = QListWidgetItem(self.file_list_widget)
                 list_item.setSizeHint(item_widget.sizeHint()) 
                 self.file_list_widget.addItem(list_item)
@@ -478,24 +714,16 @@ class MainWindow(QWidget):
             file_name_only = os.path.basename(file_path)
             loaded_date = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
 
-            cursor.execute("SELECT id FROM pdfs WHERE file_path = ?", (file_path,))
-            if cursor.fetchone():
+            if pdf_ingest.find_pdf_id(cursor, file_path) is not None:
                 QMessageBox.warning(self, "파일 중복", f"'{file_name_only}' 파일은 이미 추가되었습니다.")
                 return None
 
-            cursor.execute("INSERT INTO pdfs (file_path, file_name, loaded_date) VALUES (?, ?, ?)",
-                           (file_path, file_name_only, loaded_date))
-            pdf_id = cursor.lastrowid
-            print(f"DEBUG(AddDB): Added file '{file_name_only}' with new PDF ID: {pdf_id}") # 디버그
-
             text_content = extract_text_from_pdf(file_path)
-            paragraphs = self._split_text_into_paragraphs(text_content)
+            paragraphs = [p.strip() for p in self._split_text_into_paragraphs(text_content) if p.strip()]
             print(f"DEBUG(AddDB): Extracted {len(paragraphs)} paragraphs from '{file_name_only}'.") # 디버그
 
-            for i, para_text in enumerate(paragraphs):
-                if para_text.strip(): 
-                    cursor.execute("INSERT INTO paragraphs (pdf_id, paragraph_text, page_number) VALUES (?, ?, ?)",
-                                   (pdf_id, para_text.strip(), i + 1))
+            pdf_id = pdf_ingest.insert_pdf(cursor, file_path, paragraphs, loaded_date)
+            print(f"DEBUG(AddDB): Added file '{file_name_only}' with new PDF ID: {pdf_id}") # 디버그
             conn.commit()
             return pdf_id
         except sqlite3.Error as e:
@@ -512,12 +740,8 @@ class MainWindow(QWidget):
             cursor = conn.cursor()
             
             # [수정] 외래키 설정(CASCADE)에 의존하지 않고, 명시적으로 문단 데이터를 먼저 삭제.
-            # 고아 데이터가 남는 문제 방지가능.
-            cursor.execute("DELETE FROM paragraphs WHERE pdf_id = ?", (pdf_id,))
-            
-            # 그 다음 PDF 파일 정보를 삭제합니다.
-            cursor.execute("DELETE FROM pdfs WHERE id = ?", (pdf_id,))
-            
+            # 고아 데이터가 남는 문제 방지가능. (pdf_ingest.delete_pdf 참고)
+            pdf_ingest.delete_pdf(cursor, pdf_id)
             conn.commit()
             print(f"DEBUG(DeleteDB): Deleted PDF and its paragraphs with ID: {pdf_id}")
             
@@ -542,47 +766,20 @@ class MainWindow(QWidget):
             if conn: conn.close()
         return paragraphs
 
-    def _split_text_into_paragraphs(self, text):
-        paragraphs = []
-        text = text.strip()
-        text = text.replace('ㅡ', '')
-        text = re.sub(r'[ \t]+', ' ', text)
-        text = re.sub(r'([^\n.?!])\n([^\n])', r'\1 \2', text)
-        text = re.sub(r'([.?!])([ㄱ-ㅎㅏ-ㅣ가-힣])', r'\1 \2', text)
-        text = re.sub(r'\n\s*\n+', '\n\n', text).strip()
-        
-        raw_paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-
-        MAX_PARA_LENGTH = 400
-        MIN_SENTENCE_LENGTH = 10
-
-        final_paragraphs = []
-
-        for raw_para in raw_paragraphs:
-            raw_para = re.sub(r'(?<!\')([,])(?!\')', r'\1 ', raw_para)
-            raw_para = re.sub(r'([.?!])', r'\1 ', raw_para)
-            raw_para = re.sub(r'\s+', ' ', raw_para).strip()
-
-            sentences = re.split(r'(?<=[.?!”])\s*(?=[ㄱ-ㅎㅏ-ㅣ가-힣A-Za-z”])', raw_para) # 수정된 정규식
-            sentences = [s.strip() for s in sentences if len(s.strip()) > MIN_SENTENCE_LENGTH] 
-            
-            current_paragraph_buffer = []
-            current_paragraph_length = 0
-
-            for sentence in sentences:
-                if current_paragraph_length + len(sentence) + 1 <= MAX_PARA_LENGTH:
-                    current_paragraph_buffer.append(sentence)
-                    current_paragraph_length += len(sentence) + 1
-                else:
-                    if current_paragraph_buffer:
-                        final_paragraphs.append(" ".join(current_paragraph_buffer))
-                    current_paragraph_buffer = [sentence]
-                    current_paragraph_length = len(sentence) + 1
+    def _get_stored_paragraph_risks(self, pdf_id):
+        """유휴 시간에 미리 계산해 둔 문단별 최고 유사도를 {문단 순서: 유사도}로 가져옵니다."""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            return risk_scores.load_paragraph_risks(conn.cursor(), pdf_id)
+        except sqlite3.Error as e:
+            print(f"ERROR(Risk): 저장된 문단 위험도를 불러오는 중 오류 발생: {e}")
+            return {}
+        finally:
+            if conn: conn.close()
 
-            if current_paragraph_buffer:
-                final_paragraphs.append(" ".join(current_paragraph_buffer))
-        
-        return final_paragraphs
+    def _split_text_into_paragraphs(self, text):
+        return pdf_ingest.split_text_into_paragraphs(text)
 
     # --- GUI 이벤트 핸들러 ---
     def load_pdfs(self):
@@ -596,6 +793,169 @@ class MainWindow(QWidget):
         print(f"DEBUG(LoadPDFs): Files loaded. Cache after load: _cached_pdf_id={self._cached_pdf_id}, rates={len(self._cached_paragraph_plagiarism_rates)}")
 
 
+    def toggle_watch_folder(self):
+        """감시 폴더 모드를 켜거나 끕니다. 켜져 있는 동안 폴더에 들어오는 PDF가 자동으로 추가/갱신/삭제됩니다."""
+        if self.watch_worker is not None:
+            self.watch_worker.stop()
+            self.watch_worker.wait()
+            self.watch_worker = None
+            self.btn_watch.setText("👁️ 감시 폴더 시작")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "감시할 폴더 선택")
+        if not folder: return
+
+        self.watch_worker = WatchFolderWorker(self.db_path, folder)
+        self.watch_worker.batch_ingested.connect(self.on_watch_batch_ingested)
+        self.watch_worker.error.connect(self.on_watch_error)
+        self.watch_worker.start()
+        self.btn_watch.setText(f"⏹️ 감시 중지 ({os.path.basename(folder) or folder})")
+
+    def on_watch_batch_ingested(self, stats):
+        print(f"DEBUG(Watch): GUI received batch: {stats}")
+        if stats.get("added") or stats.get("modified") or stats.get("removed"):
+            self._load_files_from_db() # 파일 목록 갱신 (DB 조회만 하므로 GUI를 오래 막지 않음)
+
+    def on_watch_error(self, error_message, stopped):
+        if stopped and self.watch_worker is not None and self.sender() is self.watch_worker:
+            self.watch_worker.wait()
+            self.watch_worker = None
+            self.btn_watch.setText("👁️ 감시 폴더 시작")
+            QMessageBox.critical(self, "감시 폴더 오류", f"폴더를 감시하는 중 오류가 발생하여 감시를 멈췄습니다: {error_message}")
+            return
+        QMessageBox.warning(self, "감시 폴더 오류", f"{error_message}\n이 파일은 건너뛰고 감시를 계속합니다.")
+
+    def toggle_bulk_import(self):
+        """폴더 일괄 가져오기를 시작하거나 중지합니다. 중지해도 남은 파일은 다음 실행 때 이어서 가져옵니다."""
+        if self.bulk_import_worker is not None:
+            self.bulk_import_worker.stop() # 현재 배치를 마친 뒤 멈춥니다.
+            self.btn_bulk_import.setEnabled(False)
+            self.btn_bulk_import.setText("중지하는 중...")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "가져올 폴더 선택 (하위 폴더 포함)")
+        if not folder: return
+
+        self.bulk_import_worker = BulkImportWorker(self.db_path, folder)
+        self.bulk_import_worker.progress.connect(self.on_bulk_import_progress)
+        self.bulk_import_worker.finished.connect(self.on_bulk_import_complete)
+        self.bulk_import_worker.start()
+        self.btn_bulk_import.setText("⏹️ 가져오기 중지 (준비 중...)")
+
+    def on_bulk_import_progress(self, stats):
+        self.btn_bulk_import.setText(
+            f"⏹️ 가져오기 중지 ({stats['done']:,}개 완료, {stats['remaining']:,}개 남음, "
+            f"{stats['files_per_sec']:.1f} files/s, {stats['paragraphs_per_sec']:.0f} 문단/s)"
+        )
+
+    def on_bulk_import_complete(self, stats, error_message):
+        self.bulk_import_worker = None
+        self.btn_bulk_import.setEnabled(True)
+        self.btn_bulk_import.setText("📁 폴더 일괄 가져오기")
+        self._load_files_from_db()
+        if error_message:
+            QMessageBox.critical(self, "가져오기 오류", f"폴더를 가져오는 중 오류 발생: {error_message}\n다시 실행하면 남은 파일부터 이어서 가져옵니다.")
+            return
+        QMessageBox.information(self, "가져오기 완료",
+                                f"완료 {stats['done']:,}개, 실패(건너뜀) {stats['failed']:,}개, 남음 {stats['remaining']:,}개\n"
+                                f"처리량: {stats['files_per_sec']:.1f} files/s, {stats['paragraphs_per_sec']:.1f} 문단/s")
+
+    def rescan_files(self):
+        """DB의 PDF들 중 같은 자리에서 교체된 파일만 다시 추출하여 바뀐 문단만 갱신합니다."""
+        if self.rescan_worker is not None:
+            return
+        self.rescan_worker = RescanWorker(self.db_path)
+        self.rescan_worker.progress.connect(self.on_rescan_progress)
+        self.rescan_worker.finished.connect(self.on_rescan_complete)
+        self.rescan_worker.start()
+        self.btn_rescan.setEnabled(False)
+        self.btn_rescan.setText("다시 검사하는 중...")
+
+    def on_rescan_progress(self, stats):
+        self.btn_rescan.setText(f"다시 검사하는 중... ({stats['modified']:,}개 갱신)")
+
+    def on_rescan_complete(self, stats, error_message):
+        self.rescan_worker = None
+        self.btn_rescan.setEnabled(True)
+        self.btn_rescan.setText("🔄 바뀐 파일 다시 검사")
+        if error_message:
+            QMessageBox.critical(self, "다시 검사 오류", f"파일을 다시 검사하는 중 오류 발생: {error_message}")
+            return
+        if stats["modified"] or stats["removed"]:
+            self._load_files_from_db() # 파일 목록 갱신 (캐시도 초기화됨)
+        QMessageBox.information(self, "다시 검사 완료",
+                                f"검사 {stats['scanned']:,}개 중 다시 추출 {stats['modified']:,}개, 삭제 {stats['removed']:,}개, 실패 {stats['failed']:,}개\n"
+                                f"문단 +{stats['paragraphs_added']:,} / -{stats['paragraphs_removed']:,} ({stats['elapsed']:.1f}초)")
+
+    # --- 유휴 시간 표절 위험도 사전 계산 ---
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Type.MouseButtonPress, QEvent.Type.KeyPress, QEvent.Type.Wheel):
+            self._last_user_activity = time.monotonic()
+        return False
+
+    def _is_busy(self):
+        """대화형 분석이나 다른 백그라운드 작업이 실행 중인지 확인합니다."""
+        workers = (getattr(self, "worker", None), getattr(self, "export_worker", None), self.bulk_import_worker, self.rescan_worker)
+        return any(worker is not None and worker.isRunning() for worker in workers)
+
+    def _on_idle_check(self):
+        if self.precompute_worker is not None or self._precompute_exhausted:
+            return
+        if not hasattr(self.analyzer, "analyze_many"): # 분석 서버 클라이언트/더미 분석기는 사전 계산을 지원하지 않음
+            return
+        if self._is_busy() or time.monotonic() - self._last_user_activity < self.IDLE_SECONDS:
+            return
+        print("DEBUG(Risk): App is idle. Starting background risk precomputation.")
+        self.precompute_worker = PrecomputeWorker(self.analyzer)
+        self.precompute_worker.progress.connect(self.on_precompute_progress)
+        self.precompute_worker.finished.connect(self.on_precompute_complete)
+        self.precompute_worker.start(QThread.Priority.LowestPriority)
+
+    def _stop_precompute(self, wait=False):
+        """
+        사전 계산을 멈추고 그 워커를 반환합니다. (없으면 None)
+        분석기가 청크마다 멈춤 요청을 확인하므로 워커는 진행 중인 청크 하나만 마치고, 그 배치는 저장하지 않고 끝납니다.
+        wait=True이면 워커가 끝날 때까지 기다립니다. (공유 분석기의 설정을 바꾸기 전)
+        """
+        worker = self.precompute_worker
+        if worker is not None:
+            worker.stop()
+            if wait:
+                worker.wait()
+        return worker
+
+    def on_precompute_progress(self, pdf_risks, scored):
+        rows_by_pdf_id = {f["id"]: i for i, f in enumerate(self.files_data)}
+        for pdf_id, risk in pdf_risks.items():
+            row = rows_by_pdf_id.get(pdf_id)
+            item_widget = self.file_list_widget.itemWidget(self.file_list_widget.item(row)) if row is not None else None
+            if isinstance(item_widget, PDFFileItem):
+                item_widget.set_risk(risk) # 목록 순서는 사용자가 보는 중에 바꾸지 않고, 다음에 목록을 불러올 때 정렬합니다.
+
+    def on_precompute_complete(self, scored, error_message):
+        worker, self.precompute_worker = self.precompute_worker, None
+        if error_message:
+            print(f"ERROR(Risk): 표절 위험도 사전 계산 중 오류 발생: {error_message}")
+            self._precompute_exhausted = True # 같은 오류를 반복하지 않도록 DB가 바뀔 때까지 멈춤
+        elif worker is not None and not worker.is_stopped():
+            self._precompute_exhausted = True
+
+    def closeEvent(self, event):
+        self.idle_timer.stop()
+        if self.precompute_worker is not None:
+            self.precompute_worker.stop()
+            self.precompute_worker.wait()
+        if self.watch_worker is not None:
+            self.watch_worker.stop()
+            self.watch_worker.wait()
+        if self.bulk_import_worker is not None:
+            self.bulk_import_worker.stop()
+            self.bulk_import_worker.wait()
+        if self.rescan_worker is not None:
+            self.rescan_worker.stop()
+            self.rescan_worker.wait()
+        super().closeEvent(event)
+
     def delete_selected_files(self):
         pdf_ids_to_delete_from_db = []
         for i in range(self.file_list_widget.count()):
@@ -646,6 +1006,8 @@ class MainWindow(QWidget):
             
             # 현재 캐시된 표절률이 방금 선택한 PDF에 대한 것인지 확인
             is_current_pdf_analyzed = (self._cached_pdf_id == selected_pdf_id)
+            # 이번 실행에서 분석하지 않은 PDF는 유휴 시간에 미리 계산해 둔 문단별 최고 유사도를 보여줍니다.
+            stored_rates = {} if is_current_pdf_analyzed else self._get_stored_paragraph_risks(selected_pdf_id)
             print(f"DEBUG(SelectPDF): Selected PDF ID: {selected_pdf_id}. Cached PDF ID: {self._cached_pdf_id}. Is Analyzed? {is_current_pdf_analyzed}. Num Paras in cache: {len(self._cached_paragraph_plagiarism_rates)}")
 
 
@@ -656,6 +1018,8 @@ class MainWindow(QWidget):
                     # 캐시 키는 (pdf_id, paragraph_order)
                     plagiarism_rate = self._cached_paragraph_plagiarism_rates.get((selected_pdf_id, i + 1), 0.0)
                     print(f"DEBUG(SelectPDF): Para ({selected_pdf_id}, {i+1}) rate from cache: {plagiarism_rate}") # 캐시 사용 여부 확인
+                else:
+                    plagiarism_rate = stored_rates.get(i + 1, 0.0)
                 
                 para_preview = para_text[:150].replace('\n', ' ') # 미리보기 텍스트
                 if len(para_text) > 150: para_preview += '...'
@@ -723,13 +1087,17 @@ class MainWindow(QWidget):
             target_pdf_id = self.files_data[selected_pdf_index]["id"]
             file_name_only = self.files_data[selected_pdf_index]["file_name_only"]
 
+            # 유휴 시간 사전 계산이 돌고 있으면 바로 양보시킵니다. 분석 워커는 사전 계산이 (청크 하나 안에) 끝난 뒤에 시작합니다.
+            stopping_precompute = self._stop_precompute()
+
             # 1. UI 최적화: 사용자가 기다리는 동안 피드백 제공
             self.text_comparison.setPlainText(f"⏳ '{file_name_only}' 파일 분석 중...\n(잠시만 기다려주세요...)")
             self.btn_analyze.setEnabled(False) # 중복 실행 방지
             self.btn_analyze.setText("분석 중...") 
 
             # 2. 성능 최적화: 워커 쓰레드 생성 및 실행 (GUI 멈춤 방지)
-            self.worker = AnalysisWorker(self.analyzer, target_pdf_id, file_name_only, self.files_data)
+            self.worker = AnalysisWorker(self.analyzer, target_pdf_id, file_name_only, self.files_data,
+                                         self.spin_top_k.value(), self.spin_min_similarity.value(), stopping_precompute)
             self.worker.finished.connect(self.on_analysis_complete) # 작업이 끝나면 실행될 함수 연결
             self.worker.start()
 
@@ -737,9 +1105,13 @@ class MainWindow(QWidget):
             self.text_comparison.setPlainText("선택된 파일이 올바르지 않습니다.")
 
     # [추가] 쓰레드 작업이 완료되었을 때 호출되는 함수 (결과 화면 표시)
-    def on_analysis_complete(self, analysis_results, target_pdf_id, file_name_only):
+    def on_analysis_complete(self, analysis_results, target_pdf_id, file_name_only, error_message, out_of_memory):
         self.btn_analyze.setEnabled(True) # 버튼 다시 활성화
         self.btn_analyze.setText("✨ 분석하기")
+        if error_message:
+            self.text_comparison.setPlainText(f"'{file_name_only}' 파일을 분석하지 못했습니다.\n{error_message}")
+            QMessageBox.warning(self, "메모리 부족" if out_of_memory else "분석 오류", f"'{file_name_only}' 분석 중 오류 발생: {error_message}")
+            return
 
         # 캐시 업데이트 (기존 로직 재사용)
         self._cached_pdf_id = target_pdf_id
@@ -798,6 +1170,30 @@ class MainWindow(QWidget):
         if current_pdf_item:
             self._on_pdf_selection_changed(current_pdf_item, None)
 
+    def export_data(self):
+        """문단, TF-IDF 벡터, 전체 유사도 결과를 선택한 폴더에 열 기반 파일로 내보냅니다."""
+        if not isinstance(self.analyzer, similarity_analyzer.SimilarityAnalyzer):
+            QMessageBox.information(self, "내보내기 불가", "분석 서버에 접속한 상태에서는 서버 쪽에서 simidoc_cli.py export를 실행해주세요.")
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "내보낼 폴더 선택")
+        if not out_dir: return
+
+        self.btn_export.setEnabled(False)
+        self.btn_export.setText("내보내는 중...")
+        self.export_worker = ExportWorker(self.analyzer, out_dir)
+        self.export_worker.progress.connect(lambda stage, done: self.btn_export.setText(f"내보내는 중... ({stage} {done:,})"))
+        self.export_worker.finished.connect(self.on_export_complete)
+        self.export_worker.start()
+
+    def on_export_complete(self, manifest, error_message):
+        self.btn_export.setEnabled(True)
+        self.btn_export.setText("📦 데이터 내보내기")
+        if error_message:
+            QMessageBox.critical(self, "내보내기 오류", f"데이터를 내보내는 중 오류 발생: {error_message}")
+            return
+        summary = "\n".join(f"- {name}: {manifest[name]['rows']:,} 행" for name in ("paragraphs", "vectors", "matches") if name in manifest)
+        QMessageBox.information(self, "내보내기 완료", f"내보내기가 완료되었습니다. ({manifest['format']})\n{summary}")
+
     def _open_compare_view(self):
         """'비교 문서 보기' 버튼 클릭 시 실행될 함수 (현재는 더미)"""
         QMessageBox.information(self, "기능 예정", "이 기능은 추후 개발될 예정입니다! 😊")
@@ -805,6 +1201,8 @@ class MainWindow(QWidget):
 
 # --- 메인 실행 블록 ---
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support() # PyInstaller 빌드에서 감시 폴더의 프로세스 풀이 동작하도록
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -1,136 +1,648 @@
 import sqlite3
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy.sparse.linalg import norm as sparse_norm # <-- scipy.sparse.linalg에서 norm 함수 임포트!
+import threading
+import time
+from array import array
+import numpy as np
+import scipy.sparse
+import memory_budget
+import semantic_index
+import tokenization
+
+# SQLite의 바인딩 변수 개수 제한(기본 999)보다 작게 IN (...) 조회를 나눕니다.
+SQL_IN_CHUNK = 900
+# 한 번에 곱할 코퍼스 문단 수. 희소 곱 결과는 (chunk_size x CORPUS_BLOCK_ROWS)를 넘지 않습니다.
+CORPUS_BLOCK_ROWS = 8192
+
+
+class AnalysisCancelled(Exception):
+    """analyze_many에 넘긴 stop_event가 분석 도중 설정되었을 때 발생합니다. (결과를 일부만 돌려주지 않음)"""
+
+
+class ParagraphStore:
+    """
+    분석기가 메모리에 들고 있는 문단 메타데이터의 열 기반(columnar) 저장소.
+    문단 텍스트는 들고 있지 않고 화면에 보여줄 때만 SQLite에서 가져옵니다. (fetch_texts)
+    - para_ids / pdf_ids / orders: 행 번호(= TF-IDF 행렬의 행)별 문단 ID, PDF ID, 문단 순서
+    - 행은 (pdf_id, 문단 순서)로 정렬되어 있어서, PDF 하나의 문단들은 연속된 행 범위를 차지합니다.
+    - pdf_offsets: 정렬된 PDF ID 배열과 각 PDF의 [시작 행, 끝 행) 오프셋 테이블
+    """
+    def __init__(self, para_ids, pdf_ids, orders):
+        self.para_ids = np.asarray(para_ids, dtype=np.int64)
+        self.pdf_ids = np.asarray(pdf_ids, dtype=np.int64)
+        self.orders = np.asarray(orders, dtype=np.int32)
+        # pdf_ids가 정렬되어 있으므로 값이 바뀌는 지점이 곧 각 PDF의 시작 행입니다.
+        if len(self.pdf_ids):
+            starts = np.flatnonzero(np.r_[True, self.pdf_ids[1:] != self.pdf_ids[:-1]])
+        else:
+            starts = np.empty(0, dtype=np.int64)
+        self.offset_pdf_ids = self.pdf_ids[starts]
+        self.offset_starts = starts
+        self.offset_ends = np.r_[starts[1:], len(self.pdf_ids)].astype(np.int64)
+        self._para_id_order = None # rows_of()에서 처음 필요할 때 만드는 문단 ID 정렬 순서
+
+    def __len__(self):
+        return len(self.para_ids)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.para_ids, self.pdf_ids, self.orders, self.offset_pdf_ids, self.offset_starts, self.offset_ends))
+
+    def rows_for_pdf(self, pdf_id):
+        """PDF 하나의 문단들이 차지하는 행 범위를 반환합니다. (없으면 빈 범위)"""
+        i = np.searchsorted(self.offset_pdf_ids, pdf_id)
+        if i < len(self.offset_pdf_ids) and self.offset_pdf_ids[i] == pdf_id:
+            return range(int(self.offset_starts[i]), int(self.offset_ends[i]))
+        return range(0)
+
+    def has_pdf(self, pdf_id):
+        return len(self.rows_for_pdf(pdf_id)) > 0
+
+    def rows_of(self, para_ids):
+        """문단 ID 배열을 행 번호 배열로 바꿉니다. 저장소에 없는 문단은 -1입니다."""
+        if self._para_id_order is None:
+            self._para_id_order = np.argsort(self.para_ids, kind='stable')
+        para_ids = np.asarray(para_ids, dtype=np.int64)
+        if not len(self.para_ids):
+            return np.full(len(para_ids), -1, dtype=np.int64)
+        sorted_ids = self.para_ids[self._para_id_order]
+        positions = np.minimum(np.searchsorted(sorted_ids, para_ids), len(sorted_ids) - 1)
+        rows = self._para_id_order[positions]
+        return np.where(sorted_ids[positions] == para_ids, rows, -1)
+
+    def append(self, para_ids, pdf_ids, orders):
+        """새 PDF들의 문단을 뒤에 붙인 새 저장소를 반환합니다. (기존 저장소는 바꾸지 않으므로 읽는 쪽과 충돌하지 않음)"""
+        return ParagraphStore(
+            np.concatenate([self.para_ids, np.asarray(para_ids, dtype=np.int64)]),
+            np.concatenate([self.pdf_ids, np.asarray(pdf_ids, dtype=np.int64)]),
+            np.concatenate([self.orders, np.asarray(orders, dtype=np.int32)]),
+        )
+
+
+def fetch_paragraph_texts(db_path, para_ids):
+    """문단 ID 목록에 해당하는 텍스트를 {para_id: text}로 가져옵니다. (화면 표시용, 필요한 만큼만 조회)"""
+    para_ids = list(dict.fromkeys(int(p) for p in para_ids))
+    texts = {}
+    if not para_ids:
+        return texts
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        for start in range(0, len(para_ids), SQL_IN_CHUNK):
+            chunk = para_ids[start:start + SQL_IN_CHUNK]
+            cursor.execute(f"SELECT id, paragraph_text FROM paragraphs WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            texts.update(cursor.fetchall())
+    except sqlite3.Error as e:
+        print(f"ERROR(DB): 문단 텍스트 불러오기 오류: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return texts
+
 
 class SimilarityAnalyzer:
     """
     SimiDoc의 핵심: PDF 문단 간의 유사도를 분석하는 클래스.
     TF-IDF 벡터화와 코사인 유사도를 사용하여 문단별 유사도를 계산합니다.
+    문단은 tokenizer 방식(tokenization.TOKENIZERS)으로 토큰화되며, 토큰 ID는 DB에 캐시된 것을 그대로 조립해서 사용합니다.
+    한 번 학습한 TF-IDF 인덱스는 DB 내용이 바뀌기 전까지 메모리에 유지(웜 인덱스)됩니다.
+    메모리에는 float32 TF-IDF 행렬과 ParagraphStore(ID/순서 배열)만 두고, 문단 텍스트는 결과를 만들 때만 DB에서 읽습니다.
+    semantic=True이면 TF-IDF 행렬을 LSA 임베딩으로 투영하고 IVF 근사 검색으로 유사 문단을 찾습니다. (semantic_index 참고)
+    memory_budget_mb를 주면 분석 단계별 메모리를 추정하여 예산 안에 들어가도록 chunk_size를 줄이거나 스트리밍 모드로 낮추고,
+    그래도 안 되면 memory_budget.MemoryBudgetError를 냅니다. 분석 한 번의 최대 메모리 등은 last_metrics에 남습니다.
     """
-    def __init__(self, db_path):
+    # 마지막 전체 학습 이후 기존 어휘로 반영한 추가/삭제 문단 수가 이 비율을 넘으면 IDF를 갱신하기 위해 전체 재학습합니다.
+    MAX_INCREMENTAL_RATIO = 0.2
+    FETCH_BATCH_SIZE = 2000 # DB에서 문단을 스트리밍으로 읽을 때 한 번에 가져올 행 수 (메모리 예산이 작으면 memory_budget.plan_index_batch가 줄임)
+
+    def __init__(self, db_path, top_k=5, min_similarity=0.0, chunk_size=256, tokenizer=tokenization.TOKENIZER_WORD, semantic=False,
+                 memory_budget_mb=None, trace_memory=False):
+        if tokenizer not in tokenization.TOKENIZERS:
+            raise ValueError(f"지원하지 않는 토큰화 방식입니다: {tokenizer} (가능: {', '.join(tokenization.TOKENIZERS)})")
         self.db_path = db_path
-        self.paragraphs = [] 
-        self.pdf_paragraph_map = {} 
+        self.tokenizer = tokenizer # 문단 토큰화 방식 (word / particle / char_ngram)
+        self.top_k = top_k # 타겟 문단마다 보여줄 유사 문단 수
+        self.min_similarity = min_similarity # 이 값 미만의 유사도는 점수 계산 단계에서 바로 버림 (0.0이면 0보다 큰 값만)
+        self.chunk_size = chunk_size # 한 번에 코퍼스와 곱할 타겟 문단 수 (코퍼스는 CORPUS_BLOCK_ROWS행 블록씩 곱함)
+        self.semantic = semantic # True이면 단어 일치(TF-IDF) 대신 LSA 의미 유사도로 검색
+        self.memory_budget = None if memory_budget_mb is None else int(memory_budget_mb * 2**20) # byte, None이면 제한 없음
+        self.trace_memory = trace_memory # True이면 RSS 샘플링에 더해 tracemalloc으로도 최대 메모리를 잼 (조금 느려짐)
+        self.last_metrics = {} # 마지막 분석의 메모리 추정치/최대 사용량/소요 시간
+        self.store = ParagraphStore([], [], [])
+        self.vectorizer = None
+        self.paragraph_vectors = None
+        self._index_signature = None # 인덱스를 만들 때의 DB 상태 (문단 수, 최대 문단 ID)
+        self._fitted_rows = 0 # 마지막 전체 학습에 사용된 문단 수
+        self._changed_rows = 0 # 마지막 전체 학습 이후 부분 갱신으로 추가/삭제한 문단 수
+        self._fit_generation = 0 # 전체 재학습할 때마다 1씩 증가 (LSA 인덱스를 다시 학습해야 하는지 판단)
+        self._lsa_index = None
+        self._lsa_generation = None # _lsa_index의 투영을 학습한 TF-IDF의 _fit_generation
+        self._lock = threading.RLock() # 분석 서버 등에서 여러 쓰레드가 동시에 접근할 수 있으므로 보호
 
-    def _get_all_paragraphs_from_db(self):
-        """데이터베이스에서 모든 문단 정보를 불러옵니다."""
+    def _read_count_matrix(self, cursor, para_ids, pdf_ids, orders, num_columns, num_tokens, batch_rows):
+        """
+        커서에서 (문단 ID, PDF ID, 순서, 토큰 BLOB)을 batch_rows개씩 읽어 ID/순서를 배열에 쌓고,
+        배치마다 단어 빈도 행을 만들어 토큰 수(num_tokens)만큼 미리 잡아 둔 CSR 배열에 바로 채웁니다.
+        모든 문단의 토큰 ID를 한꺼번에 들고 있지 않으므로, 메모리는 완성된 행렬 + 배치 하나 크기입니다.
+        반환값: (문단 수 x num_columns) 단어 빈도 CSR 행렬
+        """
+        index_dtype = np.int32 if num_tokens < 2**31 else np.int64
+        data = np.empty(num_tokens, dtype=np.float32)
+        indices = np.empty(num_tokens, dtype=index_dtype)
+        indptr = array('q', [0])
+        nnz = 0
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            token_ids, lengths = array('i'), array('q')
+            for para_id, pdf_id, order, blob in rows:
+                para_ids.append(para_id)
+                pdf_ids.append(pdf_id)
+                orders.append(order if order is not None else 0)
+                token_ids.frombytes(blob)
+                lengths.append(len(blob) // 4)
+            del rows
+            block = tokenization.count_matrix(np.frombuffer(token_ids, dtype=np.int32), np.frombuffer(lengths, dtype=np.int64), num_columns)
+            if nnz + block.nnz > len(data):
+                # 토큰 수를 센 뒤에 다른 연결이 문단을 추가한 경우입니다.
+                grow = max(nnz + block.nnz - len(data), len(data) // 8)
+                data = np.concatenate([data, np.empty(grow, dtype=data.dtype)])
+                indices = np.concatenate([indices, np.empty(grow, dtype=indices.dtype)])
+            data[nnz:nnz + block.nnz] = block.data
+            indices[nnz:nnz + block.nnz] = block.indices
+            indptr.extend((block.indptr[1:] + nnz).tolist())
+            nnz += block.nnz
+        # 같은 토큰이 한 문단에 여러 번 나오면 nnz가 토큰 수보다 작으므로, 남는 뒷부분을 제자리에서 잘라냅니다.
+        data.resize(nnz, refcheck=False)
+        indices.resize(nnz, refcheck=False)
+        return scipy.sparse.csr_matrix((data, indices, np.asarray(indptr, dtype=indices.dtype)), shape=(len(indptr) - 1, num_columns))
+
+    def _get_index_signature(self):
+        """현재 DB의 문단 테이블 상태를 (문단 수, 최대 문단 ID)로 요약합니다. 인덱스 재사용 여부 판단에 사용됩니다."""
         conn = None
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("SELECT id, pdf_id, paragraph_text, page_number FROM paragraphs ORDER BY pdf_id, page_number ASC")
-            all_db_paragraphs = cursor.fetchall()
-            
-            self.paragraphs = [] 
-            self.pdf_paragraph_map = {} 
-
-            for para_id, pdf_id, text, order in all_db_paragraphs:
-                self.paragraphs.append((para_id, pdf_id, text, order))
-                if pdf_id not in self.pdf_paragraph_map:
-                    self.pdf_paragraph_map[pdf_id] = []
-                self.pdf_paragraph_map[pdf_id].append((para_id, text, order))
-            
+            cursor.execute("SELECT COUNT(*), MAX(id) FROM paragraphs")
+            return cursor.fetchone()
         except sqlite3.Error as e:
-            print(f"ERROR(DB): 데이터베이스에서 문단 불러오기 오류: {e}")
-            self.paragraphs = [] 
-            self.pdf_paragraph_map = {}
+            print(f"ERROR(DB): 문단 테이블 상태 확인 오류: {e}")
+            return None
         finally:
             if conn:
                 conn.close()
-        return self.paragraphs, self.pdf_paragraph_map
 
-    def analyze_similarity(self, target_pdf_id, files_data):
-        all_paragraphs, pdf_paragraph_map = self._get_all_paragraphs_from_db()
+    def refresh_index(self, force=False):
+        """
+        DB가 마지막 인덱싱 이후 바뀌었을 때만 TF-IDF를 다시 학습합니다.
+        인덱스를 사용할 수 있으면 True, 비교할 문단이 없으면 False를 반환합니다.
+        """
+        with self._lock:
+            signature = self._get_index_signature()
+            if not force and signature is not None and signature == self._index_signature and self.paragraph_vectors is not None:
+                return True
+            if not force and signature is not None and self._apply_paragraph_changes(signature):
+                return True
+
+            self.store = ParagraphStore([], [], [])
+            self.vectorizer = None
+            self.paragraph_vectors = None
+            self._index_signature = None
+
+            para_ids, pdf_ids, orders = array('q'), array('q'), array('l')
+            conn = None
+            try:
+                conn = sqlite3.connect(self.db_path)
+                # 처음 쓰는 토큰화 방식이면 이때 한 번 전체 문단을 토큰화해서 캐시합니다. (이후에는 PDF를 추가할 때 채워짐)
+                tokenization.fill_missing_tokens(conn, self.tokenizer)
+                cursor = conn.cursor()
+                num_columns = cursor.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM token_vocab WHERE mode = ?", (self.tokenizer,)).fetchone()[0]
+                num_paragraphs, num_tokens = cursor.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(t.token_ids)), 0) / 4 FROM paragraphs p "
+                    "JOIN paragraph_tokens t ON t.paragraph_id = p.id AND t.mode = ?", (self.tokenizer,)).fetchone()
+                batch_rows = memory_budget.plan_index_batch(self.memory_budget, num_tokens, num_paragraphs, self.FETCH_BATCH_SIZE)
+                cursor.execute("SELECT p.id, p.pdf_id, p.page_number, t.token_ids FROM paragraphs p "
+                               "JOIN paragraph_tokens t ON t.paragraph_id = p.id AND t.mode = ? ORDER BY p.pdf_id, p.page_number ASC",
+                               (self.tokenizer,))
+                counts = self._read_count_matrix(cursor, para_ids, pdf_ids, orders, num_columns, num_tokens, batch_rows)
+                vectorizer = tokenization.CachedTfidfVectorizer(self.tokenizer)
+                try:
+                    paragraph_vectors = vectorizer.fit_transform_counts(counts, self.db_path, batch_rows)
+                except ValueError as e:
+                    # 문단이 없거나, 모든 문단이 불용어뿐이라 어휘를 만들 수 없는 경우입니다.
+                    vectorizer, paragraph_vectors = None, None
+                    if para_ids:
+                        print(f"ERROR(Analyze): TF-IDF vectorization failed: {e}")
+            except sqlite3.Error as e:
+                print(f"ERROR(DB): 데이터베이스에서 문단 불러오기 오류: {e}")
+                return False
+            finally:
+                if conn:
+                    conn.close()
+
+            if not para_ids:
+                return False
 
-        if not all_paragraphs:
-            return [] 
+            self.store = ParagraphStore(np.frombuffer(para_ids, dtype=np.int64), np.frombuffer(pdf_ids, dtype=np.int64), orders)
+            self.vectorizer = vectorizer
+            self.paragraph_vectors = paragraph_vectors
+            self._index_signature = signature
+            self._fitted_rows = len(self.store)
+            self._changed_rows = 0
+            self._fit_generation += 1
+            print(f"DEBUG(Index): TF-IDF index built. paragraphs={len(self.store)}, signature={signature}")
+            return True
 
-        texts_for_vectorization = [p[2] for p in all_paragraphs]
-        
-        if not texts_for_vectorization:
-            return []
+    def _apply_paragraph_changes(self, signature):
+        """
+        마지막 인덱싱 이후 문단이 조금만 추가/삭제된 경우, 기존 어휘/IDF를 그대로 쓰고 바뀐 행만 반영합니다.
+        (감시 폴더나 다시 검사(rescan)처럼 파일이 조금씩 바뀌는 경우 매번 전체 TF-IDF를 다시 학습하지 않기 위함)
+        - 삭제된 문단의 행은 빼고, 새 문단만 벡터화해서 넣고, 문단 순서는 DB의 현재 값으로 다시 맞춥니다.
+        변경량이 많아 IDF가 크게 달라질 수 있으면 False를 반환하여 전체 재학습하게 합니다.
+        """
+        if self.vectorizer is None or self.paragraph_vectors is None or self._index_signature is None:
+            return False
 
+        conn = None
         try:
-            self.vectorizer = TfidfVectorizer() 
-            self.paragraph_vectors = self.vectorizer.fit_transform(texts_for_vectorization)
-
-            # 2. 모든 벡터가 0 벡터가 되어버리는 경우를 처리합니다.
-            if self.paragraph_vectors.shape[1] == 0:
-                 print("DEBUG: TfidfVectorizer extracted no features. All similarities will be 0.")
-                 results = []
-                 for _, (target_para_id, target_para_text, target_para_order) in enumerate(pdf_paragraph_map.get(target_pdf_id, [])):
-                     results.append({
-                         'target_paragraph': (target_para_id, target_para_text, target_para_order),
-                         'similar_paragraphs': [] 
-                     })
-                 return results
-
-            # 3. 추가적인 방어 로직: 총 비교 가능한 문단 수가 1개 이하일 경우.
-            if len(all_paragraphs) <= 1:
-                print("DEBUG: Only 1 or 0 paragraphs available in total. All similarities will be 0.")
-                results = []
-                for _, (target_para_id, target_para_text, target_para_order) in enumerate(pdf_paragraph_map.get(target_pdf_id, [])):
-                     results.append({
-                         'target_paragraph': (target_para_id, target_para_text, target_para_order),
-                         'similar_paragraphs': [] 
-                     })
-                return results
-
-        except Exception as e:
-            print(f"ERROR(Analyze): TF-IDF vectorization failed: {e}")
-            return []
-
-        results = []
-        target_paragraphs_info = pdf_paragraph_map.get(target_pdf_id, [])
-
-        if not target_paragraphs_info:
-            return []
-
-        # 타겟 PDF의 각 문단을 순회하며 유사도 분석
-        for _, (target_para_id, target_para_text, target_para_order) in enumerate(target_paragraphs_info):
-            full_list_target_para_idx = -1
-            for i, (para_id, pdf_id, text, order) in enumerate(all_paragraphs):
-                if para_id == target_para_id:
-                    full_list_target_para_idx = i
-                    break
-
-            if full_list_target_para_idx == -1:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, pdf_id, COALESCE(page_number, 0) FROM paragraphs ORDER BY pdf_id, page_number ASC")
+            rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+            old_rows = self.store.rows_of(rows[:, 0])
+            is_new = old_rows < 0
+            deleted_count = len(self.store) - int((~is_new).sum())
+            changed_count = int(is_new.sum()) + deleted_count
+            if changed_count == 0 or not len(rows) or self._changed_rows + changed_count > self._fitted_rows * self.MAX_INCREMENTAL_RATIO:
+                return False
+
+            tokenization.fill_missing_tokens(conn, self.tokenizer)
+            new_tokens = {}
+            new_ids = rows[is_new, 0].tolist()
+            for start in range(0, len(new_ids), SQL_IN_CHUNK):
+                chunk = new_ids[start:start + SQL_IN_CHUNK]
+                cursor.execute(f"SELECT paragraph_id, token_ids FROM paragraph_tokens WHERE mode = ? AND paragraph_id IN ({','.join('?' * len(chunk))})",
+                               [self.tokenizer, *chunk])
+                new_tokens.update(cursor.fetchall())
+        except sqlite3.Error as e:
+            print(f"ERROR(DB): 바뀐 문단 불러오기 오류: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+        # 남은 기존 행과 새 행을 위아래로 붙인 뒤, DB 순서((pdf_id, 문단 순서))대로 행을 재배치합니다.
+        new_token_ids = [np.frombuffer(new_tokens.get(para_id, b""), dtype=np.int32) for para_id in new_ids]
+        new_vectors = self.vectorizer.transform_ids(
+            np.concatenate(new_token_ids) if new_token_ids else np.empty(0, dtype=np.int32), [len(ids) for ids in new_token_ids]
+        )
+        stacked = scipy.sparse.vstack([self.paragraph_vectors[old_rows[~is_new]], new_vectors], format='csr')
+        positions = np.empty(len(rows), dtype=np.int64)
+        positions[~is_new] = np.arange(int((~is_new).sum()))
+        positions[is_new] = int((~is_new).sum()) + np.arange(len(new_ids))
+        self.paragraph_vectors = stacked[positions]
+        self.store = ParagraphStore(rows[:, 0], rows[:, 1], rows[:, 2])
+        self._index_signature = signature
+        self._changed_rows += changed_count
+        print(f"DEBUG(Index): Updated TF-IDF index in place. added={len(new_ids)}, removed={deleted_count}, signature={signature}")
+        return True
+
+    def index_snapshot(self):
+        """
+        인덱스를 최신으로 만든 뒤 (ParagraphStore, vectorizer, TF-IDF 행렬)을 같은 시점의 값으로 함께 반환합니다. (인덱스가 없으면 None)
+        다른 쓰레드가 중간에 인덱스를 갱신해도 행 번호와 문단 ID가 어긋나지 않습니다.
+        """
+        with self._lock:
+            if not self.refresh_index() or self.paragraph_vectors is None:
+                return None
+            return self.store, self.vectorizer, self.paragraph_vectors
+
+    def lsa_index_path(self):
+        """LSA 인덱스를 저장할 경로(확장자 제외). DB 옆에 토큰화 방식별로 저장됩니다. 예: simidoc.lsa_word.npy"""
+        return f"{os.path.splitext(self.db_path)[0]}.lsa_{self.tokenizer}"
+
+    def get_semantic_index(self):
+        """
+        현재 TF-IDF 인덱스에 맞는 LSA 인덱스를 반환합니다. (refresh_index가 성공한 뒤에 호출)
+        1. 메모리의 인덱스가 최신이면 그대로 사용하고,
+        2. DB 옆에 저장된 인덱스가 현재 DB 상태로 만든 것이면 읽어서 사용하고,
+        3. 같은 TF-IDF 학습에서 문단만 조금 바뀌었으면 학습된 투영으로 임베딩만 다시 계산하고,
+        4. 그 외에는 SVD와 IVF 리스트를 새로 학습하여 저장합니다.
+        """
+        with self._lock:
+            if self.paragraph_vectors is None or len(self.store) <= 1:
+                return None
+            signature = self._index_signature
+            lsa_index = self._lsa_index
+            if lsa_index is not None and lsa_index.signature == signature:
+                return lsa_index
+
+            path_prefix = self.lsa_index_path()
+            try:
+                saved = semantic_index.LsaIndex.load(path_prefix)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"ERROR(LSA): 저장된 LSA 인덱스를 읽을 수 없습니다 ({path_prefix}): {e}")
+                saved = None
+            if (saved is not None and saved.signature == tuple(signature) and saved.components.shape[1] == self.paragraph_vectors.shape[1]
+                    and np.array_equal(saved.para_ids, self.store.para_ids)):
+                print(f"DEBUG(LSA): Loaded LSA index from '{path_prefix}.npy'. paragraphs={len(saved)}")
+                self._lsa_index, self._lsa_generation = saved, self._fit_generation
+                return saved
+
+            if lsa_index is not None and self._lsa_generation == self._fit_generation:
+                lsa_index.refresh(self.paragraph_vectors, self.store.para_ids, signature)
+                print(f"DEBUG(LSA): Re-projected LSA embeddings. paragraphs={len(lsa_index)}")
+            else:
+                lsa_index = semantic_index.LsaIndex().fit(self.paragraph_vectors, self.store.para_ids, signature)
+                print(f"DEBUG(LSA): LSA index built. paragraphs={len(lsa_index)}, dims={lsa_index.components.shape[0]}, lists={len(lsa_index.centroids)}")
+            try:
+                lsa_index.save(path_prefix)
+            except OSError as e:
+                print(f"ERROR(LSA): LSA 인덱스 저장 오류 ({path_prefix}): {e}")
+            self._lsa_index, self._lsa_generation = lsa_index, self._fit_generation
+            return lsa_index
+
+    def iter_match_blocks(self, chunk_size=256, top_k=None, min_similarity=None):
+        """
+        코퍼스의 모든 문단에 대해 상위 top_k개의 유사 문단을 chunk_size개 행씩 나누어 계산합니다.
+        블록마다 희소 곱 결과를 바로 임계값으로 잘라내므로, 메모리는 실제 매치 수에 비례합니다.
+        각 블록마다 (타겟 행 번호, 유사 문단 행 번호, 유사도) NumPy 배열과 계산에 사용한 ParagraphStore를 yield 합니다.
+        행 번호는 함께 yield 한 store의 행 번호입니다. (도중에 인덱스가 갱신되어 self.store가 바뀌어도 이 store로 읽어야 함)
+        """
+        top_k = self.top_k if top_k is None else top_k
+        min_similarity = self.min_similarity if min_similarity is None else min_similarity
+        with self._lock:
+            if not self.refresh_index():
+                return
+            store = self.store
+            paragraph_vectors = self.paragraph_vectors
+            lsa_index = self.get_semantic_index() if self.semantic else None
+
+        if paragraph_vectors is None or paragraph_vectors.shape[0] <= 1 or paragraph_vectors.shape[1] == 0:
+            return
+
+        num_rows = paragraph_vectors.shape[0]
+        # 블록마다 결과를 바로 내보내므로 결과 리스트는 메모리에 쌓이지 않습니다. (num_targets=0)
+        chunk_size, stream_block_rows, estimates = self._plan_chunks(0, top_k, paragraph_vectors, lsa_index, chunk_size)
+        metrics = {"operation": "iter_match_blocks", "targets": num_rows, "paragraphs": num_rows, "budget_bytes": self.memory_budget,
+                   "estimates": estimates, "chunk_size": chunk_size, "streaming": stream_block_rows is not None, "stream_block_rows": stream_block_rows}
+        started = time.monotonic()
+        with memory_budget.MemoryMonitor(self.trace_memory) as monitor:
+            corpus_blocks = split_corpus(paragraph_vectors) if lsa_index is None and stream_block_rows is None else None
+            for start in range(0, num_rows, chunk_size):
+                stop = min(start + chunk_size, num_rows)
+                query_rows, source_rows, similarities = self._score_rows(
+                    np.arange(start, stop), paragraph_vectors, corpus_blocks, lsa_index, top_k, min_similarity, stream_block_rows
+                )
+                yield query_rows + start, source_rows, similarities, store
+        metrics.update(monitor.as_metrics(), elapsed=time.monotonic() - started)
+        self.last_metrics = metrics
+
+    def analyze_similarity(self, target_pdf_id, files_data, top_k=None, min_similarity=None):
+        return self.analyze_many([target_pdf_id], top_k, min_similarity).get(target_pdf_id, [])
+
+    def analyze_many(self, target_pdf_ids, top_k=None, min_similarity=None, stop_event=None):
+        """
+        여러 타겟 PDF를 한 번에 분석합니다.
+        모든 타겟 문단 벡터를 모아 chunk_size행씩 코퍼스 블록들과 곱하므로,
+        분석 서버가 동시에 들어온 요청을 묶어서(micro-batching) 처리할 때 사용합니다.
+        top_k / min_similarity를 생략하면 분석기에 설정된 기본값을 사용합니다.
+        stop_event(threading.Event)가 주어지면 청크마다 확인하여, 설정되었으면 AnalysisCancelled를 냅니다.
+        (유휴 시간 사전 계산이 대화형 분석에 바로 양보할 수 있도록)
+        반환값: {target_pdf_id: analyze_similarity와 같은 형식의 결과 리스트}
+        """
+        top_k = self.top_k if top_k is None else top_k
+        min_similarity = self.min_similarity if min_similarity is None else min_similarity
+        with self._lock:
+            if not self.refresh_index():
+                return {pdf_id: [] for pdf_id in target_pdf_ids}
+            store = self.store
+            paragraph_vectors = self.paragraph_vectors
+            lsa_index = self.get_semantic_index() if self.semantic else None
+
+        if paragraph_vectors is None:
+            return {pdf_id: [] for pdf_id in target_pdf_ids}
+
+        batch = {} # key: target_pdf_id, value: 그 PDF 문단들의 행 범위
+        for pdf_id in target_pdf_ids:
+            if pdf_id not in batch:
+                batch[pdf_id] = store.rows_for_pdf(pdf_id)
+        target_rows = np.fromiter((row for rows in batch.values() for row in rows), dtype=np.int64)
+
+        metrics = {"operation": "analyze_many", "targets": len(target_rows), "paragraphs": len(store), "budget_bytes": self.memory_budget}
+        started = time.monotonic()
+        with memory_budget.MemoryMonitor(self.trace_memory) as monitor:
+            # 2. 모든 벡터가 0 벡터가 되어버리는 경우 / 3. 비교 가능한 문단이 1개 이하인 경우
+            if paragraph_vectors.shape[1] == 0 or len(store) <= 1:
+                print("DEBUG: No comparable features or paragraphs. All similarities will be 0.")
+                matches_by_query = [[] for _ in range(len(target_rows))]
+            else:
+                matches_by_query = self._match_target_rows(target_rows, paragraph_vectors, lsa_index, top_k, min_similarity, monitor, metrics,
+                                                           stop_event)
+            results_by_pdf = self._build_results(batch, matches_by_query, store, target_rows)
+        metrics.update(monitor.as_metrics(), elapsed=time.monotonic() - started)
+        self.last_metrics = metrics
+        return results_by_pdf
+
+    def _plan_chunks(self, num_targets, top_k, paragraph_vectors, lsa_index, max_chunk_size):
+        """메모리 예산에 맞는 (chunk_size, 스트리밍 블록 행 수 또는 None, 단계별 추정치)를 구합니다. (memory_budget.plan_chunk_size)"""
+        num_paragraphs = paragraph_vectors.shape[0]
+        resident_bytes = memory_budget.sparse_nbytes(paragraph_vectors) + self.store.nbytes
+        if lsa_index is not None:
+            # 근사 검색은 질의마다 n_probe개 리스트의 후보만 비교하고, 전치 복사본도 만들지 않습니다.
+            resident_bytes += lsa_index.embeddings.nbytes
+            candidates = lsa_index.n_probe * num_paragraphs // max(len(lsa_index.centroids), 1) + 1
+            copy_bytes, row_bytes = 0, candidates * memory_budget.BYTES_PER_SIMILARITY
+        else:
+            # 곱 결과는 코퍼스 블록 하나만큼만 메모리에 올라갑니다.
+            copy_bytes = memory_budget.sparse_nbytes(paragraph_vectors)
+            row_bytes = min(num_paragraphs, CORPUS_BLOCK_ROWS) * memory_budget.BYTES_PER_SIMILARITY
+        estimates = memory_budget.estimate_analysis(num_paragraphs, num_targets, top_k, resident_bytes, copy_bytes, row_bytes)
+        chunk_size, stream_block_rows = memory_budget.plan_chunk_size(self.memory_budget, estimates, max_chunk_size)
+        return chunk_size, stream_block_rows if lsa_index is None else None, estimates
+
+    def _score_rows(self, rows, paragraph_vectors, corpus_blocks, lsa_index, top_k, min_similarity, stream_block_rows=None):
+        """
+        코퍼스 행 rows를 질의로 상위 top_k 유사 문단을 구합니다.
+        corpus_blocks(split_corpus)가 None이면 코퍼스를 stream_block_rows행씩 그때그때 전치하여 곱합니다. (스트리밍)
+        """
+        if lsa_index is not None:
+            return lsa_index.search(lsa_index.embeddings[rows], top_k, min_similarity, exclude_rows=rows)
+        if corpus_blocks is None:
+            return top_k_similarities_streaming(paragraph_vectors[rows], paragraph_vectors, top_k, min_similarity, rows, stream_block_rows)
+        return top_k_similarities(paragraph_vectors[rows], corpus_blocks, top_k, min_similarity, exclude_columns=rows)
+
+    def _match_target_rows(self, target_rows, paragraph_vectors, lsa_index, top_k, min_similarity, monitor, metrics, stop_event=None):
+        """
+        타겟 행들을 chunk_size행씩 코퍼스 전체와 비교하여 타겟 문단별 (유사 문단 행, 유사도) 리스트를 만듭니다.
+        chunk_size는 메모리 예산에 맞춰 정하고, 청크마다 측정한 최대 사용량이 예산을 넘으면
+        스트리밍 모드로 낮추고, 그 다음에는 chunk_size와 코퍼스 블록을 절반씩 줄입니다. 더 줄일 수 없으면 MemoryBudgetError를 냅니다.
+        """
+        chunk_size, stream_block_rows, estimates = self._plan_chunks(len(target_rows), top_k, paragraph_vectors, lsa_index, self.chunk_size)
+        metrics.update(estimates=estimates, chunk_size=chunk_size, streaming=stream_block_rows is not None,
+                       stream_block_rows=stream_block_rows, degraded=False)
+        if stream_block_rows is not None:
+            print(f"DEBUG(Memory): Budget {memory_budget.format_bytes(self.memory_budget)} too small for the full product. "
+                  f"Streaming {stream_block_rows}-row corpus blocks. chunk_size={chunk_size}")
+        corpus_blocks = split_corpus(paragraph_vectors) if lsa_index is None and stream_block_rows is None else None
+        matches_by_query = [[] for _ in range(len(target_rows))] # 타겟 문단별 (유사 문단 행, 유사도) 리스트
+        start = 0
+        while start < len(target_rows):
+            if stop_event is not None and stop_event.is_set():
+                raise AnalysisCancelled(f"분석이 중단되었습니다. (타겟 문단 {start:,}/{len(target_rows):,}개 처리)")
+            chunk_rows = target_rows[start:start + chunk_size]
+            query_rows, source_rows, similarities = self._score_rows(
+                chunk_rows, paragraph_vectors, corpus_blocks, lsa_index, top_k, min_similarity, stream_block_rows
+            )
+            for query_row, source_row, similarity in zip(query_rows.tolist(), source_rows.tolist(), similarities.tolist()):
+                matches_by_query[start + query_row].append((source_row, similarity))
+            start += len(chunk_rows)
+
+            used = estimates["resident_bytes"] + monitor.take_window_peak()
+            if self.memory_budget is None or used <= self.memory_budget or start >= len(target_rows):
                 continue
+            if lsa_index is None and stream_block_rows is None:
+                # 전치 복사본을 버리고 코퍼스 블록을 그때그때 전치하여 곱합니다.
+                corpus_blocks, stream_block_rows = None, min(memory_budget.STREAM_BLOCK_ROWS, len(self.store))
+            elif chunk_size > 1:
+                chunk_size //= 2
+            elif stream_block_rows is not None and stream_block_rows > memory_budget.MIN_STREAM_BLOCK_ROWS:
+                stream_block_rows = max(memory_budget.MIN_STREAM_BLOCK_ROWS, stream_block_rows // 2)
+            else:
+                raise memory_budget.MemoryBudgetError(
+                    f"분석 중 메모리 사용량이 약 {memory_budget.format_bytes(used)}로 예산 {memory_budget.format_bytes(self.memory_budget)}을 넘었습니다. "
+                    f"(타겟 문단 {start:,}/{len(target_rows):,}개 처리) 예산을 늘리거나 한 번에 분석할 PDF 수를 줄여 주세요."
+                )
+            metrics.update(streaming=stream_block_rows is not None, stream_block_rows=stream_block_rows, degraded=True)
+            print(f"DEBUG(Memory): Usage {memory_budget.format_bytes(used)} over budget. "
+                  f"stream_block_rows={stream_block_rows}, chunk_size={chunk_size}")
+        metrics.update(final_chunk_size=chunk_size, final_stream_block_rows=stream_block_rows)
+        return matches_by_query
+
+    def _build_results(self, batch, matches_by_query, store, target_rows):
+        """타겟 문단별 매치를 analyze_similarity 결과 형식({pdf_id: 결과 리스트})으로 만듭니다."""
+        # 결과에 실제로 등장하는 문단의 텍스트만 DB에서 가져옵니다.
+        shown_rows = target_rows.tolist() + [row for matches in matches_by_query for row, _ in matches]
+        texts = fetch_paragraph_texts(self.db_path, store.para_ids[shown_rows])
 
-            target_vector = self.paragraph_vectors[full_list_target_para_idx]
-
-            similar_paragraphs_for_target = []
-            
-            # 모든 문단 벡터와 비교
-            for other_para_index in range(self.paragraph_vectors.shape[0]):
-                # 현재 순회 중인 '비교 대상 문단'이 '타겟 문단 자신'과 완전히 동일한 경우 비교를 건너뜁니다.
-                if other_para_index == full_list_target_para_idx:
-                    continue
-                
-                other_vector = self.paragraph_vectors[other_para_index]
-                
-                # --- !!! 핵심 수정 지점 !!! ---
-                # sparse_norm(벡터)이 0인 경우 (즉, 0 벡터)를 확인합니다.
-                if sparse_norm(target_vector) == 0 or sparse_norm(other_vector) == 0:
-                    similarity = 0.0
-                else:
-                    similarity = cosine_similarity(target_vector, other_vector)[0][0]
-                # ------------------------------
-
-                if similarity > 0.0:
+        results_by_pdf = {}
+        matrix_row = 0
+        for pdf_id, rows in batch.items():
+            results = []
+            for target_row in rows:
+                target_para_id = int(store.para_ids[target_row])
+                similar_paragraphs_for_target = []
+                for other_para_index, similarity in matches_by_query[matrix_row]:
+                    other_para_id = int(store.para_ids[other_para_index])
                     similar_paragraphs_for_target.append({
-                        'source_pdf_id': all_paragraphs[other_para_index][1],
-                        'source_paragraph': (all_paragraphs[other_para_index][0], all_paragraphs[other_para_index][2], all_paragraphs[other_para_index][3]),
+                        'source_pdf_id': int(store.pdf_ids[other_para_index]),
+                        'source_paragraph': (other_para_id, texts.get(other_para_id, ""), int(store.orders[other_para_index])),
                         'similarity': similarity
                     })
-            
-            similar_paragraphs_for_target.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            results.append({
-                'target_paragraph': (target_para_id, target_para_text, target_para_order),
-                'similar_paragraphs': similar_paragraphs_for_target[:5] 
-            })
-        
-        return results
\ No newline at end of file
+                matrix_row += 1
+
+                results.append({
+                    'target_paragraph': (target_para_id, texts.get(target_para_id, ""), int(store.orders[target_row])),
+                    'similar_paragraphs': similar_paragraphs_for_target
+                })
+            results_by_pdf[pdf_id] = results
+
+        return results_by_pdf
+
+    def query_texts(self, texts, top_k=None, min_similarity=None, exclude_para_ids=None):
+        """
+        DB에 없는 임의의 텍스트들을 이 분석기의 인덱스(어휘/IDF)로 벡터화하여 상위 top_k 유사 문단을 찾습니다.
+        샤드 코디네이터가 다른 샤드의 문단을 질의할 때 사용합니다.
+        exclude_para_ids[i]가 주어지면 i번째 질의에서 그 문단(자기 자신)을 제외합니다.
+        반환값: 질의마다 [(para_id, pdf_id, 문단 순서, 유사도), ...] 리스트 (유사도 내림차순)
+        """
+        top_k = self.top_k if top_k is None else top_k
+        min_similarity = self.min_similarity if min_similarity is None else min_similarity
+        matches_by_query = [[] for _ in texts]
+        with self._lock:
+            if not self.refresh_index():
+                return matches_by_query
+            store = self.store
+            vectorizer = self.vectorizer
+            paragraph_vectors = self.paragraph_vectors
+            lsa_index = self.get_semantic_index() if self.semantic else None
+        if paragraph_vectors is None or not texts:
+            return matches_by_query
+
+        exclude_columns = None
+        if exclude_para_ids is not None:
+            exclude_columns = store.rows_of([-1 if p is None else p for p in exclude_para_ids])
+        corpus_blocks = split_corpus(paragraph_vectors) if lsa_index is None else None
+        for start in range(0, len(texts), self.chunk_size):
+            query_vectors = vectorizer.transform(texts[start:start + self.chunk_size])
+            chunk_exclude = None if exclude_columns is None else exclude_columns[start:start + self.chunk_size]
+            if lsa_index is not None:
+                query_rows, source_rows, similarities = lsa_index.search(lsa_index.project(query_vectors), top_k, min_similarity, chunk_exclude)
+            else:
+                query_rows, source_rows, similarities = top_k_similarities(query_vectors, corpus_blocks, top_k, min_similarity, chunk_exclude)
+            for query_row, source_row, similarity in zip(query_rows.tolist(), source_rows.tolist(), similarities.tolist()):
+                matches_by_query[start + query_row].append(
+                    (int(store.para_ids[source_row]), int(store.pdf_ids[source_row]), int(store.orders[source_row]), similarity)
+                )
+        return matches_by_query
+
+
+def iter_corpus_blocks(paragraph_vectors, block_rows=CORPUS_BLOCK_ROWS):
+    """코퍼스를 block_rows행씩 나누어 곱셈용으로 전치한 (시작 행, CSR 블록)을 yield 합니다."""
+    for start in range(0, paragraph_vectors.shape[0], block_rows):
+        yield start, paragraph_vectors[start:start + block_rows].T.tocsr()
+
+
+def split_corpus(paragraph_vectors, block_rows=CORPUS_BLOCK_ROWS):
+    """iter_corpus_blocks의 블록들을 리스트로 만듭니다. (분석 한 번에 한 번만 만들어 모든 청크에서 재사용)"""
+    return list(iter_corpus_blocks(paragraph_vectors, block_rows))
+
+
+def top_k_similarities(query_vectors, corpus_blocks, top_k, min_similarity=0.0, exclude_columns=None):
+    """
+    질의 벡터와 코퍼스의 코사인 유사도를 코퍼스 블록((시작 행, 전치 CSR 블록), split_corpus 참고)마다 희소 행렬 곱으로 구하고,
+    블록 하나를 곱할 때마다 바로 잘라내어 지금까지의 상위 top_k와 합칩니다.
+    - min_similarity 미만(0.0이면 0 이하)인 값은 블록의 곱 결과에서 제거합니다.
+    - exclude_columns[i]가 주어지면 i번째 질의와 그 코퍼스 행(자기 자신)의 유사도를 제외합니다.
+    - 남은 값들 중에서 질의마다 유사도가 높은 순으로 top_k개만 남깁니다. (동점이면 행 번호 순)
+    코퍼스 전체와의 곱은 한 번도 만들어지지 않으므로, 메모리와 정렬 비용은 (질의 수 x 블록 크기)와 실제 매치 수로 제한됩니다.
+    TF-IDF 벡터는 L2 정규화되어 있으므로, 내적이 곧 코사인 유사도입니다.
+    반환값: (질의 행 번호, 코퍼스 행 번호, 유사도) NumPy 배열. 질의 순서, 유사도 내림차순으로 정렬되어 있습니다.
+    """
+    exclude_columns = None if exclude_columns is None else np.asarray(exclude_columns)
+    best = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    for start, block_t in corpus_blocks:
+        product = (query_vectors @ block_t).tocsr()
+        similarities = product.data
+        if min_similarity > 0.0:
+            keep = similarities >= min_similarity
+        else:
+            keep = similarities > 0.0
+        query_rows = np.repeat(np.arange(product.shape[0]), np.diff(product.indptr))
+        source_rows = product.indices.astype(np.int64) + start
+        if exclude_columns is not None:
+            keep &= source_rows != exclude_columns[query_rows]
+        del product
+        block = (query_rows[keep], source_rows[keep], similarities[keep])
+        best = _keep_top_k(*(np.concatenate(arrays) for arrays in zip(best, block)), top_k)
+    return best
+
+
+def top_k_similarities_streaming(query_vectors, paragraph_vectors, top_k, min_similarity=0.0, exclude_columns=None,
+                                 block_rows=CORPUS_BLOCK_ROWS):
+    """
+    top_k_similarities와 같은 결과를, 미리 만든 블록 없이 코퍼스를 block_rows행씩 그때그때 전치하여 계산합니다.
+    (메모리 예산이 작을 때의 스트리밍 모드: 코퍼스 전체의 전치 복사본을 들고 있지 않음)
+    """
+    return top_k_similarities(query_vectors, iter_corpus_blocks(paragraph_vectors, block_rows), top_k, min_similarity, exclude_columns)
+
+
+def _keep_top_k(query_rows, source_rows, similarities, top_k):
+    # 질의 → 유사도 내림차순 → 코퍼스 행 번호 순으로 정렬한 뒤, 질의마다 앞에서 top_k개만 남깁니다.
+    order = np.lexsort((source_rows, -similarities, query_rows))
+    query_rows, source_rows, similarities = query_rows[order], source_rows[order], similarities[order]
+    row_starts = np.searchsorted(query_rows, query_rows, side='left')
+    keep = (np.arange(len(query_rows)) - row_starts) < top_k
+    return query_rows[keep], source_rows[keep].astype(np.int64), similarities[keep]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# SimiDoc 모듈들은 패키지가 아닌 평평한 모듈이므로, 어느 폴더에서 pytest를 실행해도 import 할 수 있게 합니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
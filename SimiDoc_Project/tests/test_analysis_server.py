@@ -0,0 +1,127 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import analysis_server
+import memory_budget
+import similarity_analyzer
+
+
+class StubAnalyzer:
+    """analyze_many 호출을 기록하고, PDF ID로 만든 가짜 결과를 돌려주는 대역 분석기"""
+    def __init__(self):
+        self.calls = []
+        self.refresh_error = None
+        self.analyze_error = None
+        self._lock = threading.Lock()
+
+    def analyze_many(self, target_pdf_ids, top_k=None, min_similarity=None):
+        with self._lock:
+            self.calls.append((list(target_pdf_ids), top_k, min_similarity))
+        if self.analyze_error:
+            raise self.analyze_error
+        return {
+            pdf_id: [{
+                'target_paragraph': (pdf_id * 10, f"문단 {pdf_id}", 0),
+                'similar_paragraphs': [{'source_pdf_id': 99, 'source_paragraph': (990, "원본 문단", 3), 'similarity': 0.5}],
+            }]
+            for pdf_id in target_pdf_ids
+        }
+
+    def refresh_index(self, force=False):
+        if self.refresh_error:
+            raise self.refresh_error
+
+
+@pytest.fixture
+def server():
+    stub = StubAnalyzer()
+    # 시간 창을 넉넉히 잡아, 동시에 보낸 요청들이 한 배치로 모이도록 합니다.
+    server = analysis_server.AnalysisServer(stub, port=0, batch_window=0.3).start()
+    yield server
+    server.stop()
+
+
+def test_concurrent_requests_are_coalesced_per_scoring_group(server):
+    client = analysis_server.RemoteSimilarityAnalyzer(server.url, timeout=10)
+    requests = [(1, 5, 0.0), (2, 5, 0.0), (2, 5, 0.0), (3, 10, 0.3), (4, 10, 0.3)]
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+
+    def send(i, pdf_id, top_k, min_similarity):
+        barrier.wait()
+        results[i] = client.analyze_similarity(pdf_id, [], top_k, min_similarity)
+
+    threads = [threading.Thread(target=send, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    calls = sorted(server.analyzer.calls, key=lambda call: call[1])
+    assert len(calls) == 2 # (top_k, min_similarity) 묶음마다 한 번, 중복 PDF는 한 번만
+    assert sorted(calls[0][0]) == [1, 2] and calls[0][1:] == (5, 0.0)
+    assert sorted(calls[1][0]) == [3, 4] and calls[1][1:] == (10, 0.3)
+
+    for (pdf_id, _, _), result in zip(requests, results):
+        assert result == [{
+            'target_paragraph': (pdf_id * 10, f"문단 {pdf_id}", 0),
+            'similar_paragraphs': [{'source_pdf_id': 99, 'source_paragraph': (990, "원본 문단", 3), 'similarity': 0.5}],
+        }]
+        assert isinstance(result[0]['target_paragraph'], tuple)
+        assert isinstance(result[0]['similar_paragraphs'][0]['source_paragraph'], tuple)
+
+
+def test_refresh_error_returns_json_500(server):
+    server.analyzer.refresh_error = MemoryError("예산 초과")
+    request = urllib.request.Request(server.url + "/refresh", data=b"{}", method="POST")
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        urllib.request.urlopen(request, timeout=10)
+    assert excinfo.value.code == 500
+    assert "예산 초과" in json.loads(excinfo.value.read().decode("utf-8"))["error"]
+
+
+@pytest.mark.parametrize("error, expected", [
+    (memory_budget.MemoryBudgetError("예산 초과"), memory_budget.MemoryBudgetError),
+    (ValueError("잘못된 행렬"), RuntimeError),
+])
+def test_remote_analyzer_raises_server_errors(server, error, expected):
+    server.analyzer.analyze_error = error
+    client = analysis_server.RemoteSimilarityAnalyzer(server.url, timeout=10)
+
+    with pytest.raises(expected) as excinfo:
+        client.analyze_similarity(1, [])
+    assert str(error) in str(excinfo.value) and "HTTP 500" in str(excinfo.value)
+
+
+def test_remote_analyzer_raises_when_server_is_down():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1] # 닫힌 뒤에는 아무도 듣지 않는 포트
+    client = analysis_server.RemoteSimilarityAnalyzer(f"http://127.0.0.1:{port}", timeout=5)
+
+    assert not client.is_available()
+    with pytest.raises(ConnectionError):
+        client.analyze_similarity(1, [])
+
+
+def test_main_exits_cleanly_when_index_does_not_fit(monkeypatch, capsys):
+    class OverBudgetAnalyzer(StubAnalyzer):
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+            self.refresh_error = memory_budget.MemoryBudgetError("인덱스 예산 초과")
+
+    monkeypatch.setattr(similarity_analyzer, "SimilarityAnalyzer", OverBudgetAnalyzer)
+    monkeypatch.setattr("sys.argv", ["analysis_server.py", "--db", "unused.db", "--memory-budget-mb", "1"])
+
+    assert analysis_server.main() == 1
+    assert "인덱스 예산 초과" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("host, allowed", [("127.0.0.1", True), ("localhost", True), ("::1", True), ("0.0.0.0", False), ("192.168.0.10", False)])
+def test_only_loopback_hosts_are_allowed(host, allowed):
+    assert analysis_server.is_loopback_host(host) is allowed
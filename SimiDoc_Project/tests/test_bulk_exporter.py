@@ -0,0 +1,69 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import bulk_exporter
+import pdf_ingest
+import similarity_analyzer
+
+
+class RefreshingStubAnalyzer:
+    """첫 블록을 내보낸 직후 인덱스가 갱신되어 self.store가 바뀌는 상황을 흉내 내는 대역 분석기"""
+    def __init__(self):
+        self.store = similarity_analyzer.ParagraphStore([10, 11, 20], [1, 1, 2], [0, 1, 0])
+
+    def iter_match_blocks(self, chunk_size, top_k=None, min_similarity=None):
+        store = self.store
+        yield np.array([0]), np.array([2]), np.array([0.9], dtype=np.float32), store
+        # 감시 폴더/다시 검사로 문단이 추가되어 행 번호가 밀린 새 저장소
+        self.store = similarity_analyzer.ParagraphStore([5, 10, 11, 20], [0, 1, 1, 2], [0, 0, 1, 0])
+        yield np.array([1, 2]), np.array([2, 0]), np.array([0.8, 0.9], dtype=np.float32), store
+
+
+def test_export_matches_uses_the_store_the_blocks_were_computed_with(tmp_path):
+    manifest = bulk_exporter.export_matches(RefreshingStubAnalyzer(), str(tmp_path), export_format="npz")
+
+    assert manifest["rows"] == 3
+    parts = [np.load(os.path.join(tmp_path, name)) for name in manifest["files"]]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0].files}
+    assert columns["target_paragraph_id"].tolist() == [10, 11, 20]
+    assert columns["target_pdf_id"].tolist() == [1, 1, 2]
+    assert columns["source_paragraph_id"].tolist() == [20, 20, 10]
+    assert columns["source_pdf_id"].tolist() == [2, 2, 1]
+
+
+class FailingStubAnalyzer(RefreshingStubAnalyzer):
+    """첫 블록을 내보낸 뒤 분석이 실패하는 대역 분석기"""
+    def iter_match_blocks(self, chunk_size, top_k=None, min_similarity=None):
+        yield np.array([0]), np.array([2]), np.array([0.9], dtype=np.float32), self.store
+        raise MemoryError("블록 계산 중 메모리 부족")
+
+
+@pytest.mark.parametrize("export_format", ["npz", "parquet"])
+def test_failed_export_leaves_no_partial_files(tmp_path, export_format):
+    if export_format == "parquet" and bulk_exporter.pa is None:
+        pytest.skip("pyarrow가 설치되어 있지 않습니다.")
+    db_path = str(tmp_path / "export.db")
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        pdf_ingest.insert_pdf(conn.cursor(), "a.pdf", ["첫 문단", "둘째 문단", "셋째 문단"], file_info=(None, None, None))
+        conn.commit()
+    finally:
+        conn.close()
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    def stop_after_first_chunk(stage, done):
+        raise KeyboardInterrupt # 내보내기 도중 취소된 경우
+
+    with pytest.raises(KeyboardInterrupt):
+        bulk_exporter.export_paragraphs(db_path, str(out_dir), export_format, chunk_size=1, progress_callback=stop_after_first_chunk)
+    with pytest.raises(MemoryError):
+        bulk_exporter.export_matches(FailingStubAnalyzer(), str(out_dir), export_format)
+    assert os.listdir(out_dir) == []
+
+    manifest = bulk_exporter.export_paragraphs(db_path, str(out_dir), export_format, chunk_size=2)
+    assert manifest["rows"] == 3 and sorted(os.listdir(out_dir)) == sorted(manifest["files"])
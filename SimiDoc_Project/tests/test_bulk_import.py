@@ -0,0 +1,150 @@
+import os
+import sqlite3
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import bulk_import
+import pdf_ingest
+
+
+class FakeProcessPool:
+    """
+    같은 프로세스에서 추출하는 대역 프로세스 풀.
+    crash_paths의 파일을 추출하려 하면 MuPDF가 추출 프로세스를 죽인 것처럼 BrokenProcessPool을 내고 풀이 깨집니다.
+    kill_paths의 파일은 가져오기 프로그램 전체가 꺼진 상황(KeyboardInterrupt가 아닌 예외)으로 흉내냅니다.
+    """
+    crash_paths = set()
+    kill_paths = set()
+    created = 0
+
+    def __init__(self, max_workers=None):
+        FakeProcessPool.created += 1
+        self.broken = False
+
+    def _run(self, file_path):
+        if self.broken or file_path in self.kill_paths:
+            raise RuntimeError("process killed") if file_path in self.kill_paths else BrokenProcessPool()
+        if file_path in self.crash_paths:
+            self.broken = True
+            raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+        return bulk_import._extract_job(file_path)
+
+    def map(self, fn, paths):
+        return [self._run(path) for path in paths]
+
+    def submit(self, fn, path):
+        future = Future()
+        try:
+            future.set_result(self._run(path))
+        except BrokenProcessPool as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_ingest, "extract_paragraphs", lambda path: open(path, encoding="utf-8").read().split("\n"))
+    monkeypatch.setattr(bulk_import, "ProcessPoolExecutor", FakeProcessPool)
+    monkeypatch.setattr(FakeProcessPool, "crash_paths", set())
+    monkeypatch.setattr(FakeProcessPool, "kill_paths", set())
+    root = tmp_path / "library"
+    paths = []
+    for i in range(6):
+        path = root / f"{i:02d}.pdf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"{i}번 문서 첫 문단\n{i}번 문서 둘째 문단", encoding="utf-8")
+        paths.append(os.path.abspath(str(path)))
+    db_path = str(tmp_path / "bulk.db")
+    conn = sqlite3.connect(db_path)
+    pdf_ingest.init_database(conn)
+    conn.close()
+    return db_path, str(root), paths
+
+
+def _query(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _jobs(db_path):
+    return {path: (status, attempts) for path, status, attempts in _query(db_path, "SELECT file_path, status, attempts FROM ingest_jobs")}
+
+
+def test_file_stored_under_another_spelling_is_not_imported_again(library):
+    db_path, root, paths = library
+    other_spelling = os.path.join(root, "sub", "..", "00.pdf") # GUI에서 다른 표기로 추가된 경우
+    conn = sqlite3.connect(db_path)
+    pdf_ingest.insert_pdf(conn.cursor(), other_spelling, ["0번 문서 첫 문단", "0번 문서 둘째 문단"])
+    conn.commit()
+    conn.close()
+
+    bulk_import.import_directory(db_path, root, batch_size=4)
+
+    assert _query(db_path, "SELECT COUNT(*) FROM pdfs")[0][0] == len(paths)
+    assert _jobs(db_path)[paths[0]][0] == bulk_import.STATUS_DONE
+
+
+def test_file_with_same_content_as_stored_pdf_is_skipped(library):
+    db_path, root, paths = library
+    with open(paths[0], encoding="utf-8") as f, open(os.path.join(root, "copy.pdf"), "w", encoding="utf-8") as copy:
+        copy.write(f.read())
+
+    stats = bulk_import.import_directory(db_path, root, batch_size=4)
+
+    assert stats["duplicates"] == 1
+    assert _query(db_path, "SELECT COUNT(*) FROM pdfs")[0][0] == len(paths)
+
+
+def test_import_resumes_after_the_program_was_killed_mid_batch(library):
+    db_path, root, paths = library
+    FakeProcessPool.kill_paths = {paths[1]}
+    bulk_import.enqueue_directory(db_path, root)
+
+    with pytest.raises(RuntimeError):
+        bulk_import.run_import(db_path, batch_size=3)
+    # 시도 횟수는 추출을 시작하기 전에 저장되어 있습니다.
+    assert {_jobs(db_path)[path] for path in paths[:3]} == {(bulk_import.STATUS_RUNNING, 1)}
+
+    FakeProcessPool.kill_paths = set()
+    stats = bulk_import.run_import(db_path, batch_size=3)
+
+    assert stats["done"] == len(paths)
+    assert {status for status, _ in _jobs(db_path).values()} == {bulk_import.STATUS_DONE}
+
+
+def test_file_that_keeps_killing_the_program_is_failed_at_the_retry_limit(library):
+    db_path, root, paths = library
+    FakeProcessPool.kill_paths = {paths[1]}
+    bulk_import.enqueue_directory(db_path, root)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            bulk_import.run_import(db_path, batch_size=3, max_attempts=2)
+    stats = bulk_import.run_import(db_path, batch_size=3, max_attempts=2)
+
+    jobs = _jobs(db_path)
+    assert jobs[paths[1]] == (bulk_import.STATUS_FAILED, 2)
+    # 같은 배치에 있던 다른 파일들은 하나씩 다시 추출되어 시도 한도에 걸리지 않았습니다.
+    assert all(jobs[path][0] == bulk_import.STATUS_DONE for path in paths if path != paths[1])
+    assert stats["done"] == len(paths) - 2
+
+
+def test_broken_process_pool_only_fails_the_crashing_file(library):
+    db_path, root, paths = library
+    FakeProcessPool.crash_paths = {paths[2]}
+
+    stats = bulk_import.import_directory(db_path, root, batch_size=3, max_attempts=2)
+
+    jobs = _jobs(db_path)
+    assert jobs[paths[2]] == (bulk_import.STATUS_FAILED, 2)
+    assert all(jobs[path] == (bulk_import.STATUS_DONE, 1) for path in paths if path != paths[2])
+    assert stats["done"] == len(paths) - 1 and stats["failed"] == 1
+    assert FakeProcessPool.created >= 3 # 깨질 때마다 풀을 새로 만듦
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import folder_watcher
+import pdf_ingest
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # 실제 PDF 대신 파일 내용(텍스트)을 문단으로 쓰도록 추출 함수를 바꿉니다.
+    monkeypatch.setattr(pdf_ingest, "extract_paragraphs", lambda path: open(path, encoding="utf-8").read().split("\n"))
+    path = str(tmp_path / "watch.db")
+    conn = sqlite3.connect(path)
+    pdf_ingest.init_database(conn)
+    conn.close()
+    return path
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _pdf_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT id, file_path FROM pdfs ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_file_stored_under_another_spelling_is_not_inserted_twice(tmp_path, db_path):
+    path = _write(str(tmp_path / "in" / "a.pdf"), "첫 문단\n둘째 문단")
+    other_spelling = str(tmp_path / "in" / "sub" / ".." / "a.pdf") # GUI에서 다른 표기로 추가된 경우
+    conn = sqlite3.connect(db_path)
+    pdf_ingest.insert_pdf(conn.cursor(), other_spelling, ["첫 문단", "둘째 문단"])
+    conn.commit()
+    conn.close()
+
+    stats = folder_watcher.ingest_events(db_path, [(folder_watcher.EVENT_ADDED, path)])
+
+    assert stats["added"] == 0 and stats["modified"] == 1
+    assert len(_pdf_rows(db_path)) == 1
+
+
+def test_file_with_same_content_is_skipped_as_duplicate(tmp_path, db_path):
+    first = _write(str(tmp_path / "in" / "a.pdf"), "같은 내용")
+    copy = _write(str(tmp_path / "in" / "copy_of_a.pdf"), "같은 내용")
+
+    stats = folder_watcher.ingest_events(db_path, [(folder_watcher.EVENT_ADDED, first), (folder_watcher.EVENT_ADDED, copy)])
+
+    assert stats["added"] == 1 and stats["duplicates"] == 1
+    assert [row[1] for row in _pdf_rows(db_path)] == [first]
+
+
+def test_forgotten_paths_are_reported_again(tmp_path):
+    path = _write(str(tmp_path / "in" / "a.pdf"), "내용")
+    watcher = folder_watcher.FolderWatcher(str(tmp_path / "in"), debounce=0.0)
+    watcher.poll(now=0.0)
+    assert watcher.poll(now=1.0) == [(folder_watcher.EVENT_ADDED, path)]
+    assert watcher.poll(now=2.0) == []
+
+    watcher.forget([path])
+    watcher.poll(now=3.0)
+    assert watcher.poll(now=4.0) == [(folder_watcher.EVENT_ADDED, path)]
+
+
+def test_batch_is_retried_after_db_error(tmp_path, db_path, monkeypatch):
+    path = _write(str(tmp_path / "in" / "a.pdf"), "문단")
+    monkeypatch.setattr(folder_watcher, "DB_RETRY_MAX_DELAY", 0.01)
+    real_ingest = folder_watcher.ingest_events
+    attempts = []
+    stop_event = threading.Event()
+    batches = []
+
+    def flaky_ingest(db, events, executor=None):
+        attempts.append(list(events))
+        if len(attempts) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return real_ingest(db, events)
+
+    def on_batch(stats):
+        batches.append(stats)
+        stop_event.set()
+
+    monkeypatch.setattr(folder_watcher, "ingest_events", flaky_ingest)
+    thread = threading.Thread(target=folder_watcher.run_watch_loop, args=(db_path, str(tmp_path / "in"), stop_event),
+                              kwargs=dict(on_batch=on_batch, poll_interval=0.05, debounce=0.1, workers=1))
+    thread.start()
+    thread.join(timeout=30)
+    stop_event.set()
+
+    assert len(attempts) == 3 and all(events == [(folder_watcher.EVENT_ADDED, path)] for events in attempts)
+    assert batches[0]["added"] == 1
+    assert [row[1] for row in _pdf_rows(db_path)] == [path]
+
+
+class CrashingPool:
+    """같은 프로세스에서 추출하는 대역 프로세스 풀. crash_paths의 파일을 추출하면 추출 프로세스가 죽은 것처럼 풀이 깨집니다."""
+    crash_paths = set()
+    created = 0
+
+    def __init__(self, max_workers=None):
+        CrashingPool.created += 1
+        self.broken = False
+
+    def submit(self, fn, path):
+        future = Future()
+        if path in self.crash_paths:
+            self.broken = True
+        if self.broken:
+            future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        else:
+            future.set_result(fn(path))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_process_pool_is_rebuilt_and_reported(tmp_path, db_path, monkeypatch):
+    paths = [_write(str(tmp_path / "in" / f"{name}.pdf"), f"{name} 문단") for name in ("a", "b", "c")]
+    monkeypatch.setattr(folder_watcher, "ProcessPoolExecutor", CrashingPool)
+    monkeypatch.setattr(CrashingPool, "crash_paths", {paths[1]})
+    monkeypatch.setattr(CrashingPool, "created", 0)
+    stop_event = threading.Event()
+    batches, errors = [], []
+
+    def on_batch(stats):
+        batches.append(stats)
+        if sum(s.get("added", 0) + s.get("failed", 0) for s in batches) == len(paths):
+            stop_event.set()
+
+    thread = threading.Thread(target=folder_watcher.run_watch_loop, args=(db_path, str(tmp_path / "in"), stop_event),
+                              kwargs=dict(on_batch=on_batch, on_error=errors.append, poll_interval=0.05, debounce=0.1))
+    thread.start()
+    thread.join(timeout=30)
+    stop_event.set()
+
+    assert not thread.is_alive()
+    assert sorted(row[1] for row in _pdf_rows(db_path)) == [paths[0], paths[2]] # 같은 배치의 다른 파일은 저장됨
+    assert len(errors) == 1 and paths[1] in errors[0]
+    assert sum(s.get("failed", 0) for s in batches) == 1
+    assert CrashingPool.created == 3 # 배치에서 한 번, 그 파일 혼자서 한 번 깨져 풀을 두 번 새로 만듦
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import library_rescan
+import pdf_ingest
+import similarity_analyzer
+
+
+def _paragraphs(doc):
+    return [f"{doc}번 문서의 {i}번째 문단은 표절 검사 대상 문장입니다" for i in range(5)]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    extracted = []
+
+    def extract_paragraphs(path):
+        extracted.append(os.path.basename(path))
+        return open(path, encoding="utf-8").read().split("\n")
+
+    monkeypatch.setattr(pdf_ingest, "extract_paragraphs", extract_paragraphs)
+    monkeypatch.setattr(library_rescan, "ProcessPoolExecutor", ThreadPoolExecutor)
+    db_path = str(tmp_path / "rescan.db")
+    paths = []
+    conn = sqlite3.connect(db_path)
+    try:
+        pdf_ingest.init_database(conn)
+        for doc in range(3):
+            path = tmp_path / f"{doc}.pdf"
+            path.write_text("\n".join(_paragraphs(doc)), encoding="utf-8")
+            paths.append(str(path))
+            pdf_ingest.insert_pdf(conn.cursor(), str(path), _paragraphs(doc))
+        conn.commit()
+    finally:
+        conn.close()
+    return db_path, paths, extracted
+
+
+def _paragraph_rows(db_path, pdf_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT id, paragraph_text, page_number FROM paragraphs WHERE pdf_id = ? ORDER BY page_number", (pdf_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+def _set_mtime(path, seconds):
+    os.utime(path, (seconds, seconds))
+
+
+def test_unchanged_files_are_not_extracted(library):
+    db_path, paths, extracted = library
+
+    stats = library_rescan.rescan_library(db_path)
+
+    assert stats["unchanged"] == len(paths) and stats[library_rescan.RESULT_MODIFIED] == 0
+    assert extracted == []
+
+
+def test_touched_file_with_same_hash_is_not_extracted(library):
+    db_path, paths, extracted = library
+    _set_mtime(paths[1], 1_000_000_000) # 내용은 그대로 두고 수정시각만 바꿈
+
+    stats = library_rescan.rescan_library(db_path)
+
+    assert stats[library_rescan.RESULT_TOUCHED] == 1 and stats["unchanged"] == len(paths) - 1
+    assert extracted == []
+    # 새 수정시각이 기록되어 다음 검사에서는 해시도 계산하지 않음
+    assert library_rescan.rescan_library(db_path)["unchanged"] == len(paths)
+
+
+def test_edited_file_replaces_only_changed_paragraphs(library, monkeypatch):
+    db_path, paths, extracted = library
+    analyzer = similarity_analyzer.SimilarityAnalyzer(db_path)
+    assert analyzer.refresh_index()
+    fit_generation = analyzer._fit_generation
+    before = _paragraph_rows(db_path, 2)
+    edited = _paragraphs(1)
+    edited[2] = "완전히 새로 쓴 문단으로 바뀐 내용입니다"
+    with open(paths[1], "w", encoding="utf-8") as f:
+        f.write("\n".join(edited))
+    _set_mtime(paths[1], 1_000_000_000)
+
+    stats = library_rescan.rescan_library(db_path)
+
+    assert extracted == ["1.pdf"]
+    assert stats[library_rescan.RESULT_MODIFIED] == 1
+    assert (stats["paragraphs_added"], stats["paragraphs_removed"]) == (1, 1)
+    after = _paragraph_rows(db_path, 2)
+    assert [row[0] for row in after[:2] + after[3:]] == [row[0] for row in before[:2] + before[3:]] # 그대로인 문단은 ID 유지
+    assert after[2][0] not in {row[0] for row in before} and after[2][1:] == (edited[2], 3)
+
+    vectorized = []
+    transform_ids = analyzer.vectorizer.transform_ids
+    monkeypatch.setattr(analyzer.vectorizer, "transform_ids", lambda token_ids, lengths: vectorized.append(list(lengths)) or transform_ids(token_ids, lengths))
+    assert analyzer.refresh_index()
+
+    assert analyzer._fit_generation == fit_generation # 전체 재학습하지 않음
+    assert analyzer._changed_rows == 2 # 바뀐 문단 하나의 삭제 + 추가
+    assert len(vectorized) == 1 and len(vectorized[0]) == 1 # 새 문단 하나만 벡터화
+    assert list(analyzer.store.rows_of([after[2][0], before[2][0]])) == [7, -1]
+
+
+def test_replace_keeps_ids_of_shifted_paragraphs():
+    conn = sqlite3.connect(":memory:")
+    try:
+        pdf_ingest.init_database(conn)
+        cursor = conn.cursor()
+        pdf_id = pdf_ingest.insert_pdf(cursor, "x.pdf", ["가", "나", "다"], file_info=(None, None, None))
+        old_ids = [row[0] for row in cursor.execute("SELECT id FROM paragraphs ORDER BY page_number").fetchall()]
+
+        assert pdf_ingest.replace_pdf_paragraphs(cursor, pdf_id, ["머리말", "가", "나", "다"]) == (1, 0)
+        rows = cursor.execute("SELECT id, paragraph_text, page_number FROM paragraphs ORDER BY page_number").fetchall()
+        assert [text for _, text, _ in rows] == ["머리말", "가", "나", "다"]
+        assert [para_id for para_id, _, _ in rows[1:]] == old_ids # 밀린 문단은 순서만 고침
+        assert [order for _, _, order in rows] == [1, 2, 3, 4]
+
+        assert pdf_ingest.replace_pdf_paragraphs(cursor, pdf_id, ["머리말", "가", "나", "다"]) == (0, 0)
+    finally:
+        conn.close()
@@ -0,0 +1,54 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import benchmarks
+import memory_budget
+import similarity_analyzer
+
+
+def test_rss_windows_are_measured_from_their_own_start(monkeypatch):
+    # 첫 구간에서 400만큼 늘어난 RSS는 해제 후에도 할당기가 쥐고 있어 줄어들지 않는 상황
+    samples = iter([100, 500, 500, 600])
+    monkeypatch.setattr(memory_budget, "current_rss", lambda: next(samples, 600))
+
+    with memory_budget.MemoryMonitor(sample_interval=3600) as monitor:
+        assert monitor.take_window_peak() == 400
+        assert monitor.take_window_peak() == 0
+        assert monitor.take_window_peak() == 100
+    assert monitor.as_metrics()["peak_rss_increase_bytes"] == 500
+
+
+def test_index_batch_shrinks_to_fit_the_budget():
+    # 토큰 100만 개, 문단 1만 개: 상주 8 MB + 0.48 MB, 배치 문단 하나 7,200 byte
+    resident = 1_000_000 * memory_budget.BYTES_PER_INDEX_TOKEN + 10_000 * memory_budget.BYTES_PER_PARAGRAPH
+    assert memory_budget.plan_index_batch(None, 1_000_000, 10_000, 2000) == 2000
+    assert memory_budget.plan_index_batch(resident + 100 * 7200, 1_000_000, 10_000, 2000) == 100
+    with pytest.raises(memory_budget.MemoryBudgetError):
+        memory_budget.plan_index_batch(resident + 10 * 7200, 1_000_000, 10_000, 2000)
+
+
+def test_cold_build_fits_in_the_smallest_streaming_budget(tmp_path):
+    db_path = str(tmp_path / "budget.db")
+    benchmarks.make_synthetic_db(db_path, 3000)
+    warm = similarity_analyzer.SimilarityAnalyzer(db_path)
+    warm.refresh_index()
+    num_targets = len(warm.store.rows_for_pdf(1))
+    estimates = warm._plan_chunks(num_targets, warm.top_k, warm.paragraph_vectors, None, warm.chunk_size)[2]
+    # 웜 인덱스로 분석할 수 있는 가장 작은 예산: 최소 블록 스트리밍에 타겟 문단 한 개
+    block_rows = min(memory_budget.MIN_STREAM_BLOCK_ROWS, len(warm.store))
+    budget = (estimates["resident_bytes"] + estimates["results_bytes"] + estimates["corpus_copy_bytes"] * block_rows // len(warm.store)
+              + block_rows * memory_budget.BYTES_PER_SIMILARITY)
+    assert memory_budget.plan_chunk_size(budget, estimates, warm.chunk_size) == (1, block_rows)
+
+    cold = similarity_analyzer.SimilarityAnalyzer(db_path, memory_budget_mb=budget / 2**20)
+    tracemalloc.start()
+    try:
+        assert cold.refresh_index()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak <= budget
+    np.testing.assert_array_equal(cold.paragraph_vectors.toarray(), warm.paragraph_vectors.toarray())
@@ -0,0 +1,73 @@
+import sqlite3
+
+import numpy as np
+
+import benchmarks
+import pdf_ingest
+import similarity_analyzer
+
+
+def _store():
+    # (pdf_id, 문단 순서)로 정렬된 행. 문단 ID는 행 순서와 무관하게 매겨져 있음 (다시 검사로 바뀐 문단은 새 ID)
+    return similarity_analyzer.ParagraphStore([11, 12, 30, 21, 22, 23, 5], [1, 1, 1, 2, 2, 2, 4], [1, 2, 3, 1, 2, 3, 1])
+
+
+def test_rows_for_pdf_returns_contiguous_row_ranges():
+    store = _store()
+
+    assert len(store) == 7
+    assert store.rows_for_pdf(1) == range(0, 3)
+    assert store.rows_for_pdf(2) == range(3, 6)
+    assert store.rows_for_pdf(4) == range(6, 7)
+    assert store.rows_for_pdf(3) == range(0) and not store.has_pdf(3)
+    assert store.rows_for_pdf(99) == range(0) and store.has_pdf(4)
+    assert store.nbytes == sum(a.nbytes for a in (store.para_ids, store.pdf_ids, store.orders, store.offset_pdf_ids, store.offset_starts, store.offset_ends))
+
+
+def test_rows_of_maps_paragraph_ids_to_rows():
+    store = _store()
+
+    np.testing.assert_array_equal(store.rows_of([30, 5, 11, 23]), [2, 6, 0, 5])
+    np.testing.assert_array_equal(store.rows_of([4, 13, 31, 100]), [-1, -1, -1, -1]) # 없는 ID
+    np.testing.assert_array_equal(similarity_analyzer.ParagraphStore([], [], []).rows_of([1, 2]), [-1, -1])
+
+
+def test_append_returns_a_new_store():
+    store = _store()
+
+    appended = store.append([40, 41], [7, 7], [1, 2])
+
+    assert len(store) == 7 and not store.has_pdf(7) # 기존 저장소는 그대로
+    assert appended.rows_for_pdf(7) == range(7, 9)
+    np.testing.assert_array_equal(appended.rows_of([41, 11]), [8, 0])
+
+
+def test_paragraph_changes_append_and_remove_rows_in_db_order(tmp_path):
+    db_path = str(tmp_path / "store.db")
+    benchmarks.make_synthetic_db(db_path, 400) # PDF 10개, 문단 40개씩
+    analyzer = similarity_analyzer.SimilarityAnalyzer(db_path)
+    assert analyzer.refresh_index()
+    fit_generation = analyzer._fit_generation
+
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        new_pdf_id = pdf_ingest.insert_pdf(cursor, "synthetic/new.pdf", ["새로 추가된 학생 보고서 문단.", "두 번째 연구 결과 문단."], file_info=(None, None, None))
+        pdf_ingest.delete_pdf(cursor, 3)
+        conn.commit()
+        rows = cursor.execute("SELECT id, pdf_id, page_number, paragraph_text FROM paragraphs ORDER BY pdf_id, page_number").fetchall()
+    finally:
+        conn.close()
+
+    assert analyzer.refresh_index()
+
+    store = analyzer.store
+    assert analyzer._fit_generation == fit_generation # 전체 재학습 없이 반영
+    assert analyzer._changed_rows == 42
+    np.testing.assert_array_equal(store.para_ids, [row[0] for row in rows])
+    np.testing.assert_array_equal(store.pdf_ids, [row[1] for row in rows])
+    np.testing.assert_array_equal(store.orders, [row[2] for row in rows])
+    assert not store.has_pdf(3)
+    assert store.rows_for_pdf(new_pdf_id) == range(len(rows) - 2, len(rows))
+    expected = analyzer.vectorizer.transform([row[3] for row in rows])
+    assert abs(analyzer.paragraph_vectors - expected).max() < 1e-6
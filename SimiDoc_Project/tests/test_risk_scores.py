@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+
+import pytest
+
+import benchmarks
+import risk_scores
+import similarity_analyzer
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    db_path = str(tmp_path / "risk.db")
+    benchmarks.make_synthetic_db(db_path, 400, paragraphs_per_pdf=20)
+    analyzer = similarity_analyzer.SimilarityAnalyzer(db_path, chunk_size=5)
+    analyzer.refresh_index()
+    return analyzer
+
+
+def _stop_after_first_chunk(analyzer, monkeypatch, stop_event):
+    real_score_rows = analyzer._score_rows
+    calls = []
+
+    def score_rows(*args, **kwargs):
+        calls.append(1)
+        stop_event.set() # 첫 청크를 계산하는 도중에 대화형 분석이 시작된 상황
+        return real_score_rows(*args, **kwargs)
+
+    monkeypatch.setattr(analyzer, "_score_rows", score_rows)
+    return calls
+
+
+def test_analyze_many_stops_between_chunks(analyzer, monkeypatch):
+    stop_event = threading.Event()
+    calls = _stop_after_first_chunk(analyzer, monkeypatch, stop_event)
+
+    with pytest.raises(similarity_analyzer.AnalysisCancelled):
+        analyzer.analyze_many([1, 2], stop_event=stop_event)
+    assert len(calls) == 1
+
+
+def test_cancelled_precompute_batch_is_not_saved(analyzer, monkeypatch):
+    stop_event = threading.Event()
+    _stop_after_first_chunk(analyzer, monkeypatch, stop_event)
+
+    assert risk_scores.score_pending(analyzer, stop_event=stop_event) == 0
+    conn = sqlite3.connect(analyzer.db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM pdf_risk").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_score_pending_scores_every_pdf(analyzer):
+    assert risk_scores.score_pending(analyzer, batch_size=8) == 20
+    conn = sqlite3.connect(analyzer.db_path)
+    try:
+        risks = risk_scores.load_pdf_risks(conn.cursor(), risk_scores.scoring_mode(analyzer))
+    finally:
+        conn.close()
+    assert len(risks) == 20 and not any(stale for _, stale in risks.values())
@@ -0,0 +1,100 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+import benchmarks
+import pdf_ingest
+import semantic_index
+import similarity_analyzer
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    vectors = benchmarks.make_synthetic_tfidf(4000, vocabulary_size=5000, num_topics=40, words_per_topic=100)
+    index = semantic_index.LsaIndex(n_components=32, random_state=0).fit(vectors, np.arange(4000) + 100, signature=(4000, 4099))
+    queries = np.random.default_rng(1).choice(4000, size=100, replace=False).astype(np.int64)
+    return vectors, index, queries
+
+
+def _neighbors(result, n_queries):
+    neighbors = [set() for _ in range(n_queries)]
+    for query_row, source_row in zip(result[0].tolist(), result[1].tolist()):
+        neighbors[query_row].add(source_row)
+    return neighbors
+
+
+def test_ivf_search_recalls_exact_neighbors(corpus):
+    _, index, queries = corpus
+    embeddings = np.asarray(index.embeddings[queries])
+    exact = _neighbors(index.search_exact(embeddings, 10, exclude_rows=queries), len(queries))
+    approximate = _neighbors(index.search(embeddings, 10, exclude_rows=queries), len(queries))
+
+    recall = np.mean([len(found & expected) / len(expected) for found, expected in zip(approximate, exact)])
+    assert recall >= 0.9
+    assert all(query not in found for query, found in zip(queries.tolist(), approximate)) # 자기 자신은 제외
+
+    # 모든 리스트를 확인하면 정확 검색과 같은 결과
+    everything = index.search(embeddings, 10, exclude_rows=queries, n_probe=len(index.centroids))
+    np.testing.assert_array_equal(everything[1], index.search_exact(embeddings, 10, exclude_rows=queries)[1])
+
+
+def test_save_and_load_round_trip(corpus, tmp_path):
+    _, index, queries = corpus
+    path_prefix = str(tmp_path / "simidoc.lsa_word")
+    index.save(path_prefix)
+
+    loaded = semantic_index.LsaIndex.load(path_prefix)
+
+    assert isinstance(loaded.embeddings, np.memmap) # 필요한 부분만 읽음
+    assert loaded.signature == (4000, 4099) and loaded.n_probe == index.n_probe
+    np.testing.assert_array_equal(loaded.para_ids, index.para_ids)
+    np.testing.assert_array_equal(loaded.components, index.components)
+    embeddings = np.asarray(index.embeddings[queries])
+    for expected, actual in zip(index.search(embeddings, 5, exclude_rows=queries), loaded.search(embeddings, 5, exclude_rows=queries)):
+        np.testing.assert_array_equal(actual, expected)
+    assert semantic_index.LsaIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_refresh_projects_added_paragraphs_without_refitting(corpus):
+    vectors, _, _ = corpus
+    index = semantic_index.LsaIndex(n_components=32, random_state=0).fit(vectors[:3000], np.arange(3000))
+    components, centroids = index.components.copy(), index.centroids.copy()
+
+    index.refresh(vectors, np.arange(4000), signature=(4000, 3999))
+
+    assert len(index) == 4000 and index.list_offsets[-1] == 4000
+    np.testing.assert_array_equal(index.components, components)
+    np.testing.assert_array_equal(index.centroids, centroids)
+    new_rows = np.arange(3000, 3020)
+    _, sources, similarities = index.search(index.project(vectors[new_rows]), 1)
+    np.testing.assert_array_equal(sources, new_rows) # 추가된 문단이 검색됨
+    np.testing.assert_allclose(similarities, 1.0, rtol=1e-5)
+
+
+def test_analyzer_reprojects_lsa_index_after_paragraphs_are_added(tmp_path):
+    db_path = str(tmp_path / "simidoc.db")
+    benchmarks.make_synthetic_db(db_path, 600)
+    analyzer = similarity_analyzer.SimilarityAnalyzer(db_path, semantic=True)
+    assert analyzer.refresh_index()
+    lsa_index = analyzer.get_semantic_index()
+    components = lsa_index.components.copy()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        text = conn.execute("SELECT paragraph_text FROM paragraphs ORDER BY id LIMIT 1").fetchone()[0]
+        pdf_ingest.insert_pdf(conn.cursor(), "synthetic/new.pdf", [text])
+        new_para_id = conn.execute("SELECT MAX(id) FROM paragraphs").fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    matches = analyzer.query_texts([text], top_k=10)[0]
+
+    refreshed = analyzer.get_semantic_index()
+    assert refreshed is lsa_index and len(refreshed) == 601
+    np.testing.assert_array_equal(refreshed.components, components) # SVD를 다시 학습하지 않음
+    assert new_para_id in [para_id for para_id, _, _, _ in matches]
+    assert len(semantic_index.LsaIndex.load(analyzer.lsa_index_path())) == 601 # 디스크의 인덱스도 갱신됨
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import pdf_ingest
+import shard_manager
+import similarity_analyzer
+
+SOURCE_TEXT = [
+    "표절 검사 시스템은 제출된 보고서의 문단을 기존 문서와 비교한다",
+    "유사도가 높은 문단은 원본 문서와 함께 보고서에 표시된다",
+]
+OTHER_TEXT = [
+    "오늘 점심은 학교 식당에서 김치찌개를 먹었다",
+    "도서관은 주말에도 저녁 아홉 시까지 문을 연다",
+]
+
+
+@pytest.fixture(autouse=True)
+def in_process(monkeypatch):
+    # 추출과 샤드 워커를 같은 프로세스의 쓰레드에서 실행합니다.
+    monkeypatch.setattr(pdf_ingest, "extract_paragraphs", lambda path: open(path, encoding="utf-8").read().split("\n"))
+    monkeypatch.setattr(shard_manager, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(shard_manager, "_SHARD_ANALYZERS", {})
+
+
+def _write(path, paragraphs, year=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(paragraphs), encoding="utf-8")
+    if year is not None:
+        mtime = datetime(year, 6, 1).timestamp()
+        os.utime(path, (mtime, mtime))
+    return os.path.abspath(str(path))
+
+
+def test_hash_route_only_uses_accepting_shards(tmp_path):
+    corpus = shard_manager.ShardedCorpus(str(tmp_path / "shards"), shard_manager.STRATEGY_HASH)
+    assert [corpus.add_shard(), corpus.add_shard()] == ["shard_000", "shard_001"]
+    paths = [os.path.abspath(str(tmp_path / f"{i}.pdf")) for i in range(8)]
+
+    for path in paths:
+        assert corpus.route(path) == ["shard_000", "shard_001"][zlib.crc32(path.encode("utf-8")) % 2]
+
+    corpus.set_accepting("shard_000", False)
+    assert {corpus.route(path) for path in paths} == {"shard_001"}
+
+
+def test_year_route_opens_a_new_shard_when_the_year_shard_is_closed(tmp_path):
+    corpus = shard_manager.ShardedCorpus(str(tmp_path / "shards"), shard_manager.STRATEGY_YEAR)
+    a = _write(tmp_path / "a.pdf", SOURCE_TEXT, year=2023)
+
+    assert corpus.route(a) == "year_2023" # 수정 연도로 배정
+    corpus.set_accepting("year_2023", False)
+    assert corpus.route(str(tmp_path / "b.pdf"), year=2023) == "year_2023_01"
+    assert corpus.route(str(tmp_path / "c.pdf"), year=2023) == "year_2023_01"
+    corpus.set_accepting("year_2023_01", False)
+    assert corpus.route(str(tmp_path / "d.pdf"), year=2023) == "year_2023_02"
+
+    corpus.ingest_files([a])
+    assert corpus.find_pdf(a)[0] == "year_2023_02"
+    assert corpus.route(a) == "year_2023_02" # 한 번 배정된 파일은 기록된 샤드에 남음
+
+
+def test_source_db_is_registered_in_place_as_archive_shard(tmp_path):
+    archive_path = str(tmp_path / "simidoc.db")
+    archived_file = os.path.abspath(str(tmp_path / "old" / "report.pdf"))
+    conn = sqlite3.connect(archive_path)
+    try:
+        pdf_ingest.init_database(conn)
+        pdf_id = pdf_ingest.insert_pdf(conn.cursor(), archived_file, SOURCE_TEXT)
+        conn.commit()
+    finally:
+        conn.close()
+    corpus = shard_manager.ShardedCorpus(str(tmp_path / "shards"))
+
+    assert corpus.add_shard(name="archive", source_db=archive_path) == "archive"
+
+    shard = corpus.get_shard("archive")
+    assert shard["db_path"] == os.path.abspath(archive_path) and not shard["accepting"]
+    assert not os.path.exists(os.path.join(corpus.root_dir, "archive.db")) # 복사하지 않음
+    assert corpus.find_pdf(archived_file) == ("archive", pdf_id, "report.pdf")
+    assert corpus.route(archived_file) == "archive"
+    assert corpus.route(str(tmp_path / "new.pdf")) == "shard_001" # 보관 샤드는 새 파일을 받지 않음
+
+
+def _source_files(result, file_path_of):
+    return [[(file_path_of(match), match["source_paragraph"][1]) for match in row["similar_paragraphs"]] for row in result]
+
+
+def test_merged_top_k_across_shards_matches_single_db(tmp_path):
+    files = [
+        _write(tmp_path / "docs" / "target.pdf", SOURCE_TEXT, year=2024),
+        _write(tmp_path / "docs" / "copy.pdf", SOURCE_TEXT, year=2022),
+        # 샤드 어휘에 없는 단어는 질의에서 빠지므로, 부분 복사본에는 원문에 없는 단어를 넣어 1.0과 동점이 되지 않게 합니다.
+        _write(tmp_path / "docs" / "partial.pdf", ["표절 검사 시스템은 학생 보고서의 문단을 비교한다", "유사도가 높은 문단은 빨간색으로 보고서에 표시된다"], year=2023),
+        _write(tmp_path / "docs" / "other.pdf", OTHER_TEXT, year=2023),
+        _write(tmp_path / "docs" / "other2.pdf", OTHER_TEXT[::-1], year=2022),
+    ]
+    corpus = shard_manager.ShardedCorpus(str(tmp_path / "shards"), shard_manager.STRATEGY_YEAR)
+    assert corpus.ingest_files(files, batch_size=2)["added"] == len(files)
+    assert len(corpus.list_shards()) == 3
+    single_db = str(tmp_path / "single.db")
+    conn = sqlite3.connect(single_db)
+    try:
+        pdf_ingest.init_database(conn)
+        pdf_ids = [pdf_ingest.insert_pdf(conn.cursor(), path, pdf_ingest.extract_paragraphs(path)) for path in files]
+        conn.commit()
+    finally:
+        conn.close()
+
+    shard_name, target_pdf_id, _ = corpus.find_pdf(files[0])
+    with shard_manager.ShardCoordinator(corpus, top_k=2) as coordinator:
+        sharded = coordinator.analyze_similarity(shard_name, target_pdf_id)
+    single = similarity_analyzer.SimilarityAnalyzer(single_db, top_k=2).analyze_similarity(pdf_ids[0], [])
+
+    shard_ids = {shard["name"]: shard["id"] for shard in corpus.list_shards()}
+    conn = sqlite3.connect(corpus.coordinator_db_path)
+    try:
+        routes = {(shard_id, pdf_id): file_path for file_path, shard_id, pdf_id in conn.execute("SELECT file_path, shard_id, pdf_id FROM pdf_routes")}
+    finally:
+        conn.close()
+    expected = [[(files[1], text), (files[2], partial)] for text, partial in zip(SOURCE_TEXT, pdf_ingest.extract_paragraphs(files[2]))]
+    # 샤드마다 IDF가 달라 유사도 값은 조금 다르지만, 병합한 상위 top_k 문단과 순서는 단일 DB와 같아야 합니다.
+    assert _source_files(sharded, lambda m: routes[(shard_ids[m["source_shard"]], m["source_pdf_id"])]) == expected
+    assert _source_files(single, lambda m: files[pdf_ids.index(m["source_pdf_id"])]) == expected
+    assert [row["target_paragraph"] for row in sharded] == [row["target_paragraph"] for row in single]
+    for row in sharded:
+        assert row["similar_paragraphs"][0]["similarity"] == pytest.approx(1.0)
@@ -0,0 +1,21 @@
+import pytest
+
+import simidoc_cli
+
+
+@pytest.mark.parametrize("argv", [
+    ["analyze", "1", "--top-k", "0"],
+    ["analyze", "1", "--top-k", "-3"],
+    ["analyze", "1", "--min-similarity", "1.5"],
+    ["analyze", "1", "--min-similarity", "-0.1"],
+    ["export", "out", "--top-k", "two"],
+])
+def test_invalid_scoring_arguments_are_rejected(argv, capsys):
+    with pytest.raises(SystemExit):
+        simidoc_cli.build_parser().parse_args(argv)
+    assert "error" in capsys.readouterr().err
+
+
+def test_valid_scoring_arguments_are_accepted():
+    args = simidoc_cli.build_parser().parse_args(["analyze", "1", "--top-k", "1", "--min-similarity", "1.0"])
+    assert (args.top_k, args.min_similarity) == (1, 1.0)
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("PyQt6")
+
+import memory_budget
+import simidoc_gui
+
+
+class FailingAnalyzer:
+    def __init__(self, error):
+        self.error = error
+
+    def analyze_similarity(self, target_pdf_id, files_data, top_k=None, min_similarity=None):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, out_of_memory", [
+    (memory_budget.MemoryBudgetError("예산 초과"), True),
+    (ValueError("잘못된 벡터"), False),
+])
+def test_analysis_worker_reports_every_error(error, out_of_memory):
+    worker = simidoc_gui.AnalysisWorker(FailingAnalyzer(error), 7, "a.pdf", {})
+    emitted = []
+    worker.finished.connect(lambda *args: emitted.append(args))
+
+    worker.run() # 쓰레드를 띄우지 않고 같은 쓰레드에서 실행
+
+    assert emitted == [([], 7, "a.pdf", str(error), out_of_memory)]
+
+
+def test_watch_worker_reports_errors(monkeypatch):
+    import folder_watcher
+
+    def run_watch_loop(db_path, folder, stop_event, on_batch=None, on_error=None):
+        on_error("추출 프로세스가 비정상 종료되었습니다")
+        raise OSError("폴더에 접근할 수 없습니다")
+
+    monkeypatch.setattr(folder_watcher, "run_watch_loop", run_watch_loop)
+    worker = simidoc_gui.WatchFolderWorker("unused.db", "unused")
+    emitted = []
+    worker.error.connect(lambda *args: emitted.append(args))
+
+    worker.run()
+
+    assert emitted == [("추출 프로세스가 비정상 종료되었습니다", False), ("폴더에 접근할 수 없습니다", True)]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import scipy.sparse
+from sklearn.preprocessing import normalize
+
+import similarity_analyzer
+
+
+def _reference_top_k(queries, corpus, top_k, min_similarity, exclude_columns):
+    """밀집 행렬로 계산한 기준 결과 (질의 행, 코퍼스 행, 유사도)"""
+    dense = (queries @ corpus.T).toarray()
+    expected = []
+    for q, row in enumerate(dense):
+        candidates = [(c, s) for c, s in enumerate(row) if (s >= min_similarity if min_similarity > 0.0 else s > 0.0) and c != exclude_columns[q]]
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        expected.extend((q, c, s) for c, s in candidates[:top_k])
+    return expected
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(7)
+    matrix = scipy.sparse.random(500, 60, density=0.08, format="csr", random_state=rng, dtype=np.float32)
+    return normalize(matrix).astype(np.float32)
+
+
+@pytest.mark.parametrize("block_rows", [37, 128, 10000])
+@pytest.mark.parametrize("min_similarity", [0.0, 0.3])
+def test_blockwise_kernel_matches_full_product(corpus, block_rows, min_similarity):
+    rows = np.arange(0, 500, 9)
+    expected = _reference_top_k(corpus[rows], corpus, 5, min_similarity, rows)
+
+    for result in (
+        similarity_analyzer.top_k_similarities(corpus[rows], similarity_analyzer.split_corpus(corpus, block_rows), 5, min_similarity, rows),
+        similarity_analyzer.top_k_similarities_streaming(corpus[rows], corpus, 5, min_similarity, rows, block_rows),
+    ):
+        query_rows, source_rows, similarities = result
+        assert list(zip(query_rows.tolist(), source_rows.tolist())) == [(q, c) for q, c, _ in expected]
+        np.testing.assert_allclose(similarities, [s for _, _, s in expected], rtol=1e-5)
+
+
+def test_product_never_exceeds_one_corpus_block(corpus, monkeypatch):
+    seen_shapes = []
+    real_keep_top_k = similarity_analyzer._keep_top_k
+
+    def recording_keep_top_k(query_rows, source_rows, similarities, top_k):
+        seen_shapes.append(len(similarities))
+        return real_keep_top_k(query_rows, source_rows, similarities, top_k)
+
+    monkeypatch.setattr(similarity_analyzer, "_keep_top_k", recording_keep_top_k)
+    rows = np.arange(20)
+    similarity_analyzer.top_k_similarities(corpus[rows], similarity_analyzer.split_corpus(corpus, 50), 3, 0.0, rows)
+    # 블록마다 (지금까지의 상위 top_k + 블록 하나의 매치)만 정렬합니다.
+    assert len(seen_shapes) == 10
+    assert max(seen_shapes) <= len(rows) * 3 + len(rows) * 50
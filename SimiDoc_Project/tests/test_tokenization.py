@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import tokenization
+
+CORPUS = [
+    "학생들이 보고서를 제출했다. 보고서에서 표절 문단을 찾았다.",
+    "교수는 학생의 보고서와 과제를 평가했다.",
+    "표절 검사 시스템은 문서 유사도를 분석한다. AI 모델로 분석한다.",
+    "나이와 거의 같은 단어는 조사를 떼지 않는다.",
+]
+
+
+@pytest.mark.parametrize("mode, text, expected", [
+    (tokenization.TOKENIZER_WORD, "학생들이 보고서를 제출했다. AI a", ["학생들이", "보고서를", "제출했다", "ai"]),
+    (tokenization.TOKENIZER_PARTICLE, "학생들이 보고서에서 나이 거의 AI a", ["학생들", "보고서", "나이", "거의", "ai"]),
+    (tokenization.TOKENIZER_CHAR_NGRAM, "가나다", [" 가", "가나", "나다", "다 ", " 가나", "가나다", "나다 "]),
+])
+def test_tokenize_modes(mode, text, expected):
+    assert tokenization.tokenize(text, mode) == expected
+
+
+@pytest.mark.parametrize("mode", tokenization.TOKENIZERS)
+def test_cached_vectorizer_matches_tfidf_vectorizer(mode):
+    vocabulary = {}
+    token_ids, lengths = [], []
+    for text in CORPUS:
+        ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokenization.tokenize(text, mode)]
+        token_ids.extend(ids)
+        lengths.append(len(ids))
+
+    cached = tokenization.CachedTfidfVectorizer(mode).fit_transform_ids(token_ids, lengths, len(vocabulary))
+    reference = TfidfVectorizer(analyzer=lambda text: tokenization.tokenize(text, mode), vocabulary=vocabulary).fit_transform(CORPUS)
+
+    assert cached.dtype == np.float32
+    np.testing.assert_allclose(cached.toarray(), reference.toarray(), rtol=1e-5, atol=1e-6)
+
+
+def test_word_mode_matches_default_tfidf_vectorizer():
+    vectorizer = TfidfVectorizer()
+    reference = vectorizer.fit_transform(CORPUS)
+    vocabulary = vectorizer.vocabulary_
+    token_ids, lengths = [], []
+    for text in CORPUS:
+        ids = [vocabulary[token] for token in tokenization.tokenize(text)]
+        token_ids.extend(ids)
+        lengths.append(len(ids))
+
+    cached = tokenization.CachedTfidfVectorizer().fit_transform_ids(token_ids, lengths, len(vocabulary))
+
+    np.testing.assert_allclose(cached.toarray(), reference.toarray(), rtol=1e-5, atol=1e-6)
+
+
+def test_concurrent_writers_get_distinct_token_ids(tmp_path):
+    db_path = str(tmp_path / "tokens.db")
+    conn = sqlite3.connect(db_path)
+    tokenization.init_token_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+    errors = []
+    barrier = threading.Barrier(4)
+
+    def writer(worker):
+        # 감시 폴더, 대량 가져오기 등이 각자의 연결로 새 토큰을 추가하는 상황
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            barrier.wait()
+            for i in range(50):
+                para_id = worker * 1000 + i
+                tokenization.cache_paragraph_tokens(conn.cursor(), "word", [(para_id, f"공통단어 작업{worker}단어{i} 문단{para_id}")])
+                conn.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert errors == []
+    conn = sqlite3.connect(db_path)
+    try:
+        vocab = dict(conn.execute("SELECT id, token FROM token_vocab WHERE mode = 'word'"))
+        assert sorted(vocab) == list(range(len(vocab))) # 열 번호로 쓰이므로 빈틈없이 0부터
+        for para_id, blob in conn.execute("SELECT paragraph_id, token_ids FROM paragraph_tokens"):
+            worker, i = divmod(para_id, 1000)
+            tokens = [vocab[token_id] for token_id in np.frombuffer(blob, dtype=np.int32).tolist()]
+            assert tokens == ["공통단어", f"작업{worker}단어{i}", f"문단{para_id}"]
+    finally:
+        conn.close()
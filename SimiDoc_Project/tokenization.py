@@ -0,0 +1,282 @@
+"""
+SimiDoc 토큰화 모듈.
+
+한국어 문단을 TF-IDF에 넣기 전에 토큰으로 나누는 방식(모드)을 고를 수 있게 하고,
+문단별 토큰 ID를 SQLite에 캐시하여 분석할 때마다 수백만 개의 문자열을 다시 토큰화하지 않도록 합니다.
+- word       : scikit-learn TfidfVectorizer의 기본 토큰화와 같음 (두 글자 이상의 단어, 소문자)
+- particle   : 공백/문장부호로 나눈 뒤 명사 뒤에 붙은 조사를 떼어냄 ("학생들이" -> "학생들", "보고서에서" -> "보고서")
+- char_ngram : 어절 안에서 2~3글자 n-gram (조사나 어미가 달라도 어간이 겹치면 유사하게 잡힘)
+토큰 ID는 모드별 token_vocab 테이블에서 한 번 매겨지면 바뀌지 않으며, 그대로 TF-IDF 행렬의 열 번호로 쓰입니다.
+"""
+import re
+import sqlite3
+
+import numpy as np
+import scipy.sparse
+
+TOKENIZER_WORD = "word"
+TOKENIZER_PARTICLE = "particle"
+TOKENIZER_CHAR_NGRAM = "char_ngram"
+TOKENIZERS = (TOKENIZER_WORD, TOKENIZER_PARTICLE, TOKENIZER_CHAR_NGRAM)
+
+CHAR_NGRAM_RANGE = (2, 3)
+SQL_IN_CHUNK = 900 # SQLite의 바인딩 변수 개수 제한(기본 999)보다 작게 IN (...) 조회를 나눕니다.
+TOKENIZE_BATCH_SIZE = 5000 # 캐시를 채울 때 한 번에 토큰화하여 저장할 문단 수
+NORMALIZE_BLOCK_ROWS = 2000 # TF-IDF 가중치/정규화를 한 번에 적용할 행 수 (임시 배열 크기를 제한)
+
+_WORD_PATTERN = re.compile(r"(?u)\b\w\w+\b") # TfidfVectorizer의 기본 token_pattern
+_TERM_PATTERN = re.compile(r"(?u)\w+")
+_HANGUL_PATTERN = re.compile(r"[가-힣]")
+# 길이가 긴 조사부터 비교합니다. 한 글자 조사는 남는 어간이 두 글자 이상일 때만 떼어냅니다. ("나이", "거의" 보호)
+_PARTICLES = frozenset((
+    "에서부터", "으로부터", "에게서", "으로써", "으로서", "에서는", "에서도", "으로는", "에게는", "이라는", "이라고",
+    "까지", "부터", "에서", "에게", "한테", "으로", "처럼", "보다", "마다", "조차", "라는", "라고", "와의", "과의",
+    "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "로", "만", "께",
+))
+_PARTICLE_LENGTHS = sorted({len(p) for p in _PARTICLES}, reverse=True)
+
+
+def _strip_particle(term):
+    for length in _PARTICLE_LENGTHS:
+        if len(term) - length >= (2 if length == 1 else 1) and term[-length:] in _PARTICLES:
+            return term[:-length]
+    return term
+
+
+def tokenize(text, mode=TOKENIZER_WORD):
+    """문단 하나를 mode 방식으로 토큰 리스트로 바꿉니다."""
+    text = text.lower()
+    if mode == TOKENIZER_WORD:
+        return _WORD_PATTERN.findall(text)
+    if mode == TOKENIZER_PARTICLE:
+        tokens = []
+        for term in _TERM_PATTERN.findall(text):
+            if _HANGUL_PATTERN.search(term):
+                tokens.append(_strip_particle(term))
+            elif len(term) >= 2:
+                tokens.append(term)
+        return tokens
+    if mode == TOKENIZER_CHAR_NGRAM:
+        # TfidfVectorizer(analyzer='char_wb')와 같은 방식: 어절 앞뒤에 공백을 붙이고 어절 안에서만 n-gram을 만듭니다.
+        tokens = []
+        low, high = CHAR_NGRAM_RANGE
+        for term in _TERM_PATTERN.findall(text):
+            padded = f" {term} "
+            for n in range(low, high + 1):
+                tokens.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return tokens
+    raise ValueError(f"지원하지 않는 토큰화 방식입니다: {mode} (가능: {', '.join(TOKENIZERS)})")
+
+
+def init_token_tables(cursor):
+    """토큰 캐시 테이블이 없으면 생성합니다. (pdf_ingest.init_database에서도 호출)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS token_vocab (
+            id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            token TEXT NOT NULL,
+            PRIMARY KEY (mode, id),
+            UNIQUE (mode, token)
+        )
+    ''')
+    # token_ids: 문단의 토큰 ID를 등장 순서대로 int32 배열로 저장한 BLOB (같은 토큰이 여러 번 나오면 여러 번 들어감)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paragraph_tokens (
+            paragraph_id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            token_ids BLOB NOT NULL,
+            PRIMARY KEY (paragraph_id, mode)
+        )
+    ''')
+    # 한 번이라도 분석에 쓰인 모드. 이 모드들은 PDF를 추가할 때 바로 캐시를 채웁니다.
+    cursor.execute("CREATE TABLE IF NOT EXISTS token_modes (mode TEXT PRIMARY KEY)")
+
+
+def _select_token_ids(cursor, mode, tokens, ids):
+    for start in range(0, len(tokens), SQL_IN_CHUNK):
+        chunk = tokens[start:start + SQL_IN_CHUNK]
+        cursor.execute(f"SELECT token, id FROM token_vocab WHERE mode = ? AND token IN ({','.join('?' * len(chunk))})", [mode, *chunk])
+        ids.update(cursor.fetchall())
+
+
+def _lookup_token_ids(cursor, mode, tokens):
+    """
+    토큰 문자열들의 ID를 {token: id}로 반환합니다. 처음 보는 토큰은 새 ID를 매겨 token_vocab에 추가합니다.
+    감시 폴더/대량 가져오기/분석이 각자의 연결로 동시에 토큰을 추가할 수 있으므로, 새 ID(모드별 MAX(id) + 1)는
+    INSERT 문 안에서 계산합니다. (문 하나는 쓰기 잠금 아래에서 원자적으로 실행되어 두 연결이 같은 ID를 고를 수 없음)
+    다른 연결이 같은 토큰을 먼저 추가했으면 OR IGNORE로 넘어가고, 마지막에 실제 저장된 ID를 다시 읽습니다.
+    """
+    ids = {}
+    tokens = list(tokens)
+    _select_token_ids(cursor, mode, tokens, ids)
+    missing = [token for token in tokens if token not in ids]
+    if missing:
+        cursor.executemany("INSERT OR IGNORE INTO token_vocab (id, mode, token) "
+                           "SELECT COALESCE(MAX(id), -1) + 1, ?, ? FROM token_vocab WHERE mode = ?",
+                           ((mode, token, mode) for token in missing))
+        _select_token_ids(cursor, mode, missing, ids)
+    return ids
+
+
+def cache_paragraph_tokens(cursor, mode, rows):
+    """(문단 ID, 텍스트) 리스트를 토큰화하여 paragraph_tokens에 저장합니다. commit은 호출하는 쪽에서 합니다."""
+    tokenized = [(para_id, tokenize(text, mode)) for para_id, text in rows]
+    ids = _lookup_token_ids(cursor, mode, {token for _, tokens in tokenized for token in tokens})
+    cursor.executemany(
+        "INSERT OR REPLACE INTO paragraph_tokens (paragraph_id, mode, token_ids) VALUES (?, ?, ?)",
+        ((para_id, mode, np.fromiter((ids[t] for t in tokens), dtype=np.int32, count=len(tokens)).tobytes()) for para_id, tokens in tokenized),
+    )
+
+
+def fill_missing_tokens(conn, mode, pdf_id=None):
+    """
+    mode를 캐시 대상으로 등록하고, 아직 토큰이 캐시되지 않은 문단들을 TOKENIZE_BATCH_SIZE개씩 토큰화하여 저장합니다.
+    pdf_id를 주면 그 PDF의 문단만 확인합니다. 반환값: 새로 토큰화한 문단 수
+    """
+    cursor = conn.cursor()
+    init_token_tables(cursor)
+    cursor.execute("INSERT OR IGNORE INTO token_modes (mode) VALUES (?)", (mode,))
+    query = ("SELECT p.id, p.paragraph_text FROM paragraphs p "
+             "LEFT JOIN paragraph_tokens t ON t.mode = ? AND t.paragraph_id = p.id WHERE t.paragraph_id IS NULL")
+    params = [mode]
+    if pdf_id is not None:
+        query += " AND p.pdf_id = ?"
+        params.append(pdf_id)
+    # ID만 먼저 모은 뒤 배치마다 텍스트를 읽습니다. (처음 채울 때 전체 텍스트가 한꺼번에 메모리에 올라가지 않도록)
+    missing_ids = [row[0] for row in cursor.execute(query.replace("p.id, p.paragraph_text", "p.id"), params)]
+    for start in range(0, len(missing_ids), TOKENIZE_BATCH_SIZE):
+        batch_ids = missing_ids[start:start + TOKENIZE_BATCH_SIZE]
+        rows = []
+        for chunk_start in range(0, len(batch_ids), SQL_IN_CHUNK):
+            chunk = batch_ids[chunk_start:chunk_start + SQL_IN_CHUNK]
+            rows.extend(cursor.execute(f"SELECT id, paragraph_text FROM paragraphs WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        cache_paragraph_tokens(cursor, mode, rows)
+        conn.commit()
+    conn.commit()
+    if len(missing_ids) > TOKENIZE_BATCH_SIZE:
+        print(f"DEBUG(Token): Cached '{mode}' tokens for {len(missing_ids)} paragraphs.")
+    return len(missing_ids)
+
+
+def cache_pdf_tokens(cursor, pdf_id):
+    """PDF 하나의 문단들 중 아직 캐시되지 않은 문단을 등록된 모든 모드로 토큰화합니다. (commit은 호출하는 쪽에서)"""
+    init_token_tables(cursor)
+    for mode in [row[0] for row in cursor.execute("SELECT mode FROM token_modes")]:
+        rows = cursor.execute("SELECT p.id, p.paragraph_text FROM paragraphs p "
+                              "LEFT JOIN paragraph_tokens t ON t.paragraph_id = p.id AND t.mode = ? "
+                              "WHERE p.pdf_id = ? AND t.paragraph_id IS NULL", (mode, pdf_id)).fetchall()
+        cache_paragraph_tokens(cursor, mode, rows)
+
+
+def delete_paragraph_tokens(cursor, para_ids):
+    cursor.executemany("DELETE FROM paragraph_tokens WHERE paragraph_id = ?", ((para_id,) for para_id in para_ids))
+
+
+def count_matrix(token_ids, lengths, num_columns):
+    """
+    모든 문단의 토큰 ID를 이어 붙인 배열(token_ids)과 문단별 토큰 수(lengths)로
+    (문단 수 x num_columns) 단어 빈도 CSR 행렬을 만듭니다. num_columns 이상의 ID는 버립니다.
+    """
+    token_ids = np.asarray(token_ids, dtype=np.int32)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    row_of_entry = np.repeat(np.arange(len(lengths)), lengths)
+    known = token_ids < num_columns
+    counts = scipy.sparse.csr_matrix(
+        (np.ones(int(known.sum()), dtype=np.float32), (row_of_entry[known], token_ids[known])),
+        shape=(len(lengths), num_columns),
+    )
+    counts.sum_duplicates()
+    return counts
+
+
+def _row_blocks(indptr, block_rows):
+    """CSR 행렬의 행을 block_rows행씩 나누어 (시작 행, 끝 행, data/indices 시작 위치, 끝 위치)를 돌려줍니다."""
+    num_rows = len(indptr) - 1
+    for start in range(0, num_rows, block_rows):
+        stop = min(start + block_rows, num_rows)
+        yield start, stop, indptr[start], indptr[stop]
+
+
+class CachedTfidfVectorizer:
+    """
+    토큰 캐시를 사용하는 TF-IDF 벡터라이저.
+    fit은 캐시된 토큰 ID로 희소 행렬을 조립하기만 하며, 가중치 계산은 TfidfVectorizer의 기본 설정과 같습니다.
+    (smooth_idf=True, sublinear_tf=False, L2 정규화) 학습 때 코퍼스에 없던 토큰은 transform에서 무시합니다.
+    """
+    def __init__(self, mode=TOKENIZER_WORD):
+        if mode not in TOKENIZERS:
+            raise ValueError(f"지원하지 않는 토큰화 방식입니다: {mode} (가능: {', '.join(TOKENIZERS)})")
+        self.mode = mode
+        self.idf_ = None
+        self.db_path = None
+        self._vocabulary = None # transform(texts)에서 처음 필요할 때 DB에서 읽는 {token: id}
+
+    def _normalize(self, counts, block_rows=NORMALIZE_BLOCK_ROWS):
+        """
+        단어 빈도 행렬에 IDF를 곱하고 행마다 L2 정규화합니다. (counts를 그 자리에서 바꿈)
+        block_rows행씩 처리하여, 전체 행렬 크기의 임시 배열 없이 행렬 하나만큼의 메모리로 끝냅니다.
+        """
+        for start, stop, begin, end in _row_blocks(counts.indptr, block_rows):
+            data = counts.data[begin:end] # counts.data의 뷰
+            data *= self.idf_[counts.indices[begin:end]]
+            lengths = np.diff(counts.indptr[start:stop + 1])
+            norms = np.sqrt(np.bincount(np.repeat(np.arange(stop - start), lengths), weights=data * data, minlength=stop - start))
+            norms = norms.astype(np.float32)
+            norms[norms == 0] = 1.0
+            data /= np.repeat(norms, lengths)
+        counts.eliminate_zeros()
+        return counts
+
+    def fit_transform_ids(self, token_ids, lengths, num_columns, db_path=None):
+        """캐시된 토큰 ID들로 IDF를 학습하고 TF-IDF 행렬(float32 CSR)을 반환합니다. 인자는 count_matrix와 같습니다."""
+        return self.fit_transform_counts(count_matrix(token_ids, lengths, num_columns), db_path)
+
+    def fit_transform_counts(self, counts, db_path=None, block_rows=NORMALIZE_BLOCK_ROWS):
+        """
+        이미 만든 단어 빈도 행렬(count_matrix 형식)로 IDF를 학습하고, 그 행렬을 그 자리에서 TF-IDF로 바꿔 반환합니다.
+        문서 빈도도 block_rows행씩 셉니다. (np.bincount가 int32 열 번호 전체를 int64로 복사하지 않도록)
+        """
+        if counts.nnz == 0:
+            raise ValueError("문단에 토큰이 하나도 없어 어휘를 만들 수 없습니다.")
+        num_docs, num_columns = counts.shape
+        df = np.zeros(num_columns, dtype=np.int64)
+        for _, _, begin, end in _row_blocks(counts.indptr, block_rows):
+            df += np.bincount(counts.indices[begin:end], minlength=num_columns)
+        idf = np.log((1.0 + num_docs) / (1.0 + df)) + 1.0
+        idf[df == 0] = 0.0 # 코퍼스에 없는 토큰(삭제된 문단에만 있던 토큰 등)은 무시
+        self.idf_ = idf.astype(np.float32)
+        self.db_path = db_path
+        self._vocabulary = None
+        return self._normalize(counts, block_rows)
+
+    def transform_ids(self, token_ids, lengths):
+        return self._normalize(count_matrix(token_ids, lengths, len(self.idf_)))
+
+    def _load_vocabulary(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return dict(conn.execute("SELECT token, id FROM token_vocab WHERE mode = ?", (self.mode,)))
+        finally:
+            conn.close()
+
+    def transform(self, texts):
+        """DB에 없는 텍스트들을 토큰화하여 학습된 어휘로 벡터화합니다. (샤드 질의 등)"""
+        if self._vocabulary is None:
+            self._vocabulary = self._load_vocabulary()
+        vocabulary = self._vocabulary
+        token_ids, lengths = [], []
+        for text in texts:
+            ids = [vocabulary[t] for t in tokenize(text, self.mode) if t in vocabulary]
+            token_ids.extend(ids)
+            lengths.append(len(ids))
+        return self.transform_ids(token_ids, lengths)
+
+    def get_feature_names_out(self):
+        """열 번호 순서의 토큰 배열. (내보내기의 vocabulary 파일용)"""
+        if self._vocabulary is None:
+            self._vocabulary = self._load_vocabulary()
+        names = np.full(len(self.idf_), "", dtype=object)
+        for token, token_id in self._vocabulary.items():
+            if token_id < len(names):
+                names[token_id] = token
+        return names